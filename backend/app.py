@@ -3,34 +3,58 @@ import json
 import time
 import imaplib
 import email
-import re
 from email.header import decode_header
 from datetime import datetime, timedelta
 import collections
+import hmac
+import threading
 from dotenv import load_dotenv
 
 # --- Configuration ---
 basedir = os.path.abspath(os.path.dirname(__file__))
 load_dotenv(os.path.join(basedir, '..', '.env'))
 
-import nltk
-
 from flask import Flask, render_template, request, jsonify
 from flask_cors import CORS
 import firebase_admin
-from firebase_admin import credentials, auth, db
+from firebase_admin import credentials, auth
 from services.ai_service import AIService
+from services.verdict_cache import ImageVerdictCache
+from services.image_preprocessor import ImagePreprocessor
+from services.perceptual_hash import PerceptualHashIndex
+from services.vision_backends import LocalVisionBackend
+from services.auth_cache import AuthorizationCache
+from services.token_cache import VerifiedTokenCache
+from services.rtdb import database as db, request_cache
+from services.rtdb.emulator import InMemoryDatabase
+from services.rtdb.instrumentation import RTDBMetrics
+from services.http_metrics import HttpMetrics
+from services.request_profiler import RequestProfiler
+from services.rtdb.request_cache import request_reads
+from services.rtdb.write_batch import WriteBatch, generate_push_id
+from services.rtdb.keys import is_valid_key
+from services.audit_journal import AuditJournal
+from services.notifications import NotificationSettingsIndex, NotificationDispatcher, build_notification
+from services.verification_jobs import VerificationJobQueue, QueueFullError, QueueOverBudgetError
+from services.restricted_matcher import RestrictedContentMatcher, load_taxonomy, SEVERITY_BLOCK
 from services.price_comparison.scraper import DarazScraper, OLXScraper
+from services.price_comparison.mock_scraper import MockScraper
 from services.price_comparison.matcher import SmartMatcher
 from services.price_comparison.analytics import PriceAnalytics
 from logistics_constants import PAKISTAN_HUBS, LOGISTICS_STATES, STATUS_DISPLAY_NAMES, STATUS_DESCRIPTIONS
 from werkzeug.utils import secure_filename
 from services.nlp_engine import NLPEngine
+from services.search_trends import SearchTrendTracker
+from services.category_index import ProductCategoryIndex
+from services.rtdb.stream import list_keys
+from config import Config
 
 app = Flask(__name__, 
             static_folder='../static',
             template_folder='../HTML')
+app.config['MAX_CONTENT_LENGTH'] = int(Config.MAX_REQUEST_MB * 1024 * 1024)
 CORS(app)
+http_metrics = HttpMetrics(app)
 
 # Initialize Firebase
 cred_path = os.getenv('GOOGLE_APPLICATION_CREDENTIALS', 'service-account.json')
@@ -55,7 +79,21 @@ elif os.path.exists(cred_path):
 else:
     print("Warning: No credentials found (Env or File). Firebase features will fail.")
 
-from firebase_admin import db
+# Offline runs (benchmarks, load tests) can swap RTDB for the in-memory emulator
+if Config.RTDB_BACKEND == 'emulator':
+    rtdb_emulator_options = dict(latency_ms=Config.RTDB_EMULATOR_LATENCY_MS,
+                                 jitter_ms=Config.RTDB_EMULATOR_JITTER_MS,
+                                 conflict_rate=Config.RTDB_EMULATOR_CONFLICT_RATE)
+    if Config.RTDB_EMULATOR_SEED:
+        db.use(InMemoryDatabase.from_file(Config.RTDB_EMULATOR_SEED, **rtdb_emulator_options))
+    else:
+        db.use(InMemoryDatabase(**rtdb_emulator_options))
+    print(f"Using in-memory RTDB emulator ({Config.RTDB_EMULATOR_SEED or 'empty'})")
+
+# Per-endpoint RTDB round-trip counts, latency histograms and (optionally) payload sizes
+rtdb_metrics = RTDBMetrics(max_series=Config.RTDB_METRICS_MAX_SERIES,
+                           count_bytes=Config.RTDB_METRICS_PAYLOAD_BYTES) if Config.RTDB_METRICS else None
+db.instrument(rtdb_metrics)
 
 # --- Financial Engine ---
 class FeeEngine:
@@ -153,12 +191,84 @@ class FeeEngine:
 
 # Initialize Services
 ai_cred_source = json.loads(firebase_json) if firebase_json else cred_path
-ai_service = AIService(ai_cred_source)
-daraz_scraper = DarazScraper()
-olx_scraper = OLXScraper()
+verdict_cache = ImageVerdictCache(Config.VERDICT_CACHE_PATH,
+                                  ttl=Config.VERDICT_CACHE_TTL,
+                                  max_entries=Config.VERDICT_CACHE_MAX_ENTRIES)
+image_preprocessor = ImagePreprocessor(max_dimension=Config.VISION_MAX_DIMENSION,
+                                       quality=Config.VISION_JPEG_QUALITY,
+                                       workers=Config.IMAGE_PREPROCESS_WORKERS)
+vision_backend = None
+if Config.VISION_BACKEND == 'local':
+    vision_backend = LocalVisionBackend.from_file(Config.VISION_LOCAL_RULES,
+                                                  latency_ms=Config.VISION_LOCAL_LATENCY_MS,
+                                                  jitter_ms=Config.VISION_LOCAL_JITTER_MS,
+                                                  error_rate=Config.VISION_LOCAL_ERROR_RATE)
+    print(f"Using local Vision backend ({len(vision_backend.rules)} fixture rules)")
+phash_index = PerceptualHashIndex(Config.PHASH_INDEX_PATH, max_distance=Config.PHASH_MAX_DISTANCE,
+                                  ttl=Config.VERDICT_CACHE_TTL, max_entries=Config.VERDICT_CACHE_MAX_ENTRIES)
+restricted_taxonomy = load_taxonomy(Config.RESTRICTED_TAXONOMY_PATH)
+label_matcher = RestrictedContentMatcher(restricted_taxonomy)
+text_matcher = RestrictedContentMatcher(restricted_taxonomy, whole_words=True)
+ai_service = AIService(ai_cred_source, verdict_cache=verdict_cache, preprocessor=image_preprocessor,
+                       matcher=label_matcher, phash_index=phash_index, backend=vision_backend)
+verification_jobs = VerificationJobQueue(ai_service,
+                                         workers=Config.VERIFY_JOB_WORKERS,
+                                         max_queue=Config.VERIFY_JOB_MAX_QUEUE,
+                                         max_queue_bytes=int(Config.VERIFY_JOB_MAX_QUEUE_MB * 1024 * 1024),
+                                         result_ttl=Config.VERIFY_JOB_RESULT_TTL)
+if Config.PRICE_SCRAPER == 'mock':
+    daraz_scraper = MockScraper('Daraz', Config.MOCK_SCRAPER_LATENCY_MS, Config.MOCK_SCRAPER_JITTER_MS)
+    olx_scraper = MockScraper('OLX', Config.MOCK_SCRAPER_LATENCY_MS, Config.MOCK_SCRAPER_JITTER_MS)
+else:
+    daraz_scraper = DarazScraper()
+    olx_scraper = OLXScraper()
 matcher = SmartMatcher()
 analytics = PriceAnalytics()
-nlp_engine = NLPEngine()
+category_index = ProductCategoryIndex(ttl=Config.CATEGORY_INDEX_TTL)
+authz_cache = AuthorizationCache(ttl=Config.AUTH_CACHE_TTL,
+                                 max_entries=Config.AUTH_CACHE_MAX_ENTRIES,
+                                 listen=Config.AUTH_CACHE_LISTEN)
+request_cache.configure(Config.RTDB_PREFETCH_WORKERS)
+id_token_cache = VerifiedTokenCache(max_entries=Config.TOKEN_CACHE_MAX_ENTRIES,
+                                    check_revoked=Config.TOKEN_CHECK_REVOKED,
+                                    revocation_recheck=Config.TOKEN_REVOCATION_RECHECK_SECONDS)
+audit_journal = AuditJournal(Config.AUDIT_JOURNAL_PATH,
+                             fsync=Config.AUDIT_FSYNC,
+                             flush_interval=Config.AUDIT_FLUSH_SECONDS,
+                             max_batch=Config.AUDIT_MAX_BATCH)
+audit_journal.start()
+notification_settings = NotificationSettingsIndex(ttl=Config.NOTIFICATION_SETTINGS_TTL)
+notification_dispatcher = NotificationDispatcher(notification_settings,
+                                                 workers=Config.NOTIFY_WORKERS,
+                                                 max_queue=Config.NOTIFY_MAX_QUEUE,
+                                                 max_attempts=Config.NOTIFY_MAX_ATTEMPTS,
+                                                 retry_backoff=Config.NOTIFY_RETRY_BACKOFF,
+                                                 batch_window=Config.NOTIFY_BATCH_WINDOW_MS / 1000,
+                                                 max_batch=Config.NOTIFY_MAX_BATCH)
+
+def profile_requested_by_admin():
+    try:
+        return authz_cache.is_admin(verify_request_token()['uid'])
+    except Exception:
+        return False
+
+# Opt-in per-request profiling (sampled, or forced by an admin with the profile header)
+request_profiler = None
+if Config.PROFILING_ENABLED:
+    request_profiler = RequestProfiler(sample_rate=Config.PROFILE_SAMPLE_RATE,
+                                       header=Config.PROFILE_HEADER,
+                                       authorize=profile_requested_by_admin,
+                                       history=Config.PROFILE_HISTORY,
+                                       top_frames=Config.PROFILE_TOP_FRAMES,
+                                       directory=Config.PROFILE_DIR or None)
+    request_profiler.init_app(app)
+nlp_engine = NLPEngine(sentiment_cache_size=Config.SENTIMENT_CACHE_SIZE, category_index=category_index)
+search_trends = SearchTrendTracker(capacity=Config.SEARCH_TRENDS_CAPACITY,
+                                   flush_interval=Config.SEARCH_TRENDS_FLUSH_SECONDS)
+
+# NLP stack loads lazily on first use; optionally pre-load it off the request path
+if Config.NLP_WARMUP:
+    threading.Thread(target=nlp_engine.warm_up, name='nlp-warmup', daemon=True).start()
 
 # --- Routes ---
 
@@ -177,24 +287,31 @@ def serve_html(filename):
 
 from functools import wraps
 
+# --- Auth Helpers ---
+def bearer_token():
+    """Returns the ID token from a 'Bearer <token>' Authorization header, or None"""
+    header = request.headers.get('Authorization')
+    if not header or not header.startswith('Bearer '):
+        return None
+    return header[len('Bearer '):]
+
+def verify_request_token():
+    """Decoded claims of the request's bearer token (cached until it expires). Raises if missing or invalid."""
+    return id_token_cache.verify(bearer_token())
+
 # --- Auth Decorators ---
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        id_token = request.headers.get('Authorization')
-        if not id_token or not id_token.startswith('Bearer '):
+        if not bearer_token():
             return jsonify({'success': False, 'error': 'Unauthorized: Bearer token required'}), 401
         
-        token = id_token.split('Bearer ')[1]
         try:
-            decoded_token = auth.verify_id_token(token)
+            decoded_token = verify_request_token()
             uid = decoded_token['uid']
             
-            # Check role in RTDB
-            user_ref = db.reference(f'users/{uid}')
-            user_data = user_ref.get()
-            
-            if user_data and user_data.get('role') == 'Admin':
+            # Check role (cached, only users/{uid}/role is read on a miss)
+            if authz_cache.is_admin(uid):
                 return f(*args, **kwargs)
             else:
                 return jsonify({'success': False, 'error': 'Forbidden: Admin access only'}), 403
@@ -205,20 +322,15 @@ def admin_required(f):
 def staff_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        id_token = request.headers.get('Authorization')
-        if not id_token or not id_token.startswith('Bearer '):
+        if not bearer_token():
             return jsonify({'success': False, 'error': 'Unauthorized: Bearer token required'}), 401
         
-        token = id_token.split('Bearer ')[1]
         try:
-            decoded_token = auth.verify_id_token(token)
+            decoded_token = verify_request_token()
             uid = decoded_token['uid']
             
-            # Check staff registry
-            staff_ref = db.reference(f'staff_registry/{uid}')
-            staff_data = staff_ref.get()
-            
-            if staff_data:
+            # Check staff registry (cached)
+            if authz_cache.is_staff(uid):
                 return f(*args, **kwargs)
             else:
                 return jsonify({'success': False, 'error': 'Forbidden: Staff access only'}), 403
@@ -227,19 +339,28 @@ def staff_required(f):
     return decorated_function
 
 # --- Helpers ---
-def log_audit(action, admin_id, target_id, old_val, new_val, is_logistics=False):
-    """Log an administrative action to the audit trail"""
+def log_audit(action, admin_id, target_id, old_val, new_val, is_logistics=False, batch=None):
+    """
+    Log an administrative action to the audit trail: as part of `batch` when
+    given, otherwise through the local audit journal, which ships it to RTDB
+    in the background.
+    """
     try:
-        audit_ref = db.reference('audit_logs')
-        audit_ref.push({
+        entry = {
             'action': action,
             'adminId': admin_id,
             'targetId': target_id,
             'oldValue': old_val,
             'newValue': new_val,
-            'isLogistics': is_logistics,
-            'timestamp': {".sv": "timestamp"}
-        })
+            'isLogistics': is_logistics
+        }
+        if batch is not None:
+            entry['timestamp'] = {".sv": "timestamp"}
+            batch.push('audit_logs', entry)
+        else:
+            # Stamped now rather than by the server, which only sees it when shipped
+            entry['timestamp'] = int(time.time() * 1000)
+            audit_journal.append(entry)
     except Exception as e:
         print(f"❌ Failed to log audit: {e}")
 
@@ -267,6 +388,9 @@ def delete_user():
         auth.delete_user(uid)
         db.reference(f'users/{uid}').delete()
         db.reference(f'staff_registry/{uid}').delete()
+        authz_cache.invalidate(uid)
+        id_token_cache.revoke_uid(uid)
+        notification_settings.invalidate(uid)
         return jsonify({'success': True, 'message': 'User permanently deleted'})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -277,14 +401,12 @@ def nuke_account():
     Elite User-facing Account Deletion (The "Nuke" Button)
     Deletes user from Firebase Auth and wipes all related data in RTDB.
     """
-    token = request.headers.get('Authorization')
-    if not token or not token.startswith('Bearer '):
+    if not bearer_token():
         return jsonify({'success': False, 'error': 'Unauthorized: Bearer token required'}), 401
     
-    token = token.split('Bearer ')[1]
     try:
         # 1. Verify Token & Get UID
-        decoded_token = auth.verify_id_token(token)
+        decoded_token = verify_request_token()
         uid = decoded_token['uid']
         
         
@@ -302,13 +424,20 @@ def nuke_account():
 
         # 4. Wipe Staff Registry if applicable
         db.reference(f'staff_registry/{uid}').delete()
+        authz_cache.invalidate(uid)
+        id_token_cache.revoke_uid(uid)
+        notification_settings.invalidate(uid)
         
         # 5. Wipe Products listed by this user (Atomic cleanup)
         products_ref = db.reference('products')
         products_snapshot = products_ref.order_by_child('sellerId').equal_to(uid).get()
         if products_snapshot:
+            # Listings and their category index entries go in one multi-path update
+            batch = WriteBatch()
             for pid in products_snapshot.keys():
-                db.reference(f'products/{pid}').delete()
+                batch.delete(f'products/{pid}')
+            category_index.remove(products_snapshot.keys(), batch=batch)
+            batch.commit()
             print(f"{len(products_snapshot)} listings deleted for {uid}.")
 
         return jsonify({
@@ -485,7 +614,49 @@ def restore_metadata():
     except Exception as e:
         return f"<h1>❌ Restoration Failed</h1><p>{str(e)}</p>", 500
 
+@app.route('/api/v1/admin/rebuild-category-index', methods=['POST'])
+@admin_required
+def rebuild_category_index():
+    """Backfills product_categories for listings created before the index existed"""
+    try:
+        indexed = category_index.rebuild()
+        return jsonify({'success': True, 'indexed': indexed})
+    except Exception as e:
+        print(f"Category index rebuild failed: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # --- API: AI Verification ---
+MAX_IMAGES_PER_REQUEST = 20
+
+def verification_uploader(require_auth=False):
+    """
+    Returns (uid, listing_id, error_response) for an image verification
+    request. The signed-in caller and the optional `listingId` form field
+    (which must be one of their listings) are recorded with the images, so
+    re-uploads of their own photos are not flagged as reposts.
+    """
+    uid = None
+    if bearer_token():
+        try:
+            uid = verify_request_token()['uid']
+        except Exception as e:
+            return None, None, (jsonify({'error': str(e)}), 401)
+    elif require_auth:
+        return None, None, (jsonify({'error': 'Unauthorized'}), 401)
+
+    listing_id = request.form.get('listingId') or None
+    if listing_id is not None:
+        if uid is None:
+            return None, None, (jsonify({'error': 'Unauthorized'}), 401)
+        if not is_valid_key(listing_id):
+            return None, None, (jsonify({'error': 'Invalid listingId'}), 400)
+        seller_id = db.reference(f'products/{listing_id}/sellerId').get()
+        if seller_id is None:
+            return None, None, (jsonify({'error': 'Listing not found'}), 404)
+        if seller_id != uid:
+            return None, None, (jsonify({'error': 'Forbidden: not your listing'}), 403)
+    return uid, listing_id, None
+
 @app.route('/api/verify-image', methods=['POST'])
 def verify_image_api():
     if 'image' not in request.files:
@@ -493,10 +664,158 @@ def verify_image_api():
     
     file = request.files['image']
     content = file.read()
+
+    # Async mode: enqueue and return a job id right away instead of holding this worker.
+    # Jobs write with admin rights (also under the listing), so the caller must be signed in
+    is_async = str(request.args.get('async', request.form.get('async', ''))).lower() in ('1', 'true')
+    uid, listing_id, error = verification_uploader(require_auth=is_async)
+    if error:
+        return error
+
+    if is_async:
+        try:
+            job_id = verification_jobs.submit(content, listing_id=listing_id, uploader_id=uid)
+        except QueueOverBudgetError as e:
+            response = jsonify({'error': str(e)})
+            response.headers['Retry-After'] = '5'
+            return response, 503
+        except QueueFullError as e:
+            response = jsonify({'error': str(e)})
+            response.headers['Retry-After'] = '5'
+            return response, 429
+        return jsonify({'jobId': job_id, 'status': 'queued', 'statusUrl': f'/api/verify-image/jobs/{job_id}'}), 202
     
-    result = ai_service.verify_image(content)
+    result = ai_service.verify_image(content, listing_id=listing_id, uploader_id=uid)
     return jsonify(result)
 
+@app.route('/api/moderate-text', methods=['POST'])
+def moderate_text_api():
+    """Screens listing title/description against the restricted-content taxonomy"""
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'success': False, 'error': 'A JSON object with title or description is required'}), 400
+        title = data.get('title') or ''
+        description = data.get('description') or ''
+        if not isinstance(title, str) or not isinstance(description, str):
+            return jsonify({'success': False, 'error': 'title and description must be strings'}), 400
+        if not title and not description:
+            return jsonify({'success': False, 'error': 'title or description is required'}), 400
+
+        matches = text_matcher.scan_text(title=title, description=description)
+        blocking = [m for m in matches if m['severity'] == SEVERITY_BLOCK]
+        return jsonify({
+            'isSafe': len(blocking) == 0,
+            'reasons': sorted(set(f"Restricted term in {m['source']}: {m['term']}" for m in blocking)),
+            'matches': [{k: m[k] for k in ('term', 'category', 'severity', 'source')} for m in matches]
+        })
+    except Exception as e:
+        print(f"Text Moderation Error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/verify-image/jobs/<job_id>', methods=['GET'])
+def verify_image_job_status(job_id):
+    """Polling endpoint for async image verification jobs"""
+    job = verification_jobs.get(job_id) if is_valid_key(job_id) else None
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/verify-images', methods=['POST'])
+def verify_images_api():
+    """Verifies all photos of a listing in one request (batched Vision calls)"""
+    files = request.files.getlist('images')
+    if not files:
+        return jsonify({'error': 'No images provided'}), 400
+    if len(files) > MAX_IMAGES_PER_REQUEST:
+        return jsonify({'error': f'At most {MAX_IMAGES_PER_REQUEST} images per request'}), 400
+
+    uid, listing_id, error = verification_uploader()
+    if error:
+        return error
+
+    contents = [f.read() for f in files]
+    verdicts = ai_service.verify_images(contents, listing_id=listing_id, uploader_id=uid)
+
+    results = []
+    for f, verdict in zip(files, verdicts):
+        verdict['filename'] = f.filename
+        results.append(verdict)
+
+    return jsonify({
+        'results': results,
+        'allSafe': all(v.get('isSafe') for v in verdicts)
+    })
+
+@app.route('/api/v1/admin/metrics/verdict-cache', methods=['GET'])
+@admin_required
+def verdict_cache_metrics():
+    """Hit-rate and size metrics for the image verdict cache"""
+    return jsonify({'success': True, 'metrics': verdict_cache.stats()})
+
+@app.route('/api/v1/admin/metrics/image-preprocessing', methods=['GET'])
+@admin_required
+def image_preprocessing_metrics():
+    """Bytes saved and timing of the pre-Vision downscale/re-encode stage"""
+    return jsonify({'success': True, 'metrics': image_preprocessor.stats()})
+
+@app.route('/api/v1/admin/metrics/auth-cache', methods=['GET'])
+@admin_required
+def auth_cache_metrics():
+    """Hit-rate metrics for the role/staff authorization cache and the verified ID-token cache"""
+    return jsonify({'success': True, 'metrics': {'authorization': authz_cache.stats(), 'idTokens': id_token_cache.stats()}})
+
+@app.route('/api/v1/admin/profiles', methods=['GET'])
+@admin_required
+def request_profiles():
+    """Recent request profiles: top cProfile frames and RTDB call breakdown"""
+    if request_profiler is None:
+        return jsonify({'success': False, 'error': 'Request profiling is disabled (PROFILING_ENABLED=false)'}), 404
+    limit = request.args.get('limit', type=int)
+    return jsonify({'success': True, 'profiles': request_profiler.recent(limit)})
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus exposition of per-route request counts, latency histograms and in-flight gauges"""
+    if Config.METRICS_TOKEN and not hmac.compare_digest(bearer_token() or '', Config.METRICS_TOKEN):
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    return http_metrics.exposition()
+
+@app.route('/api/v1/admin/metrics/rtdb', methods=['GET'])
+@admin_required
+def rtdb_metrics_report():
+    """RTDB calls per endpoint: round-trips per request, latency histograms, bytes and transaction retries"""
+    if rtdb_metrics is None:
+        return jsonify({'success': False, 'error': 'RTDB metrics are disabled (RTDB_METRICS=false)'}), 404
+    report = rtdb_metrics.snapshot()
+    if request.args.get('reset') == 'true':
+        rtdb_metrics.reset()
+    return jsonify({'success': True, 'metrics': report})
+
+@app.route('/api/v1/admin/metrics/audit-journal', methods=['GET'])
+@admin_required
+def audit_journal_metrics():
+    """Flush lag, pending entries and shipping failures of the write-behind audit journal"""
+    return jsonify({'success': True, 'metrics': audit_journal.stats()})
+
+@app.route('/api/v1/admin/metrics/notifications', methods=['GET'])
+@admin_required
+def notification_metrics():
+    """Queue depth, dispatch latency, retries and dead letters of background notification delivery"""
+    return jsonify({'success': True, 'metrics': notification_dispatcher.stats()})
+
+@app.route('/api/v1/admin/metrics/near-duplicates', methods=['GET'])
+@admin_required
+def near_duplicate_metrics():
+    """Size and repost-hit metrics for the perceptual-hash image index"""
+    return jsonify({'success': True, 'metrics': phash_index.stats()})
+
+@app.route('/api/v1/admin/metrics/verification-jobs', methods=['GET'])
+@admin_required
+def verification_job_metrics():
+    """Queue depth, wait/run times and rejections of async image verification"""
+    return jsonify({'success': True, 'metrics': verification_jobs.stats()})
+
 # --- API: Price Comparison ---
 @app.route('/api/compare-prices', methods=['POST'])
 def compare_prices_api():
@@ -535,6 +854,7 @@ def update_staff_profile_proxy():
             return jsonify({'success': False, 'error': 'Missing Fields'}), 400
         # Bypass RTDB rules using Admin SDK
         db.reference(f'staff_registry/{uid}').update(updates)
+        authz_cache.invalidate(uid, roles=False)
         return jsonify({'success': True, 'message': 'Profile updated via Admin Proxy'})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -549,25 +869,22 @@ def update_dispute_status():
     resolution_type = data.get('resolutionType')
     staff_id = data.get('staffId')
     justification = data.get('justification')
-    token = request.headers.get('Authorization')
 
     if not all([dispute_id, new_status, staff_id]):
         return jsonify({'success': False, 'error': 'Missing requisite fields.'}), 400
 
     try:
-        if token and token.startswith('Bearer '):
-            token = token.split('Bearer ')[1]
-        decoded_token = auth.verify_id_token(token)
+        decoded_token = verify_request_token()
         uid = decoded_token['uid']
-        
-        user_ref = db.reference(f'users/{uid}').get()
-        staff_ref = db.reference(f'staff_registry/{uid}').get()
 
-        if not staff_ref and (not user_ref or user_ref.get('role') != 'Admin'):
+        # The dispute read overlaps with the permission check
+        reads = request_reads()
+        reads.prefetch(f'disputes/{dispute_id}')
+        
+        if not authz_cache.is_staff_or_admin(uid):
             return jsonify({'success': False, 'error': 'Unauthorized access.'}), 403
 
-        dispute_ref = db.reference(f'disputes/{dispute_id}')
-        dispute_data = dispute_ref.get()
+        dispute_data = reads.get(f'disputes/{dispute_id}')
 
         if not dispute_data:
              return jsonify({'success': False, 'error': 'Dispute not found.'}), 404
@@ -582,11 +899,13 @@ def update_dispute_status():
         }
 
         # Pre-fetch order data for notifications and processing
-        order_ref = db.reference(f'orders/{order_id}')
-        order_data = order_ref.get()
+        order_data = reads.get(f'orders/{order_id}')
         buyer_id = order_data.get('buyerId') if order_data else None
         seller_id = order_data.get('sellerId') if order_data else None
 
+        # Wallet moves stay transactions; every plain write below goes out in one multi-path update
+        batch = WriteBatch()
+
         # Handle atomic escrow/wallet resolution
         if resolution_type in ['Refund Buyer', 'Release To Seller']:
              if not order_data:
@@ -605,8 +924,8 @@ def update_dispute_status():
                   buyer_wallet_ref.transaction(refund_txn)
 
                   update_payload['resolutionSummary'] = f"Refunded {price} tokens to buyer {buyer_id}."
-                  db.reference(f'orders/{order_id}/status').set('refunded')
-                  send_system_notification(buyer_id, 'Dispute Resolved & Refunded', f'A refund of {price} tokens has been credited to your wallet for order #{order_id}.', 'payment', f'/orders.html#{order_id}')
+                  batch.set(f'orders/{order_id}/status', 'refunded')
+                  send_system_notification(buyer_id, 'Dispute Resolved & Refunded', f'A refund of {price} tokens has been credited to your wallet for order #{order_id}.', 'payment', f'/orders.html#{order_id}', batch=batch)
 
              elif resolution_type == 'Release To Seller' and seller_id:
                   # Credit Seller
@@ -627,22 +946,24 @@ def update_dispute_status():
                       buyer_escrow_ref.transaction(clear_escrow_txn)
 
                   update_payload['resolutionSummary'] = f"Released {price} tokens to seller {seller_id}."
-                  db.reference(f'orders/{order_id}/status').set('completed')
-                  send_system_notification(seller_id, 'Dispute Resolved & Payment Released', f'Payment of {price} tokens has been released to your wallet for order #{order_id}.', 'payment', '/seller-profile.html')
+                  batch.set(f'orders/{order_id}/status', 'completed')
+                  send_system_notification(seller_id, 'Dispute Resolved & Payment Released', f'Payment of {price} tokens has been released to your wallet for order #{order_id}.', 'payment', '/seller-profile.html', batch=batch)
              
              update_payload['resolutionJustification'] = justification
 
-        dispute_ref.update(update_payload)
+        batch.update(f'disputes/{dispute_id}', update_payload)
 
         # Notify parties of status change
         if new_status != old_status:
             notif_msg = f"Dispute #{dispute_id} status updated to: {new_status}"
             if buyer_id:
-                send_system_notification(buyer_id, 'Dispute Update', notif_msg, 'dispute', f'/disputes.html#{dispute_id}')
+                send_system_notification(buyer_id, 'Dispute Update', notif_msg, 'dispute', f'/disputes.html#{dispute_id}', batch=batch)
             if seller_id:
-                send_system_notification(seller_id, 'Dispute Update', notif_msg, 'dispute', f'/disputes.html#{dispute_id}')
+                send_system_notification(seller_id, 'Dispute Update', notif_msg, 'dispute', f'/disputes.html#{dispute_id}', batch=batch)
 
-        log_audit("update_status", staff_id, dispute_id, {'status': old_status}, {'status': new_status, 'justification': justification, 'resolution': resolution_type})
+        log_audit("update_status", staff_id, dispute_id, {'status': old_status}, {'status': new_status, 'justification': justification, 'resolution': resolution_type}, batch=batch)
+
+        batch.commit()
 
 
         return jsonify({'success': True, 'message': 'Dispute updated successfully.'})
@@ -658,27 +979,26 @@ def assign_dispute():
     dispute_id = data.get('disputeId')
     assignee_id = data.get('assigneeId')
     staff_id = data.get('staffId')
-    token = request.headers.get('Authorization')
 
     try:
-        if token and token.startswith('Bearer '):
-            token = token.split('Bearer ')[1]
-        decoded_token = auth.verify_id_token(token)
+        decoded_token = verify_request_token()
         uid = decoded_token['uid']
 
         dispute_ref = db.reference(f'disputes/{dispute_id}')
         old_data = dispute_ref.get()
         old_assignee = old_data.get('assignedToStaffId') if old_data else None
 
-        dispute_ref.update({
+        batch = WriteBatch()
+        batch.update(f'disputes/{dispute_id}', {
              'assignedToStaffId': assignee_id,
              'assignedAt': {".sv": "timestamp"}
         })
 
         if assignee_id and assignee_id != old_assignee:
-            send_system_notification(assignee_id, 'Dispute Assigned', f"You have been assigned to investigate dispute #{dispute_id}.", 'alert', '/staff-dashboard.html')
+            send_system_notification(assignee_id, 'Dispute Assigned', f"You have been assigned to investigate dispute #{dispute_id}.", 'alert', '/staff-dashboard.html', batch=batch)
 
-        log_audit("assign_dispute", staff_id, dispute_id, {'assignee': old_assignee}, {'assignee': assignee_id})
+        log_audit("assign_dispute", staff_id, dispute_id, {'assignee': old_assignee}, {'assignee': assignee_id}, batch=batch)
+        batch.commit()
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -690,12 +1010,9 @@ def add_note():
     dispute_id = data.get('disputeId')
     note_text = data.get('noteText')
     staff_id = data.get('staffId')
-    token = request.headers.get('Authorization')
 
     try:
-        if token and token.startswith('Bearer '):
-            token = token.split('Bearer ')[1]
-        decoded_token = auth.verify_id_token(token)
+        decoded_token = verify_request_token()
 
         notes_ref = db.reference(f'disputes/{dispute_id}/investigationNotes')
         notes_ref.push({
@@ -724,13 +1041,11 @@ def submit_review():
     product_id = data.get('productId')
     review_type = data.get('type') # Buyer-to-Seller | Seller-to-Buyer
 
-    token = request.headers.get('Authorization')
-    if not token or not token.startswith('Bearer '):
+    if not bearer_token():
         return jsonify({'success': False, 'error': 'Unauthorized'}), 401
     
     try:
-        token = token.split('Bearer ')[1]
-        decoded_token = auth.verify_id_token(token)
+        decoded_token = verify_request_token()
         uid = decoded_token['uid']
         
         if uid != reviewer_id:
@@ -739,14 +1054,12 @@ def submit_review():
         if not target_id:
             return jsonify({'success': False, 'error': 'Target user ID is missing. This order may have invalid merchant data.'}), 400
 
-        # REAL-TIME ROLE & INTEGRITY CHECKS
-        reviewer_data = db.reference(f'users/{uid}').get()
-        reviewer_role = (reviewer_data.get('role') if reviewer_data else 'Buyer') or 'Buyer'
-        reviewer_role = reviewer_role.lower()
+        # Order and duplicate-review reads run while the role checks below are resolved
+        reads = request_reads()
+        reads.prefetch(f'orders/{order_id}', f'reviews/{order_id}_{reviewer_id}')
 
-        target_data = db.reference(f'users/{target_id}').get()
-        target_role = (target_data.get('role') if target_data else 'Buyer') or 'Buyer'
-        target_role = target_role.lower()
+        # REAL-TIME ROLE & INTEGRITY CHECKS
+        reviewer_role = (authz_cache.role(uid) or 'Buyer').lower()
 
         if uid == target_id:
             return jsonify({'success': False, 'error': 'You cannot review yourself.'}), 403
@@ -755,8 +1068,7 @@ def submit_review():
             return jsonify({'success': False, 'error': 'Seller-to-Buyer reviews have been disabled to streamline the marketplace experience.'}), 403
 
         # 1. Verify Order Status & Ownership
-        order_ref = db.reference(f'orders/{order_id}')
-        order = order_ref.get()
+        order = reads.get(f'orders/{order_id}')
         if not order:
              return jsonify({'success': False, 'error': 'Order not found'}), 404
              
@@ -773,7 +1085,7 @@ def submit_review():
 
         # 2. Check for duplicate review (by this specific reviewer for this order)
         review_ref = db.reference(f'reviews/{order_id}_{reviewer_id}')
-        if review_ref.get():
+        if reads.get(f'reviews/{order_id}_{reviewer_id}'):
              return jsonify({'success': False, 'error': 'You have already submitted a review for this order'}), 400
 
         # 3. Write Review
@@ -786,6 +1098,11 @@ def submit_review():
             'type': review_type,
             'timestamp': {".sv": "timestamp"}
         }
+        # Scored once here so the analytics endpoints find it stored on the review
+        try:
+            review_data['sentiment'] = nlp_engine.get_sentiment(comment)
+        except Exception as e:
+            print(f"Review sentiment scoring failed: {e}")
         review_ref.set(review_data)
 
         # 4. Atomic Reputation Update
@@ -823,11 +1140,8 @@ def submit_report():
     reason = data.get('reason')
     description = data.get('description')
     
-    token = request.headers.get('Authorization')
     try:
-        if token and token.startswith('Bearer '):
-            token = token.split('Bearer ')[1]
-        decoded_token = auth.verify_id_token(token)
+        decoded_token = verify_request_token()
         uid = decoded_token['uid']
 
         if uid == target_id:
@@ -873,8 +1187,8 @@ def update_tracking():
 
     try:
         # 1. Verification of Order
-        order_ref = db.reference(f'orders/{order_id}')
-        order_snapshot = order_ref.get()
+        reads = request_reads()
+        order_snapshot = reads.get(f'orders/{order_id}')
         if not order_snapshot:
             return jsonify({'success': False, 'error': 'Order not found'}), 404
         
@@ -893,16 +1207,22 @@ def update_tracking():
         except ValueError:
             return jsonify({'success': False, 'error': f'Invalid status: {new_status}'}), 400
 
+        buyer_id = order_snapshot.get('buyerId')
+        seller_id = order_snapshot.get('sellerId')
+
+        # Order update, tracking entry and audit record are committed together
+        # in one atomic multi-path write; notifications are queued once it succeeds
+        batch = WriteBatch()
+
         # 2. Update Order Status
-        order_ref.update({
+        batch.update(f'orders/{order_id}', {
             'status': new_status,
             'lastLocation': location,
             'updatedAt': {".sv": "timestamp"}
         })
 
         # 3. Push Tracking History (The "Atma")
-        tracking_ref = db.reference(f'tracking_history/{order_id}')
-        tracking_ref.push({
+        batch.push(f'tracking_history/{order_id}', {
             'status': new_status,
             'displayStatus': STATUS_DISPLAY_NAMES.get(new_status, new_status),
             'desc': STATUS_DESCRIPTIONS.get(new_status, ''),
@@ -913,23 +1233,22 @@ def update_tracking():
         })
 
         # 4. Trigger Notification for Buyer/Seller
-        buyer_id = order_snapshot.get('buyerId')
-        seller_id = order_snapshot.get('sellerId')
-        
         short_id = str(order_id)[-6:]
         friendly_status = STATUS_DISPLAY_NAMES.get(new_status, new_status)
         notif_message = f"Order #{short_id} is now: {friendly_status}"
         
         if buyer_id:
-            send_system_notification(buyer_id, 'Shipment Update', notif_message, 'order', f'/orders.html#{order_id}')
+            send_system_notification(buyer_id, 'Shipment Update', notif_message, 'order', f'/orders.html#{order_id}', batch=batch)
         if seller_id:
-            send_system_notification(seller_id, 'Shipment Update', notif_message, 'order', f'/orders.html#{order_id}')
+            send_system_notification(seller_id, 'Shipment Update', notif_message, 'order', f'/orders.html#{order_id}', batch=batch)
 
         # 5. Log Audit Trail
         log_audit("logistics_update", staff_id, order_id, 
                   {'status': old_status}, 
                   {'status': new_status, 'location': location}, 
-                  is_logistics=True)
+                  is_logistics=True, batch=batch)
+
+        batch.commit()
 
         return jsonify({
             'success': True, 
@@ -941,62 +1260,61 @@ def update_tracking():
         print(f"❌ Elite Tracking Update failed: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
-def send_system_notification(target_uid, title, message, notif_type, link=""):
-    """Unified Notification Integration with Setting-Aware Filtering"""
-    try:
-        if not target_uid: return
-        
-        # 1. Fetch User Settings
-        user_data = db.reference(f'users/{target_uid}').get()
-        if not user_data: return
-        
-        settings = user_data.get('settings', {}).get('notifications', {})
-        
-        # 2. Add to RTDB In-App Notifications (Always pushed by default, or check 'push'?)
-        # For professional experience, Push toggle usually refers to App notifications too.
-        if settings.get('push', True) is not False:
-            payload = {
-                'title': title,
-                'message': message,
-                'type': notif_type,
-                'timestamp': {".sv": "timestamp"},
-                'read': False,
-                'link': link
-            }
-            db.reference(f'users/{target_uid}/notifications').push(payload)
-            print(f"[PUSH GATEWAY] Dispatched Notification to {target_uid}: {title}")
-
-        # 3. Handle Email Gateway (Strict Filtering)
-        if settings.get('email', True) is not False:
-            email = user_data.get('email', 'Unknown')
-            # Trigger APIs here
-            print(f"[EMAIL GATEWAY] Dispatched Email to {email}: {title} | {message}")
-            
-    except Exception as e:
-        print(f"Failed to dispatch system notification constraint: {e}")
+def send_system_notification(target_uid, title, message, notif_type, link="", batch=None):
+    """
+    Unified Notification Integration with Setting-Aware Filtering.
+    Queues the notification for the background dispatcher, which applies the
+    user's push/e-mail settings. With `batch`, it is queued only after
+    batch.commit() succeeds.
+    """
+    if not target_uid: return
+    enqueue = lambda: notification_dispatcher.enqueue(target_uid, title, message, notif_type, link)
+    if batch is not None:
+        batch.after_commit(enqueue)
+    else:
+        enqueue()
 
 
-def send_admin_notification(title, message, notif_type="system", link="", metadata=None):
+def send_admin_notification(title, message, notif_type="system", link="", metadata=None, batch=None):
     """Send notification to admin/staff global alerts (no user-facing crossover)"""
     try:
-        payload = {
-            'title': title,
-            'message': message,
-            'type': notif_type,
-            'timestamp': {".sv": "timestamp"},
-            'read': False,
-            'link': link
-        }
+        payload = build_notification(title, message, notif_type, link)
         
         if metadata:
             payload['metadata'] = metadata
             
-        db.reference('global_notifications/admin_alerts').push(payload)
+        if batch is not None:
+            batch.push('global_notifications/admin_alerts', payload)
+        else:
+            db.reference('global_notifications/admin_alerts').push(payload)
         print(f"[ADMIN ALERT] Dispatched to global_notifications/admin_alerts: {title}")
         
     except Exception as e:
         print(f"Failed to dispatch admin notification: {e}")
 
+def reverse_wallet_move(uid, deltas, reason):
+    """
+    Undoes a wallet transaction whose record could not be written, so no funds
+    stay moved without anything referencing them. `deltas` maps wallet fields
+    to the amount to add back.
+    """
+    def apply_deltas(wallet):
+        wallet = wallet or {}
+        for field, delta in deltas.items():
+            wallet[field] = float(wallet.get(field, 0)) + delta
+        return wallet
+    try:
+        db.reference(f'users/{uid}/wallet').transaction(apply_deltas)
+    except Exception as e:
+        print(f"CRITICAL: failed to reverse wallet move for {uid} ({reason}): {e}")
+
+def commit_follow_ups(batch, context):
+    """Commits history, notifications and audit entries that follow a recorded money movement; failures are logged only."""
+    try:
+        batch.commit()
+    except Exception as e:
+        print(f"{context}: follow-up writes failed: {e}")
+
 
 # --- API: Wallet & Financial Engine ---
 
@@ -1006,12 +1324,11 @@ def request_withdrawal():
     Seller-initiated withdrawal request.
     Atomically validates balance and records the request.
     """
-    token = request.headers.get('Authorization')
     data = request.json
     amount = float(data.get('amount', 0))
     bank_details = data.get('bankDetails', {})
     
-    if not token or not token.startswith('Bearer '):
+    if not bearer_token():
         return jsonify({'success': False, 'error': 'Unauthorized'}), 401
     
     if amount <= 0:
@@ -1021,7 +1338,7 @@ def request_withdrawal():
         return jsonify({'success': False, 'error': 'Incomplete bank details'}), 400
 
     try:
-        decoded_token = auth.verify_id_token(token.split('Bearer ')[1])
+        decoded_token = verify_request_token()
         uid = decoded_token['uid']
         
         # Atomic Balance Check & Status Flagging
@@ -1046,7 +1363,6 @@ def request_withdrawal():
             return jsonify({'success': False, 'error': str(ve)}), 400
 
         # Create Withdrawal Request
-        request_ref = db.reference('withdrawal_requests').push()
         user_name = data.get('userName', 'Seller')
         user_email = data.get('userEmail', '')
         withdraw_method = data.get('method', 'Bank Transfer')
@@ -1066,7 +1382,18 @@ def request_withdrawal():
             'status': 'pending',
             'createdAt': {".sv": "timestamp"}
         }
-        request_ref.set(request_data)
+        # The request record is the only reference to the locked funds: write it on its own,
+        # and release the funds again if it cannot be written
+        request_key = generate_push_id()
+        try:
+            db.reference(f'withdrawal_requests/{request_key}').set(request_data)
+        except Exception:
+            reverse_wallet_move(uid, {'balance': amount, 'in_escrow': -amount}, 'withdrawal request not recorded')
+            raise
+
+        # Admin alert, audit entry and history follow in one multi-path update;
+        # the seller's notification is queued once it succeeds
+        batch = WriteBatch()
 
         # --- DUAL NOTIFICATION ROUTING ---
         
@@ -1074,7 +1401,7 @@ def request_withdrawal():
         send_system_notification(uid,
                                 'Withdrawal Requested',
                                 f'Your request for RS {amount} is being processed.',
-                                'payment', '/wallet.html')
+                                'payment', '/wallet.html', batch=batch)
         
         # Payload B: For the ADMIN/STAFF - system-facing (no crossover)
         admin_payload_msg = f"User {user_name} ({user_email}) has requested a withdrawal of RS {amount} via {withdraw_method}."
@@ -1082,22 +1409,25 @@ def request_withdrawal():
                                admin_payload_msg,
                                'warning', '/admin-dashboard.html#wallet',
                                {'user_id': uid, 'user_name': user_name, 'user_email': user_email,
-                                'amount': amount, 'method': withdraw_method, 'request_id': request_ref.key})
+                                'amount': amount, 'method': withdraw_method, 'request_id': request_key},
+                               batch=batch)
 
         # Log Audit
-        log_audit("withdrawal_requested", uid, request_ref.key, None, {'amount': amount})
+        log_audit("withdrawal_requested", uid, request_key, None, {'amount': amount}, batch=batch)
 
         # Write to global transactions flat list
-        db.reference(f'transactions/{uid}').push({
+        batch.push(f'transactions/{uid}', {
             'type': 'withdrawal_request',
             'amount': amount,
             'status': 'pending',
             'method': withdraw_method,
-            'requestId': request_ref.key,
+            'requestId': request_key,
             'timestamp': {".sv": "timestamp"}
         })
 
-        return jsonify({'success': True, 'requestId': request_ref.key})
+        commit_follow_ups(batch, f'Withdrawal request {request_key}')
+
+        return jsonify({'success': True, 'requestId': request_key})
 
     except Exception as e:
         print(f"Withdrawal Error: {e}")
@@ -1152,19 +1482,26 @@ def complete_withdrawal():
         except ValueError as ve:
             return jsonify({'success': False, 'error': str(ve)}), 400
 
-        # Update Request Status
-        req_ref.update({
-            'status': 'completed',
-            'slipUrl': slip_url,
-            'proof_url': slip_url,
-            'admin_note': admin_note,
-            'completedAt': {".sv": "timestamp"},
-            'completion_timestamp': {".sv": "timestamp"},
-            'completedBy': staff_id
-        })
+        # Update Request Status on its own; if it fails the request would still look
+        # pending after the payout, so the deduction is reversed
+        try:
+            req_ref.update({
+                'status': 'completed',
+                'slipUrl': slip_url,
+                'proof_url': slip_url,
+                'admin_note': admin_note,
+                'completedAt': {".sv": "timestamp"},
+                'completion_timestamp': {".sv": "timestamp"},
+                'completedBy': staff_id
+            })
+        except Exception:
+            reverse_wallet_move(uid, {'in_escrow': amount, 'total_withdrawn': -amount}, f'withdrawal {request_id} not marked completed')
+            raise
+
+        batch = WriteBatch()
 
         # Record Transaction for History
-        db.reference(f'transactions/{uid}').push({
+        batch.push(f'transactions/{uid}', {
             'type': 'withdrawal',
             'amount': amount,
             'status': 'completed',
@@ -1177,15 +1514,18 @@ def complete_withdrawal():
         # Notify Seller (user-facing)
         send_system_notification(uid, 'Withdrawal Completed',
                                 f'Your RS {amount} withdrawal is successful. View slip in your history.',
-                                'payment', '/wallet.html')
+                                'payment', '/wallet.html', batch=batch)
 
         # Notify Admin/Staff (system-facing - no crossover)
         send_admin_notification('Withdrawal Completed',
                                f'Staff {staff_id} completed withdrawal request #{request_id} for RS {amount}. Slip uploaded.',
                                'system', '/admin-dashboard.html#wallet',
-                               {'request_id': request_id, 'user_id': uid, 'amount': amount, 'staff_id': staff_id})
+                               {'request_id': request_id, 'user_id': uid, 'amount': amount, 'staff_id': staff_id},
+                               batch=batch)
+
+        log_audit("withdrawal_completed", staff_id, request_id, {'status': 'pending'}, {'status': 'completed', 'slip': slip_url}, batch=batch)
 
-        log_audit("withdrawal_completed", staff_id, request_id, {'status': 'pending'}, {'status': 'completed', 'slip': slip_url})
+        commit_follow_ups(batch, f'Withdrawal completion {request_id}')
 
         return jsonify({'success': True})
 
@@ -1252,10 +1592,16 @@ def approve_payout():
             'completedBy': staff_id,
             'slipUrl': proof_url  # keep backward compatibility
         }
-        req_ref.update(updates)
+        try:
+            req_ref.update(updates)
+        except Exception:
+            reverse_wallet_move(uid, {'in_escrow': amount, 'total_withdrawn': -amount}, f'payout {request_id} not marked completed')
+            raise
+
+        batch = WriteBatch()
 
         # Record Transaction for History
-        db.reference(f'transactions/{uid}').push({
+        batch.push(f'transactions/{uid}', {
             'type': 'withdrawal',
             'amount': amount,
             'status': 'completed',
@@ -1268,17 +1614,21 @@ def approve_payout():
         # Notify Seller (user-facing)
         send_system_notification(uid, 'Withdrawal Approved',
                                 f'Your withdrawal of RS {amount} has been approved. Check history for the payment slip.',
-                                'payment', '/wallet.html')
+                                'payment', '/wallet.html', batch=batch)
 
         # Notify Admin/Staff (system-facing - no crossover)
         send_admin_notification('Withdrawal Approved',
                                f'Staff {staff_id} approved withdrawal request #{request_id} for RS {amount}. Proof uploaded.',
                                'system', '/admin-dashboard.html#wallet',
-                               {'request_id': request_id, 'user_id': uid, 'amount': amount, 'staff_id': staff_id})
+                               {'request_id': request_id, 'user_id': uid, 'amount': amount, 'staff_id': staff_id},
+                               batch=batch)
 
         log_audit("withdrawal_approved", staff_id, request_id,
                   {'status': 'pending'},
-                  {'status': 'completed', 'proof_url': proof_url, 'admin_note': admin_note})
+                  {'status': 'completed', 'proof_url': proof_url, 'admin_note': admin_note},
+                  batch=batch)
+
+        commit_follow_ups(batch, f'Payout approval {request_id}')
 
         return jsonify({'success': True})
 
@@ -1331,16 +1681,23 @@ def reject_withdrawal():
         except Exception as ve:
             return jsonify({'success': False, 'error': str(ve)}), 400
 
-        # Update Request Status
-        request_ref.update({
-            'status': 'rejected',
-            'rejectionReason': reason,
-            'rejectedAt': {".sv": "timestamp"},
-            'rejectedBy': staff_id
-        })
+        # Update Request Status on its own; if it fails the funds go back into escrow
+        # so the still-pending request can be processed again
+        try:
+            request_ref.update({
+                'status': 'rejected',
+                'rejectionReason': reason,
+                'rejectedAt': {".sv": "timestamp"},
+                'rejectedBy': staff_id
+            })
+        except Exception:
+            reverse_wallet_move(user_id, {'in_escrow': amount, 'balance': -amount}, f'withdrawal {request_id} not marked rejected')
+            raise
+
+        batch = WriteBatch()
 
         # Write to global transactions flat list
-        db.reference(f'transactions/{user_id}').push({
+        batch.push(f'transactions/{user_id}', {
             'type': 'withdrawal_rejected',
             'amount': amount,
             'status': 'rejected',
@@ -1352,13 +1709,16 @@ def reject_withdrawal():
         # Notify User (user-facing)
         send_system_notification(user_id, 'Withdrawal Rejected',
                                 f'Your request for RS {amount} was rejected: {reason}. Funds have been returned to your wallet.',
-                                'danger', '/wallet.html')
+                                'danger', '/wallet.html', batch=batch)
 
         # Notify Admin/Staff (system-facing - no crossover)
         send_admin_notification('Withdrawal Rejected',
                                f'Staff {staff_id} rejected withdrawal request #{request_id} for RS {amount}. Reason: {reason}',
                                'system', '/admin-dashboard.html#wallet',
-                               {'request_id': request_id, 'user_id': user_id, 'amount': amount, 'staff_id': staff_id, 'reason': reason})
+                               {'request_id': request_id, 'user_id': user_id, 'amount': amount, 'staff_id': staff_id, 'reason': reason},
+                               batch=batch)
+
+        commit_follow_ups(batch, f'Withdrawal rejection {request_id}')
 
         return jsonify({'success': True})
 
@@ -1368,6 +1728,11 @@ def reject_withdrawal():
 
 # --- API: Bidding & Auction Engine ---
 
+# Bid state kept on products/<id>/auction for the storefront; everything else about the lead (the
+# leader's proxy ceiling, locked amounts, shipping address) lives in server-only auction_state/<id>
+AUCTION_PUBLIC_FIELDS = ('currentHighestBid', 'highestBidderId', 'bidCount')
+AUCTION_PRIVATE_FIELDS = ('topProxy', 'highestBidderLocked', 'highestBidderEscrow', 'highestBidderShipping', 'shippingDetails')
+
 @app.route('/api/v1/bids/place', methods=['POST'])
 def place_bid():
     """
@@ -1375,21 +1740,24 @@ def place_bid():
     Handles atomic transactions for bid placement, proxy-bidding logic,
     and real-time notifications for outbid events.
     """
-    token = request.headers.get('Authorization')
     data = request.json
     product_id = data.get('productId')
     bid_amount = float(data.get('bidAmount', 0))
     max_bid = float(data.get('maxBid', bid_amount)) # Proxy bidding support
     
-    if not token or not token.startswith('Bearer '):
+    if not bearer_token():
         return jsonify({'success': False, 'error': 'Unauthorized'}), 401
     
     try:
-        decoded_token = auth.verify_id_token(token.split('Bearer ')[1])
+        decoded_token = verify_request_token()
         uid = decoded_token['uid']
         
+        # Product, bidder wallet and private auction state are independent reads; issue them together
+        reads = request_reads()
+        reads.prefetch(f'products/{product_id}', f'users/{uid}/wallet', f'auction_state/{product_id}')
+
         product_ref = db.reference(f'products/{product_id}')
-        product = product_ref.get()
+        product = reads.get(f'products/{product_id}')
         
         if not product:
             return jsonify({'success': False, 'error': 'Product not found'}), 404
@@ -1402,13 +1770,13 @@ def place_bid():
             return jsonify({'success': False, 'error': 'Sellers cannot bid on their own items.'}), 403
 
         # ROLE PROTECTION LAYER
-        user_role = db.reference(f'users/{uid}/role').get()
+        user_role = authz_cache.role(uid)
         if (user_role or 'Buyer').lower() == 'seller':
             return jsonify({'success': False, 'error': 'Forbidden: Sellers are restricted from bidding on any marketplace items.'}), 403
 
         # WALLET BALANCE GUARD
         wallet_ref = db.reference(f'users/{uid}/wallet')
-        wallet = wallet_ref.get() or {'balance': 0, 'locked_balance': 0}
+        wallet = reads.get(f'users/{uid}/wallet') or {'balance': 0, 'locked_balance': 0}
         available_balance = float(wallet.get('balance', 0))
         
         # DYNAMIC CALCULATION LAYER (Replacing 7% flat)
@@ -1429,19 +1797,33 @@ def place_bid():
             }), 400
 
         # Save Proxy Shipping Details for future auto-adjustments
-        db.reference(f'proxy_bids/{product_id}/{uid}/shippingDetails').set(shipping_details)
-        db.reference(f'proxy_bids/{product_id}/{uid}/baseShipping').set(total_shipping)
-
-        # ATOMIC BID TRANSACTION
-        def bid_transaction(current_product):
-            if current_product is None: return None
+        db.reference(f'proxy_bids/{product_id}/{uid}').update({'shippingDetails': shipping_details, 'baseShipping': total_shipping})
+
+        # Auctions without private state yet start from their public fields; the leader's proxy is
+        # the only one still in play
+        state_ref = db.reference(f'auction_state/{product_id}')
+        initial_state = {}
+        if reads.get(f'auction_state/{product_id}') is None:
+            initial_state = {field: auction[field] for field in AUCTION_PUBLIC_FIELDS + AUCTION_PRIVATE_FIELDS if field in auction}
+            leader = auction.get('highestBidderId')
+            if leader and 'topProxy' not in initial_state:
+                leader_proxy = db.reference(f'proxy_bids/{product_id}/{leader}/maxBid').get()
+                if leader_proxy:
+                    initial_state['topProxy'] = {'bidderId': leader, 'maxBid': leader_proxy}
+
+        inc = float(auction.get('minIncrement', 100))
+        starting = float(auction.get('startingPrice', 0))
+        previous_state = {}
+
+        # ATOMIC BID TRANSACTION (on the private auction state)
+        def bid_transaction(current_state):
+            curr_auction = dict(current_state if current_state is not None else initial_state)
+            previous_state.clear()
+            previous_state.update(curr_auction)
             
             # 1. Basic Validation
-            curr_auction = current_product.get('auction', {})
             if curr_auction.get('highestBidderId') == uid:
                 raise ValueError("You are already the leading bidder.")
-            inc = float(curr_auction.get('minIncrement', 100))
-            starting = float(curr_auction.get('startingPrice', 0))
             current_highest = float(curr_auction.get('currentHighestBid', 0))
             
             min_required = max(starting, current_highest + inc)
@@ -1450,19 +1832,13 @@ def place_bid():
                 raise ValueError(f"Bid too low. Minimum required: RS {min_required}")
             
             # 2. Proxy Bidding Logic (Competitive Check)
-            # Fetch highest proxy bid from other users
-            proxy_ref = db.reference(f'proxy_bids/{product_id}')
-            proxies = proxy_ref.get() or {}
-            
-            highest_other_proxy_val = 0
-            highest_other_bidder = None
-            
-            for other_uid, p_data in proxies.items():
-                if other_uid != uid:
-                    p_max = float(p_data.get('maxBid', 0))
-                    if p_max > highest_other_proxy_val:
-                        highest_other_proxy_val = p_max
-                        highest_other_bidder = other_uid
+            # Every losing proxy is already below the current bid, so only the leader's (topProxy,
+            # read atomically with the rest of the state) can still compete
+            top_proxy = curr_auction.get('topProxy')
+            highest_other_bidder, highest_other_proxy_val = None, 0
+            if top_proxy and top_proxy.get('bidderId') != uid:
+                highest_other_bidder = top_proxy.get('bidderId')
+                highest_other_proxy_val = float(top_proxy.get('maxBid', 0))
             
             # Battle: User Max Bid vs Other Proxy Max Bid
             if max_bid <= highest_other_proxy_val:
@@ -1473,18 +1849,15 @@ def place_bid():
                 curr_auction['bidCount'] = (curr_auction.get('bidCount', 0)) + 1
                 
                 # Re-calculate Proxy Winner's New Lock
-                # Fetch their shipping from proxy node
-                proxy_data = proxies.get(highest_other_bidder, {})
-                p_ship = float(proxy_data.get('baseShipping', 500))
+                # The proxy holder leads, so their shipping is already on the auction
+                p_ship = float(curr_auction.get('highestBidderShipping', 500))
                 p_escrow = FeeEngine.calculate_escrow(new_total_bid)
                 
                 curr_auction['highestBidderLocked'] = new_total_bid + p_escrow + p_ship
                 curr_auction['highestBidderEscrow'] = p_escrow
                 curr_auction['highestBidderShipping'] = p_ship
-                curr_auction['shippingDetails'] = proxy_data.get('shippingDetails', {})
-                
-                current_product['auction'] = curr_auction
-                return current_product 
+                curr_auction['topProxy'] = top_proxy
+                return curr_auction
             else:
                 # User wins or is highest for now
                 new_total_bid = max(highest_other_proxy_val + inc, starting, bid_amount)
@@ -1498,23 +1871,33 @@ def place_bid():
                 curr_auction['highestBidderEscrow'] = new_escrow
                 curr_auction['highestBidderShipping'] = total_shipping
                 curr_auction['shippingDetails'] = shipping_details
-
-                current_product['auction'] = curr_auction
-                return current_product
+                curr_auction['topProxy'] = {'bidderId': uid, 'maxBid': max_bid}
+                return curr_auction
+
+        def publish_bid(current_auction):
+            if current_auction is None: return None
+            if int(current_auction.get('bidCount', 0) or 0) > result['bidCount']:
+                return current_auction  # A later bid has already been published
+            for field in AUCTION_PUBLIC_FIELDS:
+                current_auction[field] = result[field]
+            for field in AUCTION_PRIVATE_FIELDS:
+                current_auction.pop(field, None)
+            return current_auction
 
         try:
-            # 1. Capture Previous State for Atomic Wallet Moves
-            old_auction = auction
-            old_highest_bidder = old_auction.get('highestBidderId')
-            old_highest_bid = float(old_auction.get('currentHighestBid', 0))
-
-            # 2. Execute Product Transaction
-            result = product_ref.transaction(bid_transaction)
+            # 1. Execute State Transaction, then publish the new lead on the product
+            result = state_ref.transaction(bid_transaction)
             if not result:
                 return jsonify({'success': False, 'error': 'Bid transaction failed. Possible race condition.'}), 400
+            product_ref.child('auction').transaction(publish_bid)
 
-            new_highest_bidder = result.get('auction', {}).get('highestBidderId')
-            new_highest_bid = float(result.get('auction', {}).get('currentHighestBid', 0))
+            # 2. Previous State (as seen by the committed attempt) for Atomic Wallet Moves
+            old_auction = previous_state
+            old_highest_bidder = old_auction.get('highestBidderId')
+            old_highest_bid = float(old_auction.get('currentHighestBid', 0))
+
+            new_highest_bidder = result.get('highestBidderId')
+            new_highest_bid = float(result.get('currentHighestBid', 0))
 
             # 3. WALLET ENGINE: Lock & Release
             # Path A: User became the new high bidder
@@ -1538,7 +1921,7 @@ def place_bid():
                     send_system_notification(old_highest_bidder, 'Outbid!', f'Your RS {total_to_refund:,.2f} (Bid + Fees) has been returned to your available balance.', 'warning')
 
                 # Lock New Bidder's Funds
-                total_to_lock = result.get('auction', {}).get('highestBidderLocked', new_highest_bid * 1.07)
+                total_to_lock = result.get('highestBidderLocked', new_highest_bid * 1.07)
                 def lock_new_funds(w):
                     if not w: return w
                     avail = float(w.get('balance', 0))
@@ -1574,7 +1957,7 @@ def place_bid():
             # Path B: User was outbid by a proxy instantly
             elif new_highest_bidder != uid and new_highest_bidder == old_highest_bidder:
                 # Previous bidder's lock needs update to the new proxy-triggered price
-                total_new_lock = result.get('auction', {}).get('highestBidderLocked', new_highest_bid * 1.07)
+                total_new_lock = result.get('highestBidderLocked', new_highest_bid * 1.07)
                 total_old_lock = old_auction.get('highestBidderLocked', old_highest_bid * 1.07)
                 
                 def update_proxy_lock(w):
@@ -1621,17 +2004,16 @@ def finalize_auction():
     Finalizes an auction by selecting a specific bidder.
     Moves winner's locked funds to in_escrow and marks product sold.
     """
-    token = request.headers.get('Authorization')
     data = request.json
     product_id = data.get('productId')
     winner_uid = data.get('winnerUid')
     winning_bid_amt = float(data.get('amount', 0))
 
-    if not token or not token.startswith('Bearer '):
+    if not bearer_token():
         return jsonify({'success': False, 'error': 'Unauthorized'}), 401
     
     try:
-        decoded_token = auth.verify_id_token(token.split('Bearer ')[1])
+        decoded_token = verify_request_token()
         seller_uid = decoded_token['uid']
         
         product_ref = db.reference(f'products/{product_id}')
@@ -1671,8 +2053,8 @@ def finalize_auction():
         
         tracking_number = 'STH-' + str(int(time.time() * 1000))[-8:]
         
-        # Retrieve precise financial breakdown from auction record
-        auction_data = product.get('auction', {})
+        # Retrieve precise financial breakdown from the private auction state (public record for older auctions)
+        auction_data = db.reference(f'auction_state/{product_id}').get() or product.get('auction', {})
         shipping_details = auction_data.get('shippingDetails', {})
         escrow_fee = float(auction_data.get('highestBidderEscrow', winning_bid_amt * 0.035))
         shipping_total = float(auction_data.get('highestBidderShipping', winning_bid_amt * 0.05))
@@ -1932,6 +2314,7 @@ def get_admin_email_details(email_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 # --- AI Recommendation & Behavior Tracking ---
+MAX_SENTIMENT_BATCH = 500
 
 @app.route('/api/v1/analytics/trends', methods=['GET'])
 def get_trends():
@@ -1944,19 +2327,8 @@ def get_trends():
         trends = nlp_engine.analyze_trends()
         
         # 2. Get Live Search Telemetry (Most popular queries)
-        search_ref = db.reference('global_trends/search_terms')
-        search_data = search_ref.get() or {}
-        
-        # Transform search data: { "keyword": count, ... } -> [ { "keyword": "...", "count": X }, ... ]
-        search_list = []
-        for term, count in search_data.items():
-            # De-sanitize characters that were escaped for Firebase
-            display_term = term.replace('_', ' ')
-            search_list.append({"keyword": display_term, "count": count})
-            
-        # Sort by popularity
-        search_list.sort(key=lambda x: x['count'], reverse=True)
-        top_search = search_list[:15] # Top 15 search terms
+        # Bounded heavy-hitter summary, so this read stays constant-size
+        top_search = search_trends.top_terms(15) # Top 15 search terms
 
         return jsonify({
             'success': True,
@@ -1970,6 +2342,47 @@ def get_trends():
         print(f"Analytics API Error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/v1/analytics/sentiment', methods=['POST'])
+def batch_sentiment():
+    """
+    Batch sentiment scoring for moderation and seller dashboards.
+    Accepts either raw `texts` or `reviewIds`; review scores are persisted on the review.
+    """
+    if not bearer_token():
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+
+    try:
+        verify_request_token()
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 401
+
+    try:
+        data = request.get_json() or {}
+        texts = data.get('texts')
+        review_ids = data.get('reviewIds')
+
+        if texts is not None:
+            if not isinstance(texts, list) or len(texts) > MAX_SENTIMENT_BATCH:
+                return jsonify({'success': False, 'error': f'texts must be a list of at most {MAX_SENTIMENT_BATCH} items'}), 400
+            scores = nlp_engine.get_sentiments(texts)
+            return jsonify({'success': True, 'scores': scores})
+
+        if review_ids is not None:
+            if not isinstance(review_ids, list) or len(review_ids) > MAX_SENTIMENT_BATCH:
+                return jsonify({'success': False, 'error': f'reviewIds must be a list of at most {MAX_SENTIMENT_BATCH} items'}), 400
+            if not all(is_valid_key(r_id) for r_id in review_ids):
+                return jsonify({'success': False, 'error': 'reviewIds must be non-empty review keys'}), 400
+            # Read all reviews concurrently rather than one round-trip at a time
+            fetched = request_reads().get_many(*(f'reviews/{r_id}' for r_id in review_ids))
+            reviews = {r_id: review for r_id, review in zip(review_ids, fetched) if review}
+            scores = nlp_engine.score_reviews(reviews)
+            return jsonify({'success': True, 'scores': scores})
+
+        return jsonify({'success': False, 'error': 'texts or reviewIds is required'}), 400
+    except Exception as e:
+        print(f"Sentiment API Error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/v1/analytics/track-search', methods=['POST'])
 def track_search():
     """
@@ -1995,18 +2408,15 @@ def track_search():
             search_ref.push(new_search)
             
             # Keep only last 20 searches to prevent bloating
-            history = search_ref.get()
-            if history and len(history) > 20:
-                keys = sorted(history.keys(), key=lambda x: history[x].get('timestamp', 0))
-                for i in range(len(keys) - 20):
-                    search_ref.child(keys[i]).delete()
+            # Push keys are chronological, so a shallow key listing is enough to find the oldest
+            keys = sorted(list_keys(f'search_history/{uid}'))
+            if len(keys) > 20:
+                search_ref.update({key: None for key in keys[:len(keys) - 20]})
 
         # Log global trend (Anonymous)
-        global_trends_ref = db.reference('global_trends/search_terms')
+        # Counted in-process and merged into the persisted summary periodically
         if query:
-            # Increment frequency of search term
-            term_ref = global_trends_ref.child(re.sub(r'[\.#\$\/\[\]]', '_', query))
-            term_ref.transaction(lambda current: (current or 0) + 1)
+            search_trends.record(query)
 
         return jsonify({'success': True})
     except Exception as e:
@@ -0,0 +1,372 @@
+"""
+Offline end-to-end load test of the main API routes.
+
+Starts the Flask app in-process (threaded WSGI server) with the in-memory
+RTDB emulator (RTDB_BACKEND=emulator), the local Vision backend and mock
+price scrapers, seeds it with users, auctions and orders, then drives a
+weighted mix of requests from `--concurrency` client threads:
+
+    bid       POST /api/v1/bids/place            competing bids on shared auctions
+    withdraw  POST /api/v1/wallet/withdraw       seller withdrawal requests
+    tracking  POST /api/v1/orders/update-tracking  staff moving orders through the hubs
+    review    POST /api/v1/reviews/submit        buyer reviews of delivered orders
+    compare   POST /api/compare-prices           price comparison
+    verify    POST /api/verify-image             listing image verification
+
+ID tokens are "bench:<uid>", accepted by a verifier swapped into the app's
+token cache; everything else runs the real handlers. Per route it reports
+throughput, p50/p95/p99 latency, rejections (4xx: outbid, lost a race)
+and errors (5xx or no response), plus RTDB round-trips per request from
+the app's RTDB metrics.
+
+Results are compared with the previous run saved at --baseline (printed as
+% change) and then saved there, unless --no-save is given.
+
+Usage (from backend/):
+    python benchmarks/api_load.py [--requests 2000] [--concurrency 16]
+        [--mix bid=30,withdraw=10,tracking=20,review=15,compare=15,verify=10]
+        [--rtdb-latency-ms 20] [--rtdb-jitter-ms 10] [--conflict-rate 0.0]
+        [--vision-latency-ms 300] [--scraper-latency-ms 800] [--baseline PATH] [--no-save]
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import logging
+import os
+import queue
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from logistics_constants import LOGISTICS_STATES, PAKISTAN_HUBS
+from vision_load import synthetic_image
+
+DEFAULT_MIX = 'bid=30,withdraw=10,tracking=20,review=15,compare=15,verify=10'
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results', 'api_load.json')
+ROUTES = {
+    'bid': '/api/v1/bids/place',
+    'withdraw': '/api/v1/wallet/withdraw',
+    'tracking': '/api/v1/orders/update-tracking',
+    'review': '/api/v1/reviews/submit',
+    'compare': '/api/compare-prices',
+    'verify': '/api/verify-image',
+}
+SEARCH_TITLES = ['iPhone 13 Pro', 'Samsung Galaxy S21', 'Canon EOS 200D', 'Dell XPS 13', 'Sony WH-1000XM4',
+                 'Nike Air Max', 'Honda CG 125', 'PS5 Console', 'Dawlance Microwave', 'Haier Inverter AC']
+CITIES = ['Karachi', 'Lahore', 'Islamabad', 'Faisalabad', 'Peshawar', 'Multan']
+
+def seed_data(args, rng):
+    """RTDB contents for the run: buyers, sellers, a staff member, auctions and orders."""
+    users, products, orders, staff = {}, {}, {}, {}
+    for i in range(args.buyers):
+        users[f'buyer{i}'] = {'role': 'Buyer', 'email': f'buyer{i}@bench.local', 'fullName': f'Buyer {i}',
+                              'wallet': {'balance': 50_000_000, 'locked_balance': 0},
+                              'settings': {'notifications': {'push': True, 'email': rng.random() < 0.5}}}
+    for i in range(args.sellers):
+        users[f'seller{i}'] = {'role': 'Seller', 'email': f'seller{i}@bench.local', 'fullName': f'Seller {i}',
+                               'wallet': {'balance': 10_000_000, 'in_escrow': 0, 'total_withdrawn': 0}}
+    users['staff0'] = {'role': 'Staff', 'email': 'staff0@bench.local'}
+    staff['staff0'] = {'name': 'Hub Operator', 'active': True}
+
+    for i in range(args.products):
+        products[f'product{i}'] = {
+            'name': f'Bench Item {i}', 'sellerId': f'seller{i % args.sellers}', 'status': 'active',
+            'location': rng.choice(CITIES), 'weight': rng.choice([1, 5, 12]), 'fragility': 'Standard',
+            'auction': {'enabled': True, 'startingPrice': 1000, 'minIncrement': 100,
+                        'endTime': int((time.time() + 86400) * 1000)}
+        }
+
+    # Orders the staff walk through every logistics state, and delivered ones awaiting a review
+    for i in range(args.orders):
+        orders[f'track{i}'] = {'buyerId': f'buyer{i % args.buyers}', 'sellerId': f'seller{i % args.sellers}',
+                               'productId': f'product{i % args.products}', 'price': 5000, 'status': 'pending'}
+        orders[f'done{i}'] = {'buyerId': f'buyer{i % args.buyers}', 'sellerId': f'seller{i % args.sellers}',
+                              'productId': f'product{i % args.products}', 'price': 5000, 'status': 'delivered'}
+    return {'users': users, 'products': products, 'orders': orders, 'staff_registry': staff}
+
+def start_local_server(args, workdir):
+    """Imports app.py against the emulator and local backends and serves it on a free port."""
+    os.environ.update({
+        'RTDB_BACKEND': 'emulator',
+        'RTDB_EMULATOR_SEED': os.path.join(workdir, 'seed.json'),
+        'RTDB_EMULATOR_LATENCY_MS': str(args.rtdb_latency_ms),
+        'RTDB_EMULATOR_JITTER_MS': str(args.rtdb_jitter_ms),
+        'RTDB_EMULATOR_CONFLICT_RATE': str(args.conflict_rate),
+        'VISION_BACKEND': 'local',
+        'VISION_LOCAL_LATENCY_MS': str(args.vision_latency_ms),
+        'VISION_LOCAL_JITTER_MS': str(args.vision_latency_ms / 3),
+        'PRICE_SCRAPER': 'mock',
+        'MOCK_SCRAPER_LATENCY_MS': str(args.scraper_latency_ms),
+        'MOCK_SCRAPER_JITTER_MS': str(args.scraper_latency_ms / 2),
+        'VERDICT_CACHE_PATH': os.path.join(workdir, 'verdicts.sqlite3'),
+        'PHASH_INDEX_PATH': os.path.join(workdir, 'verdicts.sqlite3'),
+        'AUDIT_JOURNAL_PATH': os.path.join(workdir, 'audit_journal.jsonl'),
+        'RTDB_METRICS': 'true',
+    })
+
+    from werkzeug.serving import make_server
+    import app as app_module
+    from services.token_cache import VerifiedTokenCache
+
+    def bench_verifier(token, check_revoked=False):
+        if not token.startswith('bench:'):
+            raise ValueError('Not a benchmark token')
+        return {'uid': token.split(':', 1)[1], 'exp': time.time() + 3600}
+    app_module.id_token_cache = VerifiedTokenCache(verifier=bench_verifier)
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}', server, app_module
+
+class Workload:
+    """Builds each request of the mix and keeps the client-side state that keeps them valid."""
+    def __init__(self, args, rng):
+        self.args = args
+        self.rng = rng
+        self.lock = threading.Lock()
+        self.image_counter = iter(range(10 ** 9))
+        self.leading_bid = {f'product{i}': 1000 for i in range(args.products)}
+        self.tracking = queue.Queue()
+        for i in range(args.orders):
+            self.tracking.put((f'track{i}', 0))
+        self.reviewable = queue.Queue()
+        for i in range(args.orders):
+            self.reviewable.put(f'done{i}')
+
+    @staticmethod
+    def auth(uid):
+        return {'Authorization': f'Bearer bench:{uid}'}
+
+    def bid(self, session, url):
+        with self.lock:
+            product_id = f'product{self.rng.randrange(self.args.products)}'
+            buyer = f'buyer{self.rng.randrange(self.args.buyers)}'
+            amount = self.leading_bid[product_id] + 100 * self.rng.randint(1, 3)
+        resp = session.post(url, headers=self.auth(buyer), timeout=60, json={
+            'productId': product_id, 'bidAmount': amount, 'maxBid': amount,
+            'shippingDetails': {'city': self.rng.choice(CITIES)}})
+        if resp.ok:
+            with self.lock:
+                self.leading_bid[product_id] = max(self.leading_bid[product_id], resp.json().get('currentBid', amount))
+        return resp
+
+    def withdraw(self, session, url):
+        seller = f'seller{self.rng.randrange(self.args.sellers)}'
+        return session.post(url, headers=self.auth(seller), timeout=60, json={
+            'amount': 10, 'method': 'Bank Transfer', 'userName': seller, 'userEmail': f'{seller}@bench.local',
+            'bankDetails': {'bankName': 'Bench Bank', 'title': seller, 'accountNumber': '0000111122223333'}})
+
+    def tracking_update(self, session, url):
+        try:
+            order_id, rank = self.tracking.get_nowait()
+        except queue.Empty:
+            return None
+        resp = session.post(url, headers=self.auth('staff0'), timeout=60, json={
+            'orderId': order_id, 'status': LOGISTICS_STATES[rank + 1], 'staffId': 'staff0',
+            'location': self.rng.choice(PAKISTAN_HUBS), 'note': 'Scanned by load test'})
+        if resp.ok:
+            rank += 1
+        if rank + 1 < len(LOGISTICS_STATES):
+            self.tracking.put((order_id, rank))
+        return resp
+
+    def review(self, session, url):
+        try:
+            order_id = self.reviewable.get_nowait()
+        except queue.Empty:
+            return None
+        index = int(order_id[len('done'):])
+        buyer, seller = f'buyer{index % self.args.buyers}', f'seller{index % self.args.sellers}'
+        return session.post(url, headers=self.auth(buyer), timeout=60, json={
+            'orderId': order_id, 'rating': self.rng.randint(3, 5), 'comment': 'Load test review',
+            'reviewerId': buyer, 'targetId': seller, 'productId': f'product{index % self.args.products}',
+            'type': 'Buyer-to-Seller'})
+
+    def compare(self, session, url):
+        return session.post(url, timeout=60, json={'title': self.rng.choice(SEARCH_TITLES)})
+
+    def verify(self, session, url):
+        with self.lock:
+            n = next(self.image_counter)
+        return session.post(url, timeout=60, files={'image': ('upload.jpg', synthetic_image(n), 'image/jpeg')})
+
+    def call(self, name, session, base_url):
+        handler = {'bid': self.bid, 'withdraw': self.withdraw, 'tracking': self.tracking_update,
+                   'review': self.review, 'compare': self.compare, 'verify': self.verify}[name]
+        return handler(session, base_url + ROUTES[name])
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(','):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition('=')
+        if name.strip() not in ROUTES:
+            raise SystemExit(f"Unknown route '{name}' in --mix (choose from {', '.join(ROUTES)})")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+def run(url, args, workload, rng):
+    weights = parse_mix(args.mix)
+    names = list(weights)
+    plan = rng.choices(names, weights=[weights[n] for n in names], k=args.requests)
+    results = {name: [] for name in names}
+    local = threading.local()
+
+    def one(name):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            resp = workload.call(name, local.session, url)
+            if resp is None:
+                return  # nothing left to track/review
+            status = resp.status_code
+        except Exception:
+            status = 0
+        results[name].append(((time.perf_counter() - started) * 1000, status))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(one, plan))
+    return results, time.perf_counter() - started
+
+def summarize(results, wall, rtdb_report):
+    def pct(values, q):
+        return round(values[min(len(values) - 1, int(len(values) * q))], 1) if values else 0.0
+
+    summary = {}
+    everything = []
+    for name, samples in results.items():
+        latencies = sorted(s[0] for s in samples)
+        everything += latencies
+        errors = sum(1 for _, status in samples if status == 0 or status >= 500)
+        rejected = sum(1 for _, status in samples if 400 <= status < 500)
+        endpoint = rtdb_report.get(ROUTES[name], {})
+        summary[name] = {
+            'requests': len(samples),
+            'throughput': round(len(samples) / wall, 2),
+            'p50Ms': pct(latencies, 0.50),
+            'p95Ms': pct(latencies, 0.95),
+            'p99Ms': pct(latencies, 0.99),
+            'rejected': rejected,
+            'errors': errors,
+            'errorRate': round(errors / len(samples), 4) if samples else 0.0,
+            'rtdbCallsPerRequest': endpoint.get('callsPerRequest')
+        }
+    everything.sort()
+    summary['all'] = {
+        'requests': len(everything),
+        'throughput': round(len(everything) / wall, 2),
+        'p50Ms': pct(everything, 0.50),
+        'p95Ms': pct(everything, 0.95),
+        'p99Ms': pct(everything, 0.99),
+        'rejected': sum(s['rejected'] for s in summary.values()),
+        'errors': sum(s['errors'] for s in summary.values()),
+        'errorRate': round(sum(s['errors'] for s in summary.values()) / len(everything), 4) if everything else 0.0,
+        'rtdbCallsPerRequest': None
+    }
+    return summary
+
+def rtdb_calls_by_handler(app_module):
+    """The app's RTDB metrics per endpoint, keyed by URL rule."""
+    if app_module.rtdb_metrics is None:
+        return {}
+    by_endpoint = app_module.rtdb_metrics.snapshot()['endpoints']
+    by_rule = {}
+    for rule in app_module.app.url_map.iter_rules():
+        if rule.endpoint in by_endpoint:
+            by_rule[rule.rule] = by_endpoint[rule.endpoint]
+    return by_rule
+
+def change(current, previous):
+    if not previous:
+        return ''
+    return f'{(current - previous) / previous:+.0%}'
+
+def report(summary, baseline):
+    previous = (baseline or {}).get('results', {})
+    print(f"\n{'route':<10} {'reqs':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'4xx':>5} {'err':>5} {'rtdb/req':>9}   vs baseline (req/s, p95)")
+    for name, row in summary.items():
+        before = previous.get(name, {})
+        rtdb = f"{row['rtdbCallsPerRequest']:.1f}" if row['rtdbCallsPerRequest'] is not None else '-'
+        delta = f"{change(row['throughput'], before.get('throughput')):>6} {change(row['p95Ms'], before.get('p95Ms')):>6}"
+        print(f"{name:<10} {row['requests']:>6} {row['throughput']:>8.1f} {row['p50Ms']:>8.0f} {row['p95Ms']:>8.0f} "
+              f"{row['p99Ms']:>8.0f} {row['rejected']:>5} {row['errors']:>5} {rtdb:>9}   {delta}")
+    if baseline:
+        print(f"\nBaseline: {baseline.get('savedAt')} ({baseline.get('commit') or 'unknown commit'})")
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='route=weight pairs, comma-separated')
+    parser.add_argument('--buyers', type=int, default=200)
+    parser.add_argument('--sellers', type=int, default=50)
+    parser.add_argument('--products', type=int, default=40)
+    parser.add_argument('--orders', type=int, default=1000, help='orders to track and orders to review')
+    parser.add_argument('--rtdb-latency-ms', type=float, default=20)
+    parser.add_argument('--rtdb-jitter-ms', type=float, default=10)
+    parser.add_argument('--conflict-rate', type=float, default=0.0, help='emulated transaction conflict probability')
+    parser.add_argument('--vision-latency-ms', type=float, default=300)
+    parser.add_argument('--scraper-latency-ms', type=float, default=800)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='previous results to compare with and replace')
+    parser.add_argument('--no-save', action='store_true', help='compare only; keep the existing baseline')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix='api-load-')
+    with open(os.path.join(workdir, 'seed.json'), 'w') as f:
+        json.dump(seed_data(args, rng), f)
+
+    # The app logs every notification, e-mail and scrape to stdout
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        url, server, app_module = start_local_server(args, workdir)
+        results, wall = run(url, args, Workload(args, rng), rng)
+        app_module.notification_dispatcher.drain()
+        rtdb_report = rtdb_calls_by_handler(app_module)
+    server.shutdown()
+
+    summary = summarize(results, wall, rtdb_report)
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print(f"{args.requests} requests, {args.concurrency} clients, {wall:.1f} s "
+          f"(RTDB {args.rtdb_latency_ms:.0f}+/-{args.rtdb_jitter_ms:.0f} ms, conflicts {args.conflict_rate:.0%}, "
+          f"Vision {args.vision_latency_ms:.0f} ms, scrapers {args.scraper_latency_ms:.0f} ms)")
+    report(summary, baseline)
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump({
+                'savedAt': datetime.datetime.now().isoformat(timespec='seconds'),
+                'commit': current_commit(),
+                'settings': {k: v for k, v in vars(args).items() if k not in ('baseline', 'no_save')},
+                'results': summary
+            }, f, indent=2)
+        print(f"Saved results to {args.baseline}")
+
+if __name__ == '__main__':
+    main()
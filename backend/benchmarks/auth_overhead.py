@@ -0,0 +1,107 @@
+"""
+Per-request ID-token verification overhead, before and after VerifiedTokenCache.
+
+Offline (default): signs a Firebase-shaped RS256 ID token with a throwaway
+key and verifies it with google.auth.jwt.decode, the signature/claims check
+that auth.verify_id_token performs once Google's certificates are cached.
+"before" calls it on every request; "after" goes through the cache the way
+verify_request_token() does, so only the first request pays for RSA.
+
+Live (--token): verifies a real ID token with firebase_admin
+auth.verify_id_token instead (needs service-account credentials); add
+--check-revoked to include the revocation lookup.
+
+Usage (from backend/):
+    python benchmarks/auth_overhead.py [--requests 2000] [--token ID_TOKEN [--check-revoked]]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.token_cache import VerifiedTokenCache
+
+PROJECT_ID = 'safetradehub-bench'
+
+def offline_token():
+    """Returns (token, verifier) for a locally signed Firebase-style ID token."""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from google.auth import crypt, jwt
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                    serialization.NoEncryption())
+    public_pem = key.public_key().public_bytes(serialization.Encoding.PEM,
+                                               serialization.PublicFormat.SubjectPublicKeyInfo)
+
+    now = int(time.time())
+    signer = crypt.RSASigner.from_string(private_pem, key_id='bench')
+    token = jwt.encode(signer, {
+        'iss': f'https://securetoken.google.com/{PROJECT_ID}',
+        'aud': PROJECT_ID,
+        'auth_time': now,
+        'iat': now,
+        'exp': now + 3600,
+        'sub': 'bench-user',
+        'user_id': 'bench-user'
+    }).decode('utf-8')
+
+    def verify(token, check_revoked=False):
+        claims = jwt.decode(token, certs={'bench': public_pem}, audience=PROJECT_ID)
+        claims['uid'] = claims['sub']
+        return claims
+
+    return token, verify
+
+def measure(fn, token, requests):
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        fn(token)
+        timings.append((time.perf_counter() - started) * 1_000_000)
+    timings.sort()
+    return timings
+
+def report(label, timings):
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f"{label:<22} mean {statistics.fmean(timings):>9.1f} us  p50 {statistics.median(timings):>9.1f} us  "
+          f"p99 {p99:>9.1f} us")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--token', help='real Firebase ID token to verify with auth.verify_id_token')
+    parser.add_argument('--check-revoked', action='store_true')
+    args = parser.parse_args()
+
+    if args.token:
+        import firebase_admin
+        from firebase_admin import auth, credentials
+        cred_path = os.getenv('GOOGLE_APPLICATION_CREDENTIALS', 'service-account.json')
+        firebase_admin.initialize_app(credentials.Certificate(cred_path))
+        token = args.token
+        verify = auth.verify_id_token
+    else:
+        token, verify = offline_token()
+
+    if args.check_revoked:
+        before = lambda t: verify(t, check_revoked=True)
+    else:
+        before = verify
+    cache = VerifiedTokenCache(check_revoked=args.check_revoked, verifier=verify)
+
+    before_timings = measure(before, token, args.requests)
+    after_timings = measure(cache.verify, token, args.requests)
+
+    print(f"{args.requests} requests reusing one ID token ({'live' if args.token else 'offline RS256'})\n")
+    report('before (verify each)', before_timings)
+    report('after (cached claims)', after_timings)
+    print(f"\nSpeed-up: {statistics.fmean(before_timings) / statistics.fmean(after_timings):.0f}x, "
+          f"cache {cache.stats()}")
+
+if __name__ == '__main__':
+    main()
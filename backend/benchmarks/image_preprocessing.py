@@ -0,0 +1,99 @@
+"""
+Image pre-processing benchmark.
+
+For every image in a fixture directory, reports the original and
+pre-processed size and the time spent downscaling/re-encoding. With --vision
+it also sends both the raw and the pre-processed bytes to Google Vision and
+reports end-to-end latency for each path and whether the verdicts agree, so
+the downscale can be validated against the unscaled path.
+
+Usage (from backend/):
+    python benchmarks/image_preprocessing.py [--fixtures ../static/images] [--vision]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.image_preprocessor import ImagePreprocessor
+
+DEFAULT_FIXTURES = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'static', 'images'))
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.jfif')
+
+def load_fixtures(directory):
+    fixtures = []
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                path = os.path.join(root, name)
+                with open(path, 'rb') as f:
+                    fixtures.append((os.path.relpath(path, directory), f.read()))
+    return fixtures
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fixtures', default=DEFAULT_FIXTURES)
+    parser.add_argument('--max-dimension', type=int, default=1024)
+    parser.add_argument('--quality', type=int, default=85)
+    parser.add_argument('--vision', action='store_true', help='also compare Vision verdicts and latency (needs credentials)')
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures)
+    if not fixtures:
+        print(f"No images found in {args.fixtures}")
+        return
+
+    preprocessor = ImagePreprocessor(max_dimension=args.max_dimension, quality=args.quality, workers=1)
+    rows = []
+    for name, raw in fixtures:
+        processed, ms = timed(preprocessor.process, raw)
+        rows.append((name, raw, processed, ms))
+
+    print(f"{'image':<40} {'raw KB':>9} {'sent KB':>9} {'saved':>7} {'prep ms':>8}")
+    for name, raw, processed, ms in rows:
+        saved = (1 - len(processed) / len(raw)) * 100 if raw else 0
+        print(f"{name:<40} {len(raw) / 1024:>9.1f} {len(processed) / 1024:>9.1f} {saved:>6.1f}% {ms:>8.1f}")
+
+    total_raw = sum(len(r[1]) for r in rows)
+    total_sent = sum(len(r[2]) for r in rows)
+    print(f"\nTotal: {total_raw / 1024:,.1f} KB -> {total_sent / 1024:,.1f} KB "
+          f"({(1 - total_sent / total_raw) * 100:.1f}% saved), "
+          f"median pre-processing {statistics.median(r[3] for r in rows):.1f} ms")
+
+    if not args.vision:
+        return
+
+    from services.ai_service import AIService
+    credentials = os.getenv('GOOGLE_APPLICATION_CREDENTIALS', 'service-account.json')
+    # No cache and no pre-processor: each call below is one raw Vision round-trip
+    service = AIService(credentials)
+    if not service.client:
+        print("Vision client unavailable; skipping verdict comparison.")
+        return
+
+    raw_ms, prep_ms, disagreements = [], [], []
+    for name, raw, processed, prep_cost in rows:
+        raw_verdict, ms_raw = timed(service.verify_image, raw)
+        prep_verdict, ms_prep = timed(service.verify_image, processed)
+        raw_ms.append(ms_raw)
+        prep_ms.append(ms_prep + prep_cost)
+        if raw_verdict.get('isSafe') != prep_verdict.get('isSafe') or \
+                sorted(raw_verdict.get('reasons', [])) != sorted(prep_verdict.get('reasons', [])):
+            disagreements.append((name, raw_verdict, prep_verdict))
+
+    print(f"\nEnd-to-end Vision latency (median): raw {statistics.median(raw_ms):.0f} ms, "
+          f"pre-processed {statistics.median(prep_ms):.0f} ms (incl. pre-processing)")
+    print(f"Verdict agreement: {len(rows) - len(disagreements)}/{len(rows)}")
+    for name, raw_verdict, prep_verdict in disagreements:
+        print(f"  {name}: raw={raw_verdict} pre-processed={prep_verdict}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Perceptual-hash index lookup benchmark.
+
+Fills a MultiIndexHashTable with N random 64-bit hashes and times nearest()
+for queries that are near-duplicates (a few flipped bits of a stored hash)
+and for queries that match nothing, reporting p50/p99 latency for each.
+
+Usage (from backend/):
+    python benchmarks/phash_index.py [--size 1000000] [--queries 2000] [--max-distance 5]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.perceptual_hash import MultiIndexHashTable, HASH_BITS
+
+def flip_bits(value, count, rng):
+    for bit in rng.sample(range(HASH_BITS), count):
+        value ^= 1 << bit
+    return value
+
+def time_queries(table, queries, max_distance):
+    timings = []
+    found = 0
+    for q in queries:
+        started = time.perf_counter()
+        if table.nearest(q, max_distance) is not None:
+            found += 1
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return timings, found
+
+def report(label, timings, found):
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f"{label:<16} found {found:>5}/{len(timings):<5} "
+          f"p50 {statistics.median(timings):.3f} ms  p99 {p99:.3f} ms  max {timings[-1]:.3f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=1_000_000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--max-distance', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    table = MultiIndexHashTable()
+    started = time.perf_counter()
+    stored = [rng.getrandbits(HASH_BITS) for _ in range(args.size)]
+    for idx, value in enumerate(stored):
+        table.add(value, idx)
+    print(f"Indexed {len(table):,} hashes in {time.perf_counter() - started:.1f} s")
+
+    near = [flip_bits(rng.choice(stored), rng.randint(0, args.max_distance), rng) for _ in range(args.queries)]
+    misses = [rng.getrandbits(HASH_BITS) for _ in range(args.queries)]
+
+    report('near-duplicate', *time_queries(table, near, args.max_distance))
+    report('no match', *time_queries(table, misses, args.max_distance))
+
+if __name__ == '__main__':
+    main()
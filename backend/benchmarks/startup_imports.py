@@ -0,0 +1,80 @@
+"""
+Startup-time benchmark for the Flask app.
+
+Imports app.py in a fresh interpreter with `-X importtime` and reports the
+cumulative import time of every module app.py pulls in directly, so cold-start
+regressions (e.g. heavy NLP/vision stacks loaded at import) are easy to spot.
+
+Usage (from backend/):
+    python benchmarks/startup_imports.py [--runs 3] [--top 15] [--module app]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+LINE_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$')
+
+def run_once(module):
+    """Imports `module` in a subprocess and returns (total_us, {direct_child: cumulative_us})."""
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        tail = proc.stderr.strip().splitlines()[-1:] or ['unknown error']
+        raise RuntimeError(f"Importing {module} failed: {tail[0]}")
+
+    # importtime prints children before their parent, indented by depth.
+    # Children of the target module are the entries one level deeper that
+    # appear after the previous top-level entry and before the target itself.
+    pending = []
+    total = 0
+    children = {}
+    for line in proc.stderr.splitlines():
+        match = LINE_RE.match(line)
+        if not match:
+            continue
+        cumulative = int(match.group(2))
+        depth = (len(match.group(3)) - 1) // 2
+        name = match.group(4)
+
+        if depth == 0:
+            if name == module:
+                total = cumulative
+                for child, child_cumulative in pending:
+                    children[child] = children.get(child, 0) + child_cumulative
+            pending = []
+        elif depth == 1:
+            pending.append((name, cumulative))
+    return total, children
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    totals = []
+    samples = {}
+    for _ in range(args.runs):
+        total, children = run_once(args.module)
+        totals.append(total)
+        for name, us in children.items():
+            samples.setdefault(name, []).append(us)
+
+    rows = sorted(((statistics.median(v), k) for k, v in samples.items()), reverse=True)
+    total_ms = statistics.median(totals) / 1000
+
+    print(f"Import of '{args.module}' (median of {args.runs} runs): {total_ms:,.1f} ms")
+    print(f"{'module':<50} {'cumulative ms':>14} {'share':>7}")
+    for us, name in rows[:args.top]:
+        share = (us / 1000) / total_ms * 100 if total_ms else 0
+        print(f"{name:<50} {us / 1000:>14,.1f} {share:>6.1f}%")
+
+if __name__ == '__main__':
+    main()
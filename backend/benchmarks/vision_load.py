@@ -0,0 +1,151 @@
+"""
+Load benchmark for /api/verify-image using the offline Vision backend.
+
+Starts the Flask app in-process (threaded WSGI server) with
+VISION_BACKEND=local and throwaway verdict-cache/pHash-index files, then
+drives /api/verify-image at each concurrency level and reports throughput,
+latency percentiles and how many answers were HTTP or Vision errors.
+
+By default every request uploads a freshly generated image, so neither the
+verdict cache nor the near-duplicate index can answer it and each request
+exercises pre-processing plus a (simulated) Vision call. --fixtures uploads
+the images from a directory in rotation instead, which measures the cached
+path after the first round. --url targets an already running server (e.g.
+gunicorn started with VISION_BACKEND=local) instead of the in-process one.
+
+Usage (from backend/):
+    python benchmarks/vision_load.py [--levels 1,2,4,8,16] [--requests 64]
+        [--latency-ms 300] [--jitter-ms 100] [--error-rate 0.0] [--fixtures DIR] [--url URL]
+"""
+import argparse
+import io
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.jfif')
+
+def synthetic_image(seed, size=(800, 600)):
+    """A random gradient/noise JPEG; different seeds give unrelated perceptual hashes."""
+    from PIL import Image
+    rng = random.Random(seed)
+    small = Image.new('RGB', (9, 8))
+    small.putdata([(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(72)])
+    out = io.BytesIO()
+    small.resize(size, Image.BICUBIC).save(out, format='JPEG', quality=90)
+    return out.getvalue()
+
+def load_fixtures(directory):
+    images = []
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                with open(os.path.join(root, name), 'rb') as f:
+                    images.append(f.read())
+    return images
+
+def start_local_server(args):
+    """Imports app.py against the local Vision backend and serves it on a free port."""
+    workdir = tempfile.mkdtemp(prefix='vision-load-')
+    os.environ.update({
+        'VISION_BACKEND': 'local',
+        'VISION_LOCAL_LATENCY_MS': str(args.latency_ms),
+        'VISION_LOCAL_JITTER_MS': str(args.jitter_ms),
+        'VISION_LOCAL_ERROR_RATE': str(args.error_rate),
+        'VERDICT_CACHE_PATH': os.path.join(workdir, 'verdicts.sqlite3'),
+        'PHASH_INDEX_PATH': os.path.join(workdir, 'verdicts.sqlite3'),
+    })
+    if args.rules:
+        os.environ['VISION_LOCAL_RULES'] = args.rules
+
+    from werkzeug.serving import make_server
+    import app as app_module
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}', server, app_module
+
+def run_level(url, concurrency, total, next_image):
+    def one(_):
+        content = next_image()
+        started = time.perf_counter()
+        try:
+            resp = requests.post(f'{url}/api/verify-image',
+                                 files={'image': ('upload.jpg', content, 'image/jpeg')}, timeout=60)
+            body = resp.json() if resp.headers.get('Content-Type', '').startswith('application/json') else {}
+            status = resp.status_code
+        except Exception:
+            body, status = {}, 0
+        elapsed = (time.perf_counter() - started) * 1000
+        vision_error = any(r.startswith('API Error') for r in body.get('reasons', []))
+        return elapsed, status, vision_error
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    wall = time.perf_counter() - started
+
+    latencies = sorted(r[0] for r in results)
+    http_errors = sum(1 for r in results if r[1] != 200)
+    vision_errors = sum(1 for r in results if r[2])
+    p = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))]
+    print(f"{concurrency:>5} {total / wall:>9.1f} {statistics.median(latencies):>9.0f} "
+          f"{p(0.95):>9.0f} {p(0.99):>9.0f} {http_errors:>7} {vision_errors:>7}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--levels', default='1,2,4,8,16', help='comma-separated concurrency levels')
+    parser.add_argument('--requests', type=int, default=64, help='requests per level')
+    parser.add_argument('--latency-ms', type=float, default=300)
+    parser.add_argument('--jitter-ms', type=float, default=100)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rules', help='fixture rules JSON for the local backend')
+    parser.add_argument('--fixtures', help='upload images from this directory instead of unique synthetic ones')
+    parser.add_argument('--url', help='base URL of a running server; skips the in-process app')
+    args = parser.parse_args()
+
+    if args.fixtures:
+        images = load_fixtures(args.fixtures)
+        if not images:
+            print(f"No images found in {args.fixtures}")
+            return
+    else:
+        images = None
+
+    counter = iter(range(10 ** 9))
+    lock = threading.Lock()
+
+    def next_image():
+        with lock:
+            n = next(counter)
+        return images[n % len(images)] if images else synthetic_image(n)
+
+    server = app_module = None
+    url = args.url
+    if not url:
+        url, server, app_module = start_local_server(args)
+        print(f"In-process app at {url} (local Vision: {args.latency_ms:.0f}+/-{args.jitter_ms:.0f} ms, "
+              f"error rate {args.error_rate:.0%})")
+
+    print(f"\n{'conc':>5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'http!':>7} {'vision!':>7}")
+    for level in [int(x) for x in args.levels.split(',') if x.strip()]:
+        run_level(url, level, args.requests, next_image)
+
+    if app_module:
+        print(f"\nLocal backend: {app_module.vision_backend.stats()}")
+        print(f"Pre-processing: {app_module.image_preprocessor.stats()}")
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -6,3 +6,116 @@ load_dotenv()
 class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-sfth')
     FIREBASE_CREDENTIALS = os.getenv('GOOGLE_APPLICATION_CREDENTIALS', 'service-account.json')
+
+    # Pre-load TextBlob/NLTK in a background thread at startup instead of on first use
+    NLP_WARMUP = os.getenv('NLP_WARMUP', 'false').lower() in ('1', 'true', 'yes')
+
+    # Max number of distinct texts kept in the in-process sentiment LRU
+    SENTIMENT_CACHE_SIZE = int(os.getenv('SENTIMENT_CACHE_SIZE', '4096'))
+
+    # Global search telemetry: terms kept in the persisted heavy-hitter summary and flush period
+    SEARCH_TRENDS_CAPACITY = int(os.getenv('SEARCH_TRENDS_CAPACITY', '200'))
+    SEARCH_TRENDS_FLUSH_SECONDS = float(os.getenv('SEARCH_TRENDS_FLUSH_SECONDS', '30'))
+
+    # Seconds the in-memory productId -> category index is trusted before reloading
+    CATEGORY_INDEX_TTL = float(os.getenv('CATEGORY_INDEX_TTL', '300'))
+
+    # Persistent SHA-256 -> Vision verdict cache for /api/verify-image
+    VERDICT_CACHE_PATH = os.getenv('VERDICT_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'image_verdicts.sqlite3'))
+    VERDICT_CACHE_TTL = float(os.getenv('VERDICT_CACHE_TTL', str(7 * 24 * 3600)))
+    VERDICT_CACHE_MAX_ENTRIES = int(os.getenv('VERDICT_CACHE_MAX_ENTRIES', '50000'))
+
+    # Uploads are downscaled to this longest side and re-encoded before going to Vision
+    VISION_MAX_DIMENSION = int(os.getenv('VISION_MAX_DIMENSION', '1024'))
+    VISION_JPEG_QUALITY = int(os.getenv('VISION_JPEG_QUALITY', '85'))
+    IMAGE_PREPROCESS_WORKERS = int(os.getenv('IMAGE_PREPROCESS_WORKERS', '4'))
+
+    # 'google' uses Cloud Vision; 'local' uses the offline LocalVisionBackend with fixture rules,
+    # fixed latency (+/- jitter) and an injected error rate, for load and regression testing
+    VISION_BACKEND = os.getenv('VISION_BACKEND', 'google').lower()
+    VISION_LOCAL_RULES = os.getenv('VISION_LOCAL_RULES', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'fixtures', 'vision_rules.json'))
+    VISION_LOCAL_LATENCY_MS = float(os.getenv('VISION_LOCAL_LATENCY_MS', '0'))
+    VISION_LOCAL_JITTER_MS = float(os.getenv('VISION_LOCAL_JITTER_MS', '0'))
+    VISION_LOCAL_ERROR_RATE = float(os.getenv('VISION_LOCAL_ERROR_RATE', '0'))
+
+    # Role / staff-membership cache used by the auth decorators; a staff_registry listener invalidates it early
+    AUTH_CACHE_TTL = float(os.getenv('AUTH_CACHE_TTL', '30'))
+    AUTH_CACHE_MAX_ENTRIES = int(os.getenv('AUTH_CACHE_MAX_ENTRIES', '10000'))
+    AUTH_CACHE_LISTEN = os.getenv('AUTH_CACHE_LISTEN', 'true').lower() in ('1', 'true', 'yes')
+
+    # Verified ID-token claims are cached until the token's exp; with TOKEN_CHECK_REVOKED,
+    # revocation is re-checked at most every TOKEN_REVOCATION_RECHECK_SECONDS per token
+    TOKEN_CACHE_MAX_ENTRIES = int(os.getenv('TOKEN_CACHE_MAX_ENTRIES', '10000'))
+    TOKEN_CHECK_REVOKED = os.getenv('TOKEN_CHECK_REVOKED', 'false').lower() in ('1', 'true', 'yes')
+    TOKEN_REVOCATION_RECHECK_SECONDS = float(os.getenv('TOKEN_REVOCATION_RECHECK_SECONDS', '300'))
+
+    # RTDB_BACKEND=emulator serves db.reference() from an in-memory tree (seeded from a JSON export),
+    # with simulated per-call latency and transaction-conflict probability, for offline benchmarks
+    RTDB_BACKEND = os.getenv('RTDB_BACKEND', 'firebase')
+    RTDB_EMULATOR_SEED = os.getenv('RTDB_EMULATOR_SEED', '')
+    RTDB_EMULATOR_LATENCY_MS = float(os.getenv('RTDB_EMULATOR_LATENCY_MS', '0'))
+    RTDB_EMULATOR_JITTER_MS = float(os.getenv('RTDB_EMULATOR_JITTER_MS', '0'))
+    RTDB_EMULATOR_CONFLICT_RATE = float(os.getenv('RTDB_EMULATOR_CONFLICT_RATE', '0'))
+
+    # Instrument every RTDB call (per endpoint / operation / path pattern); bounded number of series
+    RTDB_METRICS = os.getenv('RTDB_METRICS', 'true').lower() in ('1', 'true', 'yes')
+    RTDB_METRICS_MAX_SERIES = int(os.getenv('RTDB_METRICS_MAX_SERIES', '5000'))
+    # Also measure payload bytes (re-serializes every value read or written, so off by default)
+    RTDB_METRICS_PAYLOAD_BYTES = os.getenv('RTDB_METRICS_PAYLOAD_BYTES', 'false').lower() in ('1', 'true', 'yes')
+
+    # Threads shared by all requests for concurrent (prefetched) RTDB reads
+    RTDB_PREFETCH_WORKERS = int(os.getenv('RTDB_PREFETCH_WORKERS', '8'))
+
+    # Background notification delivery: worker threads, queue bound (inline delivery beyond it),
+    # attempts before dead-lettering, first retry delay (doubling) and settings cache lifetime
+    NOTIFY_WORKERS = int(os.getenv('NOTIFY_WORKERS', '2'))
+    NOTIFY_MAX_QUEUE = int(os.getenv('NOTIFY_MAX_QUEUE', '1000'))
+    NOTIFY_MAX_ATTEMPTS = int(os.getenv('NOTIFY_MAX_ATTEMPTS', '3'))
+    NOTIFY_RETRY_BACKOFF = float(os.getenv('NOTIFY_RETRY_BACKOFF', '1.0'))
+    NOTIFICATION_SETTINGS_TTL = float(os.getenv('NOTIFICATION_SETTINGS_TTL', '60'))
+    # Notifications queued within NOTIFY_BATCH_WINDOW_MS are written together in one multi-path update
+    NOTIFY_BATCH_WINDOW_MS = float(os.getenv('NOTIFY_BATCH_WINDOW_MS', '50'))
+    NOTIFY_MAX_BATCH = int(os.getenv('NOTIFY_MAX_BATCH', '100'))
+
+    # Write-behind audit trail: local journal (AUDIT_FSYNC = always | interval | never) shipped to
+    # audit_logs every AUDIT_FLUSH_SECONDS in multi-path updates of up to AUDIT_MAX_BATCH entries
+    AUDIT_JOURNAL_PATH = os.getenv('AUDIT_JOURNAL_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'audit_journal.jsonl'))
+    AUDIT_FSYNC = os.getenv('AUDIT_FSYNC', 'interval')
+    AUDIT_FLUSH_SECONDS = float(os.getenv('AUDIT_FLUSH_SECONDS', '1.0'))
+    AUDIT_MAX_BATCH = int(os.getenv('AUDIT_MAX_BATCH', '500'))
+
+    # Bearer token required to scrape /metrics (open when empty)
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+    # Per-request cProfile: PROFILE_SAMPLE_RATE of requests, or any admin request carrying PROFILE_HEADER.
+    # Profiles go to PROFILE_DIR (shared by all workers) or memory; nothing is hooked in when disabled
+    PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+    PROFILE_HEADER = os.getenv('PROFILE_HEADER', 'X-Profile-Request')
+    PROFILE_HISTORY = int(os.getenv('PROFILE_HISTORY', '50'))
+    PROFILE_TOP_FRAMES = int(os.getenv('PROFILE_TOP_FRAMES', '25'))
+    PROFILE_DIR = os.getenv('PROFILE_DIR', '')
+
+    # PRICE_SCRAPER=mock answers /api/compare-prices with canned results after a simulated fetch delay
+    PRICE_SCRAPER = os.getenv('PRICE_SCRAPER', 'live')
+    MOCK_SCRAPER_LATENCY_MS = float(os.getenv('MOCK_SCRAPER_LATENCY_MS', '0'))
+    MOCK_SCRAPER_JITTER_MS = float(os.getenv('MOCK_SCRAPER_JITTER_MS', '0'))
+
+    # Perceptual-hash index of verified images; uploads within PHASH_MAX_DISTANCE bits reuse the earlier verdict
+    # (rows share the verdict cache's TTL and size bound)
+    PHASH_INDEX_PATH = os.getenv('PHASH_INDEX_PATH', VERDICT_CACHE_PATH)
+    PHASH_MAX_DISTANCE = int(os.getenv('PHASH_MAX_DISTANCE', '5'))
+
+    # Largest request body Flask accepts (larger uploads get 413 before they are read into memory)
+    MAX_REQUEST_MB = float(os.getenv('MAX_REQUEST_MB', '50'))
+
+    # Async /api/verify-image jobs: worker threads per process, max queued jobs before 429, max image
+    # bytes held by queued/running jobs before 503 and how long finished results stay readable
+    # (in memory and under verification_jobs/)
+    VERIFY_JOB_WORKERS = int(os.getenv('VERIFY_JOB_WORKERS', '4'))
+    VERIFY_JOB_MAX_QUEUE = int(os.getenv('VERIFY_JOB_MAX_QUEUE', '100'))
+    VERIFY_JOB_MAX_QUEUE_MB = float(os.getenv('VERIFY_JOB_MAX_QUEUE_MB', '100'))
+    VERIFY_JOB_RESULT_TTL = float(os.getenv('VERIFY_JOB_RESULT_TTL', '600'))
+
+    # Optional JSON file overriding moderation_constants.RESTRICTED_TAXONOMY
+    RESTRICTED_TAXONOMY_PATH = os.getenv('RESTRICTED_TAXONOMY_PATH')
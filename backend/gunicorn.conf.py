@@ -0,0 +1,27 @@
+import os
+import shutil
+import sys
+
+# Each worker writes its Prometheus samples here; /metrics aggregates them.
+# Set before the workers import prometheus_client.
+metrics_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/safetradehub-metrics')
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '1'))
+
+def on_starting(server):
+    # Samples from a previous run would otherwise be summed into the new one
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+def worker_exit(server, worker):
+    # RTDB listener streams run on non-daemon threads; close them so the worker's
+    # interpreter does not wait on them (until the graceful timeout SIGKILLs it)
+    # instead of running its atexit drains
+    app_module = sys.modules.get('app')
+    if app_module is not None:
+        app_module.authz_cache.close()
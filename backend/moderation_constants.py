@@ -0,0 +1,19 @@
+# --- RESTRICTED CONTENT TAXONOMY ---
+# Terms are matched case-insensitively against Vision labels/objects and listing text.
+# severity 'block' makes content unsafe; 'flag' only marks it for staff review.
+# Override with a JSON file of the same shape via RESTRICTED_TAXONOMY_PATH.
+
+RESTRICTED_TAXONOMY = {
+    'weapons': {
+        'severity': 'block',
+        'terms': ['gun', 'weapon', 'firearm', 'knife']
+    },
+    'explosives': {
+        'severity': 'block',
+        'terms': ['explosive']
+    },
+    'drugs': {
+        'severity': 'block',
+        'terms': ['drug']
+    }
+}
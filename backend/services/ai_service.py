@@ -1,13 +1,28 @@
 import os
 import io
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from google.cloud import vision
 from google.oauth2 import service_account
+from services.restricted_matcher import RestrictedContentMatcher, load_taxonomy, SEVERITY_BLOCK
+from services.perceptual_hash import dhash
+
+# Vision accepts at most 16 images per synchronous batch_annotate_images request
+VISION_BATCH_LIMIT = 16
+SINGLE_CALL_CONCURRENCY = 8
 
 class AIService:
-    def __init__(self, credentials_source):
+    def __init__(self, credentials_source, verdict_cache=None, preprocessor=None, matcher=None, phash_index=None,
+                 backend=None):
         self.credentials_source = credentials_source
-        self.client = None
-        self._init_client()
+        self.matcher = matcher or RestrictedContentMatcher(load_taxonomy())
+        self.verdict_cache = verdict_cache
+        self.preprocessor = preprocessor
+        self.phash_index = phash_index
+        # Any VisionBackend (e.g. LocalVisionBackend) replaces the Google client
+        self.client = backend
+        if self.client is None:
+            self._init_client()
 
     def _init_client(self):
         try:
@@ -22,14 +37,191 @@ class AIService:
         except Exception as e:
             print(f"Error initializing Vision Client: {e}")
 
-    def verify_image(self, image_content):
+    def verify_image(self, image_content, listing_id=None, uploader_id=None):
         """
         Verifies an image for safety (SafeSearch, Labels, Objects).
         Returns a dict with isSafe (bool) and reasons (list).
+        `listing_id` / `uploader_id` are recorded with the image so a later
+        upload of it by the same seller or for the same listing is not
+        flagged as a repost.
         """
         if not self.client:
             return {"isSafe": False, "reasons": ["AI Service not initialized (Missing Credentials)"]}
 
+        # Re-uploads of the same photo are answered from the verdict cache without a Vision call,
+        # but are still checked against the index so an exact repost is flagged
+        image_hash = None
+        if self.verdict_cache:
+            image_hash = self.verdict_cache.key_for(image_content)
+            cached = self.verdict_cache.get(image_hash)
+            if cached is not None:
+                cached['cached'] = True
+                return self._flag_exact_repost(image_hash, cached, listing_id, uploader_id)
+
+        # Cache keys use the original bytes; only misses pay for downscaling
+        if self.preprocessor:
+            image_content = self.preprocessor.process(image_content)
+
+        # Re-crops and recompressions of an already verified photo reuse its verdict
+        phash, duplicate = self._find_near_duplicate(image_content, listing_id, uploader_id)
+        if duplicate is not None:
+            return duplicate
+
+        if self.phash_index and image_hash is None:
+            image_hash = hashlib.sha256(image_content).hexdigest()
+        return self._annotate(image_hash, image_content, phash, listing_id, uploader_id)
+
+    def verify_images(self, image_contents, listing_id=None, uploader_id=None):
+        """
+        Verifies several images at once. Cache misses are sent to Vision in
+        batch_annotate_images calls of up to VISION_BATCH_LIMIT images; images
+        whose batch call or per-image response fails fall back to concurrent
+        single annotate_image calls. Returns verdicts in input order.
+        """
+        if not self.client:
+            return [self.verify_image(content, listing_id, uploader_id) for content in image_contents]
+
+        verdicts = [None] * len(image_contents)
+        pending = {}  # image hash -> indexes sharing those bytes
+
+        for idx, content in enumerate(image_contents):
+            image_hash = hashlib.sha256(content).hexdigest()
+            if image_hash in pending:
+                pending[image_hash].append(idx)
+                continue
+            cached = self.verdict_cache.get(image_hash) if self.verdict_cache else None
+            if cached is not None:
+                cached['cached'] = True
+                verdicts[idx] = self._flag_exact_repost(image_hash, cached, listing_id, uploader_id)
+            else:
+                pending[image_hash] = [idx]
+
+        hashes = list(pending)
+        fallback = []
+
+        # Downscale every miss in parallel before it is uploaded
+        prepared = {}
+        if hashes:
+            originals = [image_contents[pending[h][0]] for h in hashes]
+            processed = self.preprocessor.process_many(originals) if self.preprocessor else originals
+            prepared = dict(zip(hashes, processed))
+
+        phashes = {}
+        for image_hash in list(hashes):
+            phashes[image_hash], duplicate = self._find_near_duplicate(prepared[image_hash], listing_id, uploader_id)
+            if duplicate is not None:
+                hashes.remove(image_hash)
+                for idx in pending[image_hash]:
+                    verdicts[idx] = dict(duplicate)
+
+        for start in range(0, len(hashes), VISION_BATCH_LIMIT):
+            chunk = hashes[start:start + VISION_BATCH_LIMIT]
+            requests = [self._build_request(prepared[h]) for h in chunk]
+            try:
+                batch = self.client.batch_annotate_images(requests=requests)
+                responses = list(batch.responses)
+            except Exception as e:
+                print(f"Vision batch API Error, falling back to single calls: {e}")
+                fallback.extend(chunk)
+                continue
+
+            for image_hash, response in zip(chunk, responses):
+                if response.error.message:
+                    fallback.append(image_hash)
+                    continue
+                verdict = self._verdict_from_response(response)
+                self._remember(image_hash, verdict, phashes.get(image_hash), listing_id, uploader_id)
+                for idx in pending[image_hash]:
+                    verdicts[idx] = dict(verdict)
+            # A short response list means some images got no answer at all
+            fallback.extend(chunk[len(responses):])
+
+        if fallback:
+            with ThreadPoolExecutor(max_workers=min(len(fallback), SINGLE_CALL_CONCURRENCY)) as pool:
+                singles = pool.map(lambda h: self._annotate(h, prepared[h], phashes.get(h), listing_id, uploader_id),
+                                   fallback)
+                for image_hash, verdict in zip(fallback, singles):
+                    for idx in pending[image_hash]:
+                        verdicts[idx] = dict(verdict)
+
+        return verdicts
+
+    def _annotate(self, image_hash, image_content, phash=None, listing_id=None, uploader_id=None):
+        """Single annotate_image call for already pre-processed bytes."""
+        request = self._build_request(image_content)
+        
+        try:
+            response = self.client.annotate_image(request)
+            # Per-image failures come back in the response rather than as an exception
+            if response.error.message:
+                raise RuntimeError(response.error.message)
+            verdict = self._verdict_from_response(response)
+
+            # Only successful Vision verdicts are cached; errors fall through to the except below
+            self._remember(image_hash, verdict, phash, listing_id, uploader_id)
+            return verdict
+
+        except Exception as e:
+            print(f"Vision API Error: {e}")
+            return {"isSafe": False, "reasons": [f"API Error: {str(e)}"]}
+
+    def _remember(self, image_hash, verdict, phash=None, listing_id=None, uploader_id=None):
+        if not image_hash:
+            return
+        if self.verdict_cache:
+            self.verdict_cache.put(image_hash, verdict)
+        if self.phash_index and phash is not None:
+            self.phash_index.add(image_hash, phash, verdict, listing_id, uploader_id)
+
+    def _find_near_duplicate(self, image_content, listing_id=None, uploader_id=None):
+        """
+        Returns (phash, verdict). The verdict is the earlier Vision verdict of
+        a perceptually near-identical image, marked as a possible repost unless
+        it was uploaded for the same listing or by the same seller, or None
+        when there is no such image (or no index, or the index fails).
+        """
+        if not self.phash_index:
+            return None, None
+        try:
+            phash = dhash(image_content)
+            match = self.phash_index.find(phash)
+        except Exception as e:
+            print(f"Near-duplicate lookup skipped: {e}")
+            return None, None
+
+        if match is None:
+            return phash, None
+        return phash, self._repost_verdict(match, dict(match['verdict']), listing_id, uploader_id)
+
+    def _flag_exact_repost(self, image_hash, verdict, listing_id=None, uploader_id=None):
+        """Flags a verdict-cache hit whose exact bytes were indexed for another seller's listing."""
+        if not self.phash_index:
+            return verdict
+        try:
+            match = self.phash_index.find_exact(image_hash)
+        except Exception as e:
+            print(f"Repost lookup skipped: {e}")
+            return verdict
+        if match is None:
+            return verdict
+        return self._repost_verdict(match, verdict, listing_id, uploader_id)
+
+    @staticmethod
+    def _repost_verdict(match, verdict, listing_id=None, uploader_id=None):
+        # A photo re-verified for its own listing, or re-used by the seller who first uploaded it, is not a repost
+        if listing_id and match['listingId'] == listing_id:
+            return verdict
+        if uploader_id and match.get('uploaderId') == uploader_id:
+            return verdict
+        verdict['flags'] = list(verdict.get('flags', [])) + ["Possible repost of a previously verified image"]
+        verdict['nearDuplicate'] = {
+            'distance': match['distance'],
+            'imageHash': match['imageHash'],
+            'listingId': match['listingId']
+        }
+        return verdict
+
+    def _build_request(self, image_content):
         image = vision.Image(content=image_content)
         
         # Features to request
@@ -39,44 +231,41 @@ class AIService:
             vision.Feature(type_=vision.Feature.Type.OBJECT_LOCALIZATION),
         ]
         
-        request = vision.AnnotateImageRequest(image=image, features=features)
+        return vision.AnnotateImageRequest(image=image, features=features)
+
+    def _verdict_from_response(self, response):
+        reasons = []
+        
+        # 1. Safe Search Check
+        safe_search = response.safe_search_annotation
+        likelihood_name = ('UNKNOWN', 'VERY_UNLIKELY', 'UNLIKELY', 'POSSIBLE', 'LIKELY', 'VERY_LIKELY')
         
-        try:
-            response = self.client.annotate_image(request)
-            
-            reasons = []
-            
-            # 1. Safe Search Check
-            safe_search = response.safe_search_annotation
-            likelihood_name = ('UNKNOWN', 'VERY_UNLIKELY', 'UNLIKELY', 'POSSIBLE', 'LIKELY', 'VERY_LIKELY')
-            
-            # Threshold: LIKELY or VERY_LIKELY is unsafe
-            if safe_search.adult >= 4 or safe_search.violence >= 4 or safe_search.racy >= 4:
-                reasons.append("Content flagged as inappropriate (Adult/Violence/Racy)")
-
-            # 2. Label Detection (Restricted Items)
-            restricted_labels = ['gun', 'weapon', 'firearm', 'knife', 'drug', 'explosive']
-            found_labels = [label.description.lower() for label in response.label_annotations]
-            
-            for restricted in restricted_labels:
-                for label in found_labels:
-                    if restricted in label:
-                        reasons.append(f"Restricted item detected: {label}")
-                        break
-
-            # 3. Object Localization (Restricted Objects)
-            found_objects = [obj.name.lower() for obj in response.localized_object_annotations]
-            for restricted in restricted_labels:
-                for obj in found_objects:
-                    if restricted in obj:
-                        reasons.append(f"Restricted object detected: {obj}")
-                        break
-
-            return {
-                "isSafe": len(reasons) == 0,
-                "reasons": list(set(reasons)) # Unique reasons
-            }
+        # Threshold: LIKELY or VERY_LIKELY is unsafe
+        if safe_search.adult >= 4 or safe_search.violence >= 4 or safe_search.racy >= 4:
+            reasons.append("Content flagged as inappropriate (Adult/Violence/Racy)")
 
-        except Exception as e:
-            print(f"Vision API Error: {e}")
-            return {"isSafe": False, "reasons": [f"API Error: {str(e)}"]}
+        # 2 & 3. Restricted items in labels and objects, scanned in one compiled pass
+        found = [('label', label.description.lower()) for label in response.label_annotations]
+        found += [('object', obj.name.lower()) for obj in response.localized_object_annotations]
+
+        flags = []
+        reported = set()
+        for match in self.matcher.scan(found):
+            # One reason per restricted term and source, as before
+            if (match['term'], match['source']) in reported:
+                continue
+            reported.add((match['term'], match['source']))
+            if match['severity'] != SEVERITY_BLOCK:
+                flags.append(f"{match['category']}: {match['text']}")
+            elif match['source'] == 'label':
+                reasons.append(f"Restricted item detected: {match['text']}")
+            else:
+                reasons.append(f"Restricted object detected: {match['text']}")
+
+        verdict = {
+            "isSafe": len(reasons) == 0,
+            "reasons": list(set(reasons)) # Unique reasons
+        }
+        if flags:
+            verdict["flags"] = flags
+        return verdict
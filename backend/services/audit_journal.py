@@ -0,0 +1,283 @@
+from services.rtdb import database as db
+import atexit
+import json
+import os
+import threading
+import time
+from services.rtdb.write_batch import WriteBatch, generate_push_id
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: locking is per process only
+    fcntl = None
+
+FSYNC_POLICIES = ('always', 'interval', 'never')
+
+class AuditJournal:
+    """
+    Write-behind audit trail.
+
+    append() writes the entry as one JSON line to a local append-only journal
+    and returns; a background thread ships unshipped lines to `audit_logs` in
+    multi-path updates of up to `max_batch` entries. Each entry gets its push
+    id when it is journaled and is written to `audit_logs/<id>`, so shipping
+    the same line twice (after a crash between the write and the checkpoint)
+    is harmless. The byte offset of the first unshipped line is checkpointed
+    next to the journal, and whatever is past it is shipped on the next start.
+
+    fsync policy: 'always' syncs every append before returning, 'interval'
+    syncs once per flush tick (at most `flush_interval` seconds of entries
+    at risk on power loss), 'never' leaves it to the OS.
+
+    Several processes can share one journal: appends are single O_APPEND
+    writes under a shared lock, and only one process ships at a time.
+    If the journal cannot be written, the entry is pushed to RTDB directly.
+    """
+    def __init__(self, path, fsync='interval', flush_interval=1.0, max_batch=500, collection='audit_logs'):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync policy must be one of {FSYNC_POLICIES}, not '{fsync}'")
+        self.path = path
+        self.fsync = fsync
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.collection = collection
+        self._offset_path = path + '.offset'
+        self._lock = threading.Lock()
+        self._ship_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._dirty = False
+        self._fd = None
+        self._lock_fd = None
+        self._ship_lock_fd = None
+        self._thread = None
+        self.appended = 0
+        self.direct_writes = 0
+        self.shipped = 0
+        self.batches = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_shipped_at = None
+        self._open()
+
+    def _open(self):
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            self._lock_fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+            self._ship_lock_fd = os.open(self.path + '.ship.lock', os.O_RDWR | os.O_CREAT, 0o600)
+        except OSError as e:
+            print(f"Audit journal disabled, could not open {self.path}: {e}")
+            self._fd = None
+
+    def start(self):
+        """Starts the shipping thread (which first ships anything left from a previous run)."""
+        if self._fd is None or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='audit-journal', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def append(self, entry):
+        """Journals one audit entry and returns its audit_logs key."""
+        key = generate_push_id()
+        if self._fd is not None:
+            line = json.dumps({'id': key, 'at': int(time.time() * 1000), 'entry': entry},
+                              separators=(',', ':'), default=str) + '\n'
+            try:
+                with self._lock:
+                    self._flock(self._lock_fd, shared=True)
+                    try:
+                        os.write(self._fd, line.encode('utf-8'))
+                        if self.fsync == 'always':
+                            os.fsync(self._fd)
+                        else:
+                            self._dirty = True
+                    finally:
+                        self._funlock(self._lock_fd)
+                    self.appended += 1
+                return key
+            except OSError as e:
+                print(f"Audit journal append failed, writing directly: {e}")
+
+        db.reference(f'{self.collection}/{key}').set(entry)
+        with self._lock:
+            self.direct_writes += 1
+        return key
+
+    def flush(self):
+        """Syncs the journal and ships everything pending; returns the number of entries shipped."""
+        self._sync()
+        total = 0
+        while True:
+            shipped = self._ship_once()
+            total += shipped
+            if shipped < self.max_batch:
+                return total
+
+    def close(self, timeout=5):
+        """Best-effort final flush (used at exit)."""
+        deadline = time.time() + timeout
+        try:
+            self._sync()
+            while time.time() < deadline and self._ship_once() >= self.max_batch:
+                pass
+        except Exception as e:
+            print(f"Audit journal final flush failed: {e}")
+
+    def stats(self):
+        pending_entries, oldest_at = self._pending()
+        with self._lock:
+            return {
+                'fsync': self.fsync,
+                'appended': self.appended,
+                'directWrites': self.direct_writes,
+                'shipped': self.shipped,
+                'batches': self.batches,
+                'failures': self.failures,
+                'lastError': self.last_error,
+                'lastShippedAt': self.last_shipped_at,
+                'pendingEntries': pending_entries,
+                'flushLagMs': int(time.time() * 1000) - oldest_at if oldest_at else 0
+            }
+
+    def _run(self):
+        backoff = self.flush_interval
+        while True:
+            try:
+                self.flush()
+                backoff = self.flush_interval
+            except Exception as e:
+                with self._lock:
+                    self.failures += 1
+                    self.last_error = str(e)
+                print(f"Audit journal shipping failed, retrying in {backoff:.0f}s: {e}")
+                backoff = min(backoff * 2, 60)
+            self._wake.wait(backoff)
+            self._wake.clear()
+
+    def _sync(self):
+        if self.fsync == 'interval' and self._dirty and self._fd is not None:
+            self._dirty = False
+            os.fsync(self._fd)
+
+    def _ship_once(self):
+        """Ships up to max_batch pending lines; returns how many were shipped."""
+        if self._fd is None:
+            return 0
+        with self._ship_lock:
+            if not self._flock(self._ship_lock_fd, blocking=False):
+                return 0  # another process is shipping
+            try:
+                offset = self._read_offset()
+                records, consumed = self._read_pending(offset, self.max_batch)
+                if not records:
+                    self._compact(offset)
+                    return 0
+
+                batch = WriteBatch()
+                for record in records:
+                    batch.set(f"{self.collection}/{record['id']}", record['entry'])
+                batch.commit()
+                self._write_offset(offset + consumed)
+
+                with self._lock:
+                    self.shipped += len(records)
+                    self.batches += 1
+                    self.last_error = None
+                    self.last_shipped_at = int(time.time() * 1000)
+                return len(records)
+            finally:
+                self._funlock(self._ship_lock_fd)
+
+    def _read_pending(self, offset, limit):
+        """Returns (records, bytes consumed) for up to `limit` complete lines after `offset`."""
+        records = []
+        consumed = 0
+        with open(self.path, 'rb') as journal:
+            journal.seek(offset)
+            for line in journal:
+                if not line.endswith(b'\n'):
+                    break  # append still in progress
+                consumed += len(line)
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    print(f"Skipping corrupt audit journal line at byte {offset + consumed - len(line)}")
+                if len(records) >= limit:
+                    break
+        return records, consumed
+
+    def _pending(self):
+        """Returns (pending entry count, journal time of the oldest pending entry)."""
+        if self._fd is None:
+            return 0, None
+        try:
+            offset = self._read_offset()
+            with open(self.path, 'rb') as journal:
+                journal.seek(offset)
+                count = 0
+                oldest_at = None
+                for line in journal:
+                    if not line.endswith(b'\n'):
+                        break
+                    if oldest_at is None:
+                        try:
+                            oldest_at = json.loads(line).get('at')
+                        except ValueError:
+                            pass
+                    count += 1
+            return count, oldest_at
+        except OSError:
+            return 0, None
+
+    def _compact(self, offset):
+        # Everything is shipped: empty the journal so it does not grow forever.
+        # The checkpoint is reset first; a crash in between only re-ships
+        # entries that are already in audit_logs under the same keys.
+        if offset == 0:
+            return
+        with self._lock:
+            self._flock(self._lock_fd)
+            try:
+                if os.path.getsize(self.path) != offset:
+                    return
+                self._write_offset(0)
+                os.truncate(self.path, 0)
+            finally:
+                self._funlock(self._lock_fd)
+
+    def _read_offset(self):
+        try:
+            with open(self._offset_path) as f:
+                offset = int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+        return offset if offset <= os.path.getsize(self.path) else 0
+
+    def _write_offset(self, offset):
+        tmp = f'{self._offset_path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._offset_path)
+
+    @staticmethod
+    def _flock(fd, shared=False, blocking=True):
+        if fcntl is None:
+            return True
+        flags = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        if not blocking:
+            flags |= fcntl.LOCK_NB
+        try:
+            fcntl.flock(fd, flags)
+            return True
+        except BlockingIOError:
+            return False
+
+    @staticmethod
+    def _funlock(fd):
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
@@ -0,0 +1,154 @@
+from services.rtdb import database as db
+import atexit
+import collections
+import threading
+import time
+
+class AuthorizationCache:
+    """
+    Short-lived cache of the two facts the auth checks need: a user's role
+    (`users/<uid>/role`) and whether they are in `staff_registry`.
+
+    Only those values are fetched and stored, never the user's profile.
+    Entries expire after `ttl` seconds. Role changes made through the API
+    invalidate their entry directly; staff entries are also dropped as soon
+    as the single RTDB listener on `staff_registry` reports a change, so
+    staff removals take effect immediately rather than at expiry. If the
+    listener cannot be started, the TTL alone bounds staleness.
+
+    The listener's stream runs on a non-daemon thread, which the interpreter
+    joins before running atexit hooks, so close() is registered to run ahead
+    of that join (and gunicorn's worker_exit hook calls it as well).
+    """
+    def __init__(self, ttl=30, max_entries=10000, listen=True):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.listen = listen
+        self._roles = collections.OrderedDict()  # uid -> (role, fetched_at)
+        self._staff = collections.OrderedDict()  # uid -> (is_staff, fetched_at)
+        self._lock = threading.Lock()
+        self._registrations = {}  # listened path -> ListenerRegistration
+        self._staff_listener_started = False
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def role(self, uid):
+        """Returns the user's role string, or None if the user has none."""
+        found, role = self._lookup(self._roles, uid)
+        if found:
+            return role
+        role = db.reference(f'users/{uid}/role').get()
+        self._store(self._roles, uid, role)
+        return role
+
+    def is_admin(self, uid):
+        return self.role(uid) == 'Admin'
+
+    def is_staff(self, uid):
+        self._start_staff_listener()
+        found, is_staff = self._lookup(self._staff, uid)
+        if found:
+            return is_staff
+        is_staff = bool(db.reference(f'staff_registry/{uid}').get(shallow=True))
+        self._store(self._staff, uid, is_staff)
+        return is_staff
+
+    def is_staff_or_admin(self, uid):
+        return self.is_staff(uid) or self.is_admin(uid)
+
+    def invalidate(self, uid=None, roles=True, staff=True):
+        """Drops cached entries for `uid`, or everything when uid is None."""
+        with self._lock:
+            self.invalidations += 1
+            for cache, enabled in ((self._roles, roles), (self._staff, staff)):
+                if not enabled:
+                    continue
+                if uid is None:
+                    cache.clear()
+                else:
+                    cache.pop(uid, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'roles': len(self._roles),
+                'staff': len(self._staff),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'invalidations': self.invalidations,
+                'listeners': sum(1 for r in self._registrations.values() if r is not None),
+                'ttl': self.ttl
+            }
+
+    def close(self):
+        with self._lock:
+            registrations = list(self._registrations.values())
+            self._registrations.clear()
+        for registration in registrations:
+            if registration is None:
+                continue
+            try:
+                registration.close()
+            except Exception:
+                pass
+
+    def _lookup(self, cache, uid):
+        with self._lock:
+            entry = cache.get(uid)
+            if entry is not None and time.time() - entry[1] < self.ttl:
+                cache.move_to_end(uid)
+                self.hits += 1
+                return True, entry[0]
+            self.misses += 1
+            return False, None
+
+    def _store(self, cache, uid, value):
+        with self._lock:
+            cache[uid] = (value, time.time())
+            cache.move_to_end(uid)
+            while len(cache) > self.max_entries:
+                cache.popitem(last=False)
+
+    def _start_staff_listener(self):
+        if self._staff_listener_started:
+            return
+        self._staff_listener_started = True
+        self._listen('staff_registry', self._on_staff_event)
+
+    def _on_staff_event(self, event):
+        # Event paths are relative to staff_registry: '/' for the whole node, '/<uid>/...' otherwise
+        parts = [p for p in (event.path or '/').split('/') if p]
+        if parts:
+            self.invalidate(parts[0], roles=False)
+        elif event.event_type == 'patch' and isinstance(event.data, dict):
+            for uid in event.data:
+                self.invalidate(uid, roles=False)
+        else:
+            self.invalidate(roles=False)
+
+    def _listen(self, path, callback):
+        if not self.listen:
+            return
+        with self._lock:
+            if path in self._registrations:
+                return
+            self._registrations[path] = None
+        try:
+            registration = db.reference(path).listen(callback)
+        except Exception as e:
+            print(f"Auth cache listener on {path} unavailable, relying on TTL: {e}")
+            return
+        with self._lock:
+            self._registrations[path] = registration
+        _register_shutdown(self.close)
+
+def _register_shutdown(func):
+    """Runs `func` at exit before non-daemon threads are joined (plain atexit runs after that)."""
+    try:
+        threading._register_atexit(func)
+    except (AttributeError, RuntimeError):
+        # Python < 3.9, or the interpreter is already shutting down
+        atexit.register(func)
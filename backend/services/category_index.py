@@ -0,0 +1,120 @@
+from services.rtdb import database as db
+from services.rtdb.request_cache import request_reads
+from services.rtdb.stream import iter_chunked, list_keys
+import threading
+import time
+
+class ProductCategoryIndex:
+    """
+    Compact productId -> category lookup backed by `product_categories/<productId>`.
+
+    The whole index is a flat map of short strings, so it is loaded in one read
+    and cached in memory for `ttl` seconds. Products missing from the index are
+    resolved by reading only `products/<id>/category` (all misses concurrently,
+    on the request prefetch pool) and backfilled, so callers never download
+    full listings just to attribute a category.
+    """
+    INDEX_PATH = 'product_categories'
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._entries = {}
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    def get(self, product_id):
+        return self.get_many([product_id]).get(product_id)
+
+    def get_many(self, product_ids):
+        """Returns {productId: category} for the ids that have a category."""
+        self._refresh_if_stale()
+        wanted = set(pid for pid in product_ids if pid)
+        with self._lock:
+            found = {pid: self._entries[pid] for pid in wanted if pid in self._entries}
+            missing = [pid for pid in wanted if pid not in self._entries]
+
+        if missing:
+            backfill = {}
+            reads = request_reads()
+            reads.prefetch(*(f'products/{pid}/category' for pid in missing))
+            for pid in missing:
+                try:
+                    category = reads.get(f'products/{pid}/category')
+                except Exception as e:
+                    print(f"Category lookup failed for {pid}: {e}")
+                    continue
+                # Remember misses too (as None) so deleted products are not re-read until the next refresh
+                with self._lock:
+                    self._entries[pid] = category
+                if category:
+                    found[pid] = category
+                    backfill[pid] = category
+            if backfill:
+                try:
+                    db.reference(self.INDEX_PATH).update(backfill)
+                except Exception as e:
+                    print(f"Failed to backfill category index: {e}")
+
+        return {pid: cat for pid, cat in found.items() if cat}
+
+    def remove(self, product_ids, batch=None):
+        """
+        Drops deleted products from the index and the local cache. With a
+        WriteBatch the index deletes join it (commit it together with the
+        product deletes) and the cache is cleared once it commits.
+        """
+        product_ids = [pid for pid in product_ids if pid]
+        if not product_ids: return
+        if batch is not None:
+            for pid in product_ids:
+                batch.delete(f'{self.INDEX_PATH}/{pid}')
+            batch.after_commit(lambda: self._forget(product_ids))
+            return
+        db.reference(self.INDEX_PATH).update({pid: None for pid in product_ids})
+        self._forget(product_ids)
+
+    def _forget(self, product_ids):
+        with self._lock:
+            for pid in product_ids:
+                self._entries.pop(pid, None)
+
+    def invalidate(self, product_id=None):
+        """Forgets one cached entry, or the whole cache when no id is given."""
+        with self._lock:
+            if product_id is None:
+                self._entries = {}
+                self._loaded_at = 0
+            else:
+                self._entries.pop(product_id, None)
+
+    def rebuild(self, chunk_size=200):
+        """
+        Backfills the index for every product. Lists product ids shallowly and
+        reads only the category field of each, so no listing payload is fetched.
+        Returns the number of indexed products.
+        """
+        indexed = 0
+        chunk = {}
+        for pid, category in iter_chunked('products', list_keys('products'), field='category'):
+            chunk[pid] = category
+            if len(chunk) >= chunk_size:
+                db.reference(self.INDEX_PATH).update(chunk)
+                indexed += len(chunk)
+                chunk = {}
+        if chunk:
+            db.reference(self.INDEX_PATH).update(chunk)
+            indexed += len(chunk)
+        self.invalidate()
+        return indexed
+
+    def _refresh_if_stale(self):
+        if time.time() - self._loaded_at < self.ttl:
+            return
+        try:
+            entries = db.reference(self.INDEX_PATH).get() or {}
+        except Exception as e:
+            print(f"Failed to load category index: {e}")
+            return
+        with self._lock:
+            self._entries = dict(entries)
+            self._loaded_at = time.time()
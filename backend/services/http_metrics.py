@@ -0,0 +1,74 @@
+from flask import Response, g, request
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+import os
+import time
+
+# Seconds; the upper buckets cover price comparison, which scrapes other sites
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+class HttpMetrics:
+    """
+    Prometheus request telemetry for the Flask app: per-route request
+    counts by status, latency histograms and in-flight gauges, recorded by
+    before/after/teardown request hooks and exposed in text format by
+    `exposition()`.
+
+    Routes are labelled by their URL rule (/api/v1/orders/<order_id>), not
+    the concrete path, to keep label cardinality bounded.
+
+    Under gunicorn, set PROMETHEUS_MULTIPROC_DIR (gunicorn.conf.py does)
+    so every worker writes its samples there and a scrape of any worker
+    returns the aggregate of all of them.
+    """
+    def __init__(self, app=None, exclude=('/metrics',)):
+        self.exclude = set(exclude)
+        self.requests = Counter('http_requests_total', 'HTTP requests handled',
+                                ['method', 'route', 'status'])
+        self.latency = Histogram('http_request_duration_seconds', 'HTTP request latency',
+                                 ['method', 'route'], buckets=LATENCY_BUCKETS)
+        self.in_flight = Gauge('http_requests_in_flight', 'HTTP requests currently being handled',
+                               ['method', 'route'], multiprocess_mode='livesum')
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self._before)
+        app.after_request(self._after)
+        app.teardown_request(self._teardown)
+
+    @staticmethod
+    def _route():
+        return request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+
+    def _before(self):
+        if request.path in self.exclude:
+            return
+        g.http_metrics_started = time.perf_counter()
+        self.in_flight.labels(request.method, self._route()).inc()
+
+    def _after(self, response):
+        self._record(response.status_code)
+        return response
+
+    def _teardown(self, error=None):
+        # Unhandled exceptions skip after_request; count them as 500s here
+        self._record(500)
+
+    def _record(self, status):
+        started = g.pop('http_metrics_started', None)
+        if started is None:
+            return
+        method, route = request.method, self._route()
+        self.latency.labels(method, route).observe(time.perf_counter() - started)
+        self.requests.labels(method, route, str(status)).inc()
+        self.in_flight.labels(method, route).dec()
+
+    def exposition(self):
+        """Response with every metric in Prometheus text format (all workers in multiprocess mode)."""
+        if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            from prometheus_client import REGISTRY as registry
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
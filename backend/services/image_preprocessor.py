@@ -0,0 +1,82 @@
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
+
+class ImagePreprocessor:
+    """
+    Shrinks uploads before they are sent to Vision: decodes the image, applies
+    the EXIF orientation, downscales it so the longest side is at most
+    `max_dimension`, drops all metadata and re-encodes it as JPEG. If that
+    does not make the payload smaller, the original bytes are sent instead.
+
+    A single image is processed on the calling thread. Batches run on a
+    bounded thread pool (Pillow releases the GIL while decoding, resizing and
+    encoding), so one request cannot spread unbounded CPU work across threads.
+    """
+    def __init__(self, max_dimension=1024, quality=85, workers=4):
+        self.max_dimension = max_dimension
+        self.quality = quality
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-preprocess')
+        self._lock = threading.Lock()
+        self.images = 0
+        self.failures = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+
+    def process(self, image_content):
+        """Returns the compact JPEG bytes, or the original bytes if they cannot be decoded."""
+        return self._process(image_content)
+
+    def process_many(self, image_contents):
+        """Pre-processes several images in parallel, preserving order."""
+        return list(self._pool.map(self._process, image_contents))
+
+    def _process(self, image_content):
+        started = time.perf_counter()
+        try:
+            with Image.open(io.BytesIO(image_content)) as img:
+                img = ImageOps.exif_transpose(img)
+                if img.mode in ('RGBA', 'LA', 'PA') or (img.mode == 'P' and 'transparency' in img.info):
+                    # JPEG has no alpha; flatten onto white rather than letting transparency turn black
+                    rgba = img.convert('RGBA')
+                    img = Image.new('RGB', rgba.size, (255, 255, 255))
+                    img.paste(rgba, mask=rgba.getchannel('A'))
+                elif img.mode != 'RGB':
+                    img = img.convert('RGB')
+                img.thumbnail((self.max_dimension, self.max_dimension), Image.LANCZOS)
+
+                # A fresh save without exif/icc arguments writes no metadata
+                out = io.BytesIO()
+                img.save(out, format='JPEG', quality=self.quality, optimize=True)
+                result = out.getvalue()
+
+            # Small, already well-compressed uploads (e.g. WebP) can grow when
+            # re-encoded; Vision only benefits from fewer bytes, so keep the original
+            if len(result) >= len(image_content):
+                result = image_content
+        except Exception as e:
+            print(f"Image pre-processing skipped: {e}")
+            with self._lock:
+                self.failures += 1
+            return image_content
+
+        with self._lock:
+            self.images += 1
+            self.bytes_in += len(image_content)
+            self.bytes_out += len(result)
+            self.seconds += time.perf_counter() - started
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'images': self.images,
+                'failures': self.failures,
+                'bytesIn': self.bytes_in,
+                'bytesOut': self.bytes_out,
+                'bytesSaved': self.bytes_in - self.bytes_out,
+                'avgMs': round(self.seconds / self.images * 1000, 2) if self.images else 0.0
+            }
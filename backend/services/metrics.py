@@ -0,0 +1,10 @@
+def latency_summary(values):
+    """count/avg/p95/max of an already sorted list of millisecond samples."""
+    if not values:
+        return {'count': 0, 'avg': 0.0, 'p95': 0.0, 'max': 0.0}
+    return {
+        'count': len(values),
+        'avg': round(sum(values) / len(values), 2),
+        'p95': round(values[min(len(values) - 1, int(len(values) * 0.95))], 2),
+        'max': round(values[-1], 2)
+    }
@@ -1,19 +1,112 @@
-from textblob import TextBlob
-from firebase_admin import db
+from services.rtdb import database as db
+from services.rtdb.stream import iter_node
 import collections
+import hashlib
+import threading
 import re
-import nltk
 
-# Ensure NLTK data is available
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
+# TextBlob/NLTK are heavy to import and may trigger a corpus download, so they
+# are only loaded on first use (or explicitly via NLPEngine.warm_up()).
+_nlp_lock = threading.Lock()
+_TextBlob = None
+_sentiment_analyzer = None
+
+def _load_textblob():
+    """Import TextBlob once per process and make sure the punkt tokenizer is present."""
+    global _TextBlob
+    if _TextBlob is not None:
+        return _TextBlob
+
+    with _nlp_lock:
+        if _TextBlob is None:
+            import nltk
+            from textblob import TextBlob
+
+            # Ensure NLTK data is available
+            try:
+                nltk.data.find('tokenizers/punkt')
+            except LookupError:
+                nltk.download('punkt')
+
+            _TextBlob = TextBlob
+    return _TextBlob
+
+def _load_sentiment_analyzer():
+    """Shared PatternAnalyzer so batches skip per-text TextBlob construction."""
+    global _sentiment_analyzer
+    if _sentiment_analyzer is not None:
+        return _sentiment_analyzer
+
+    _load_textblob()  # Takes _nlp_lock itself, so it runs before we do
+    with _nlp_lock:
+        if _sentiment_analyzer is None:
+            from textblob.sentiments import PatternAnalyzer
+            analyzer = PatternAnalyzer()
+            # The pattern lexicon is read on first use; do it here, once, rather than in racing requests
+            analyzer.analyze('good')
+            _sentiment_analyzer = analyzer
+    return _sentiment_analyzer
+
+def content_hash(text):
+    """Stable key for a piece of text; whitespace-only differences map to the same entry."""
+    return hashlib.sha256(' '.join(str(text).split()).encode('utf-8')).hexdigest()
+
+class SentimentCache:
+    """Thread-safe bounded LRU of sentiment polarity keyed by content hash."""
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self._items = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._items),
+                'maxSize': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
 
 class NLPEngine:
-    def __init__(self):
+    def __init__(self, sentiment_cache_size=4096, category_index=None, page_size=500):
         # Basic stop words to filter out noise
         self.stop_words = set(['the', 'is', 'at', 'which', 'on', 'a', 'an', 'and', 'or', 'but', 'if', 'this', 'that', 'with', 'for', 'it', 'in', 'to', 'of', 'was', 'very', 'good', 'great', 'excellent'])
+        self.sentiment_cache = SentimentCache(sentiment_cache_size)
+        self.category_index = category_index
+        self.page_size = page_size
+
+    @property
+    def is_loaded(self):
+        return _TextBlob is not None
+
+    def warm_up(self):
+        """Loads the NLP stack ahead of the first request. Safe to call from a background thread."""
+        try:
+            _load_textblob()
+            return True
+        except Exception as e:
+            print(f"NLP warm-up failed: {e}")
+            return False
 
     def analyze_trends(self):
         """
@@ -21,21 +114,13 @@ class NLPEngine:
         Returns a dictionary with trending keywords and their frequency.
         """
         try:
-            # We use the db reference from firebase_admin which should already be initialized in app.py
-            reviews_ref = db.reference('reviews')
-            reviews = reviews_ref.get()
-            
-            if not reviews:
-                return {"keywords": [], "categories": []}
-
+            # Reviews are streamed page by page so memory stays bounded as the node grows
+            TextBlob = None
             keywords_count = collections.Counter()
             category_count = collections.Counter()
-            
-            # Fetch products to map reviews to categories (for trend detection)
-            products_ref = db.reference('products')
-            products = products_ref.get() or {}
+            positive_products = collections.Counter()
 
-            for r_id, review in reviews.items():
+            for r_id, review in iter_node('reviews', page_size=self.page_size):
                 if not isinstance(review, dict): continue
                 
                 comment = review.get('comment', '')
@@ -44,6 +129,8 @@ class NLPEngine:
 
                 # Only analyze positive reviews (rating >= 4) to find positive trends
                 if rating >= 4 and comment:
+                    if TextBlob is None:
+                        TextBlob = _load_textblob()
                     blob = TextBlob(comment)
                     
                     # Extract words and filter
@@ -53,11 +140,16 @@ class NLPEngine:
                         if len(clean_word) > 2 and clean_word not in self.stop_words:
                             keywords_count[clean_word] += 1
                 
-                # Track categories of products being reviewed positively
-                if rating >= 4 and product_id and product_id in products:
-                    cat = products[product_id].get('category')
-                    if cat:
-                        category_count[cat] += 1
+                # Track products being reviewed positively; categories are resolved once afterwards
+                if rating >= 4 and product_id:
+                    positive_products[product_id] += 1
+
+            # Map reviewed products to categories (for trend detection) via the compact index
+            product_categories = self.category_index.get_many(list(positive_products)) if self.category_index else {}
+            for product_id, count in positive_products.items():
+                cat = product_categories.get(product_id)
+                if cat:
+                    category_count[cat] += count
 
             # Get top 10 keywords and top 5 categories
             top_keywords = [{"keyword": k, "count": v} for k, v in keywords_count.most_common(10)]
@@ -74,4 +166,62 @@ class NLPEngine:
     def get_sentiment(self, text):
         """Returns sentiment polarity (-1.0 to 1.0)"""
         if not text: return 0
-        return TextBlob(text).sentiment.polarity
+        return self.get_sentiments([text])[0]
+
+    def get_sentiments(self, texts):
+        """
+        Batch sentiment polarity for a list of texts, in input order.
+        Duplicates are collapsed by content hash, repeats are served from the LRU
+        and only the remaining misses are scored, in a single pass.
+        """
+        keys = [content_hash(t) if t else None for t in texts]
+        scores = {}
+        pending = {}
+
+        for text, key in zip(texts, keys):
+            if key is None or key in scores or key in pending:
+                continue
+            cached = self.sentiment_cache.get(key)
+            if cached is not None:
+                scores[key] = cached
+            else:
+                pending[key] = text
+
+        if pending:
+            analyzer = _load_sentiment_analyzer()
+            for key, text in pending.items():
+                polarity = analyzer.analyze(str(text)).polarity
+                self.sentiment_cache.put(key, polarity)
+                scores[key] = polarity
+
+        return [scores[k] if k is not None else 0 for k in keys]
+
+    def score_reviews(self, reviews):
+        """
+        Returns {reviewId: polarity} for a {reviewId: review} mapping.
+        Uses the sentiment already stored on each review and persists any newly
+        computed scores back to `reviews/<id>/sentiment` in one multi-path update.
+        """
+        results = {}
+        to_score = []
+
+        for r_id, review in reviews.items():
+            if not isinstance(review, dict): continue
+            stored = review.get('sentiment')
+            if isinstance(stored, (int, float)) and not isinstance(stored, bool):
+                results[r_id] = stored
+            else:
+                to_score.append((r_id, review.get('comment', '')))
+
+        if to_score:
+            scores = self.get_sentiments([comment for _, comment in to_score])
+            updates = {}
+            for (r_id, _), score in zip(to_score, scores):
+                results[r_id] = score
+                updates[f'{r_id}/sentiment'] = score
+            try:
+                db.reference('reviews').update(updates)
+            except Exception as e:
+                print(f"Failed to persist review sentiment: {e}")
+
+        return results
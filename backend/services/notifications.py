@@ -0,0 +1,335 @@
+from services.rtdb import database as db
+import atexit
+import collections
+import queue
+import threading
+import time
+from services.metrics import latency_summary
+from services.rtdb.keys import is_valid_key
+from services.rtdb.request_cache import RequestReadCache
+from services.rtdb.write_batch import WriteBatch
+
+NotificationSettings = collections.namedtuple('NotificationSettings', ['push', 'email', 'address'])
+
+def build_notification(title, message, notif_type, link=""):
+    """The in-app notification record written under users/<uid>/notifications."""
+    return {
+        'title': title,
+        'message': message,
+        'type': notif_type,
+        'timestamp': {".sv": "timestamp"},
+        'read': False,
+        'link': link
+    }
+
+def dispatch_email(email, title, message):
+    # Trigger APIs here
+    print(f"[EMAIL GATEWAY] Dispatched Email to {email}: {title} | {message}")
+
+class NotificationSettingsIndex:
+    """
+    Cached uid -> NotificationSettings(push, email, address) view of each
+    user's notification preferences.
+
+    Only `users/<uid>/settings/notifications` and `users/<uid>/email` are
+    read (concurrently, for several users at once with get_many), instead
+    of the whole profile with its messages and notification history.
+    Settings missing on an existing user default to push and e-mail on;
+    only a uid whose `users/<uid>` node does not exist (checked with a
+    shallow read, and only when both fields are missing) is unknown (None).
+    Entries are kept for `ttl` seconds.
+    """
+    def __init__(self, ttl=60, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()  # uid -> (settings or None, fetched_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, uid):
+        return self.get_many([uid]).get(uid)
+
+    def get_many(self, uids):
+        """Returns {uid: settings or None} for the given uids, fetching all misses in parallel."""
+        result = {}
+        missing = []
+        now = time.time()
+        with self._lock:
+            for uid in dict.fromkeys(u for u in uids if u):
+                entry = self._entries.get(uid)
+                if entry is not None and now - entry[1] < self.ttl:
+                    self._entries.move_to_end(uid)
+                    self.hits += 1
+                    result[uid] = entry[0]
+                else:
+                    self.misses += 1
+                    missing.append(uid)
+
+        if missing:
+            reads = RequestReadCache()
+            paths = []
+            for uid in missing:
+                paths += [f'users/{uid}/settings/notifications', f'users/{uid}/email']
+            values = reads.get_many(*paths)
+            # Neither field set: an account without preferences or e-mail, or no account at all
+            bare = [uid for i, uid in enumerate(missing) if values[2 * i] is None and values[2 * i + 1] is None]
+            unknown = {uid for uid in bare if db.reference(f'users/{uid}').get(shallow=True) is None}
+            with self._lock:
+                for i, uid in enumerate(missing):
+                    prefs, address = values[2 * i], values[2 * i + 1]
+                    if uid in unknown:
+                        settings = None
+                    else:
+                        prefs = prefs if isinstance(prefs, dict) else {}
+                        settings = NotificationSettings(prefs.get('push', True) is not False,
+                                                        prefs.get('email', True) is not False,
+                                                        address or 'Unknown')
+                    self._entries[uid] = (settings, time.time())
+                    self._entries.move_to_end(uid)
+                    result[uid] = settings
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return result
+
+    def invalidate(self, uid):
+        with self._lock:
+            self._entries.pop(uid, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+class NotificationDispatcher:
+    """
+    Delivers user notifications off the request path.
+
+    Handlers enqueue an intent and return; a fixed pool of worker threads
+    delivers them. Each worker coalesces whatever arrives within
+    `batch_window` seconds (up to `max_batch` intents), resolves all the
+    recipients' preferences with one settings-index lookup and writes
+    every in-app notification in a single multi-path update, then sends
+    the e-mails. A dispute resolution or auction finalisation notifying
+    both parties therefore costs one RTDB round-trip instead of one per
+    notification.
+
+    A failed delivery is retried up to `max_attempts` times with
+    exponential backoff (an intent whose notification was already written
+    only retries its e-mail), then dead-lettered to
+    `notification_dead_letters` (and kept in memory for the metrics
+    endpoint). If the grouped settings lookup or write fails, each intent
+    of the group is retried on its own first, so one bad recipient cannot
+    take the others down with it. When the bounded queue is full, the
+    intent is delivered inline so nothing is dropped.
+    """
+    DEAD_LETTER_PATH = 'notification_dead_letters'
+
+    def __init__(self, settings_index, workers=2, max_queue=1000, max_attempts=3, retry_backoff=1.0,
+                 batch_window=0.05, max_batch=100):
+        self.settings_index = settings_index
+        self.workers = workers
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._threads = []
+        self._retrying = 0
+        self.enqueued = 0
+        self.delivered = 0
+        self.skipped = 0
+        self.invalid = 0
+        self.split_batches = 0
+        self.retried = 0
+        self.dead_lettered = 0
+        self.inline = 0
+        self.batches = 0
+        self.batched_writes = 0
+        self._dispatch_ms = collections.deque(maxlen=1000)
+        self._dead_letters = collections.deque(maxlen=50)
+
+    def enqueue(self, target_uid, title, message, notif_type, link=""):
+        """Queues a notification for `target_uid`; returns immediately."""
+        if not target_uid:
+            return
+        if not is_valid_key(target_uid):
+            # Would fail its own write and any batch it is grouped with
+            print(f"Notification '{title}' dropped: invalid recipient uid {target_uid!r}")
+            with self._lock:
+                self.invalid += 1
+            return
+        intent = {
+            'uid': target_uid,
+            'title': title,
+            'message': message,
+            'type': notif_type,
+            'link': link,
+            'attempts': 0,
+            'pushed': False,
+            'enqueuedAt': time.time()
+        }
+        self._ensure_workers()
+        with self._lock:
+            self.enqueued += 1
+        try:
+            self._queue.put_nowait(intent)
+        except queue.Full:
+            with self._lock:
+                self.inline += 1
+            self._process([intent])
+
+    def drain(self, timeout=5):
+        """Waits (up to `timeout` seconds) for queued notifications to be delivered."""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self._lock:
+                idle = self._queue.unfinished_tasks == 0 and self._retrying == 0
+            if idle:
+                return True
+            time.sleep(0.05)
+        return False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queueDepth': self._queue.qsize(),
+                'maxQueue': self.max_queue,
+                'workers': self.workers,
+                'enqueued': self.enqueued,
+                'delivered': self.delivered,
+                'skipped': self.skipped,
+                'invalidRecipients': self.invalid,
+                'splitBatches': self.split_batches,
+                'retried': self.retried,
+                'retryPending': self._retrying,
+                'deadLettered': self.dead_lettered,
+                'deliveredInline': self.inline,
+                'batches': self.batches,
+                'avgWritesPerBatch': round(self.batched_writes / self.batches, 2) if self.batches else 0.0,
+                'dispatchMs': latency_summary(sorted(self._dispatch_ms)),
+                'recentDeadLetters': list(self._dead_letters),
+                'settings': self.settings_index.stats()
+            }
+
+    def _ensure_workers(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._work, name=f'notify-worker-{i}', daemon=True)
+                t.start()
+                self._threads.append(t)
+            atexit.register(self.drain)
+
+    def _work(self):
+        while True:
+            intents = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_window
+            while len(intents) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    intents.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._process(intents)
+            finally:
+                for _ in intents:
+                    self._queue.task_done()
+
+    def _process(self, intents):
+        """Delivers a group of intents: one settings lookup, one multi-path write, then e-mails."""
+        try:
+            settings = self.settings_index.get_many([intent['uid'] for intent in intents])
+        except Exception as e:
+            self._split_or_fail(intents, e)
+            return
+
+        known = [intent for intent in intents if settings.get(intent['uid']) is not None]
+        with self._lock:
+            self.skipped += len(intents) - len(known)
+
+        batch = WriteBatch()
+        for intent in known:
+            if settings[intent['uid']].push and not intent['pushed']:
+                payload = build_notification(intent['title'], intent['message'], intent['type'], intent['link'])
+                batch.push(f"users/{intent['uid']}/notifications", payload)
+        writes = len(batch)
+        try:
+            batch.commit()
+        except Exception as e:
+            self._split_or_fail(known, e)
+            return
+        if writes:
+            with self._lock:
+                self.batches += 1
+                self.batched_writes += writes
+
+        for intent in known:
+            prefs = settings[intent['uid']]
+            if prefs.push and not intent['pushed']:
+                intent['pushed'] = True
+                print(f"[PUSH GATEWAY] Dispatched Notification to {intent['uid']}: {intent['title']}")
+            try:
+                if prefs.email:
+                    dispatch_email(prefs.address, intent['title'], intent['message'])
+            except Exception as e:
+                self._failed(intent, e)
+                continue
+            with self._lock:
+                self.delivered += 1
+                self._dispatch_ms.append((time.time() - intent['enqueuedAt']) * 1000)
+
+    def _split_or_fail(self, intents, error):
+        """A grouped step failed: retry each intent alone so only the one at fault counts a failed attempt."""
+        if len(intents) == 1:
+            self._failed(intents[0], error)
+            return
+        with self._lock:
+            self.split_batches += 1
+        for intent in intents:
+            self._process([intent])
+
+    def _failed(self, intent, error):
+        intent['attempts'] += 1
+        intent['lastError'] = str(error)
+        if intent['attempts'] < self.max_attempts:
+            delay = self.retry_backoff * (2 ** (intent['attempts'] - 1))
+            with self._lock:
+                self.retried += 1
+                self._retrying += 1
+            timer = threading.Timer(delay, self._retry, args=(intent,))
+            timer.daemon = True
+            timer.start()
+            return
+
+        print(f"Notification to {intent['uid']} dead-lettered after {intent['attempts']} attempts: {error}")
+        record = {k: v for k, v in intent.items() if k != 'enqueuedAt'}
+        record['failedAt'] = int(time.time() * 1000)
+        with self._lock:
+            self.dead_lettered += 1
+            self._dead_letters.append(record)
+        try:
+            db.reference(self.DEAD_LETTER_PATH).push(record)
+        except Exception as e:
+            print(f"Failed to persist dead-lettered notification: {e}")
+
+    def _retry(self, intent):
+        with self._lock:
+            self._retrying -= 1
+        try:
+            self._queue.put_nowait(intent)
+        except queue.Full:
+            self._process([intent])
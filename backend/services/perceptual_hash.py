@@ -0,0 +1,273 @@
+import io
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+from PIL import Image
+
+HASH_BITS = 64
+
+def dhash(image_content, hash_size=8):
+    """
+    64-bit difference hash: the image is reduced to (hash_size+1) x hash_size
+    grayscale pixels and each bit records whether a pixel is brighter than its
+    right-hand neighbour. Re-crops, resizes and recompressions of the same
+    photo land within a few bits of each other.
+    """
+    with Image.open(io.BytesIO(image_content)) as img:
+        small = img.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+        pixels = list(small.getdata())
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (1 if pixels[offset + col] > pixels[offset + col + 1] else 0)
+    return value
+
+def hamming_distance(a, b):
+    """Number of differing bits (int.bit_count() would need Python 3.10)."""
+    return bin(a ^ b).count('1')
+
+class MultiIndexHashTable:
+    """
+    In-memory Hamming-distance index using multi-index hashing.
+
+    Each 64-bit hash is split into `chunks` substrings with one lookup table per
+    substring. Writing r = q * chunks + a, two hashes within distance r must
+    differ by at most q bits in one of the first a + 1 substrings or by at most
+    q - 1 bits in one of the others (pigeonhole), so a query only probes the
+    buckets of those few substring variants instead of scanning every hash.
+    """
+    def __init__(self, chunks=4):
+        self.chunks = chunks
+        self.chunk_bits = HASH_BITS // chunks
+        self._mask = (1 << self.chunk_bits) - 1
+        self._tables = [{} for _ in range(chunks)]
+        self._hashes = []
+        self._payloads = []
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def add(self, value, payload):
+        idx = len(self._hashes)
+        self._hashes.append(value)
+        self._payloads.append(payload)
+        for i, part in enumerate(self._split(value)):
+            self._tables[i].setdefault(part, []).append(idx)
+
+    def nearest(self, value, max_distance):
+        """Returns (distance, payload) of the closest hash within max_distance, or None."""
+        q, a = divmod(max_distance, self.chunks)
+        hashes = self._hashes
+        best_distance = max_distance + 1
+        best_idx = None
+        for i, part in enumerate(self._split(value)):
+            radius = q if i <= a else q - 1
+            if radius < 0:
+                continue
+            table = self._tables[i]
+            for variant in self._variants(part, radius):
+                for idx in table.get(variant, ()):
+                    distance = hamming_distance(hashes[idx], value)
+                    if distance < best_distance:
+                        best_distance, best_idx = distance, idx
+                        if distance == 0:
+                            return 0, self._payloads[idx]
+        if best_idx is None:
+            return None
+        return best_distance, self._payloads[best_idx]
+
+    def _split(self, value):
+        return [(value >> (i * self.chunk_bits)) & self._mask for i in range(self.chunks)]
+
+    def _variants(self, part, radius):
+        yield part
+        for r in range(1, radius + 1):
+            for bits in itertools.combinations(range(self.chunk_bits), r):
+                flipped = part
+                for b in bits:
+                    flipped ^= 1 << b
+                yield flipped
+
+class PerceptualHashIndex:
+    """
+    Persistent near-duplicate index of verified images.
+
+    Each verified image's dHash, verdict, listing and uploader is stored in
+    SQLite. Only (dHash, rowid) pairs are held in memory, in a
+    MultiIndexHashTable; a match's verdict is read back from SQLite. Rows
+    written by other workers are picked up incrementally (by rowid) at most
+    every `sync_interval` seconds.
+
+    Like the verdict cache, rows expire after `ttl` seconds and the table is
+    bounded to `max_entries` (oldest rows deleted first). Expired matches
+    are ignored, and the in-memory table is rebuilt from the live rows once
+    it outgrows the bound or holds rows well past their expiry.
+    """
+    def __init__(self, path, max_distance=5, sync_interval=5, ttl=7 * 24 * 3600, max_entries=50000):
+        self.path = path
+        self.max_distance = max_distance
+        self.sync_interval = sync_interval
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._table = MultiIndexHashTable()
+        self._lock = threading.Lock()
+        self._last_rowid = 0
+        self._oldest = None  # created_at of the oldest row in the in-memory table
+        self._synced_at = 0
+        self._conn = None
+        self.lookups = 0
+        self.near_hits = 0
+        self.exact_hits = 0
+        self.evictions = 0
+        self.rebuilds = 0
+        self._init_db()
+
+    def _init_db(self):
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS image_phashes ('
+                ' image_hash TEXT PRIMARY KEY,'
+                ' phash INTEGER NOT NULL,'
+                ' verdict TEXT NOT NULL,'
+                ' listing_id TEXT,'
+                ' uploader_id TEXT,'
+                ' created_at REAL NOT NULL)'
+            )
+            columns = {row[1] for row in self._conn.execute('PRAGMA table_info(image_phashes)')}
+            if 'uploader_id' not in columns:
+                # Indexes created before uploaders were recorded
+                self._conn.execute('ALTER TABLE image_phashes ADD COLUMN uploader_id TEXT')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_image_phashes_created_at ON image_phashes(created_at)')
+            self._conn.commit()
+            self._sync()
+        except Exception as e:
+            print(f"Perceptual hash index disabled, could not open {self.path}: {e}")
+            self._conn = None
+
+    def find(self, phash):
+        """
+        Returns {'distance', 'imageHash', 'verdict', 'listingId', 'uploaderId'}
+        for the nearest earlier unexpired image, or None.
+        """
+        if not self._conn:
+            return None
+        with self._lock:
+            if time.time() - self._synced_at >= self.sync_interval:
+                self._sync()
+            self.lookups += 1
+            found = self._table.nearest(phash, self.max_distance)
+            if found is None:
+                return None
+            distance, rowid = found
+            row = self._conn.execute(
+                'SELECT image_hash, verdict, listing_id, uploader_id FROM image_phashes WHERE rowid = ? AND created_at >= ?',
+                (rowid, time.time() - self.ttl)
+            ).fetchone()
+            if row is None:
+                # Expired, or evicted by another worker since the last sync
+                return None
+            self.near_hits += 1
+        return _match(distance, *row)
+
+    def find_exact(self, image_hash):
+        """Same shape as find() (distance 0) for an earlier unexpired image with exactly these bytes, or None."""
+        if not self._conn:
+            return None
+        with self._lock:
+            self.lookups += 1
+            row = self._conn.execute(
+                'SELECT image_hash, verdict, listing_id, uploader_id FROM image_phashes WHERE image_hash = ? AND created_at >= ?',
+                (image_hash, time.time() - self.ttl)
+            ).fetchone()
+            if row is None:
+                return None
+            self.exact_hits += 1
+        return _match(0, *row)
+
+    def add(self, image_hash, phash, verdict, listing_id=None, uploader_id=None):
+        if not self._conn:
+            return
+        now = time.time()
+        try:
+            with self._lock:
+                # An expired row for the same bytes gives way to the new upload
+                self._conn.execute('DELETE FROM image_phashes WHERE image_hash = ? AND created_at < ?',
+                                   (image_hash, now - self.ttl))
+                self._conn.execute(
+                    'INSERT OR IGNORE INTO image_phashes (image_hash, phash, verdict, listing_id, uploader_id, created_at)'
+                    ' VALUES (?, ?, ?, ?, ?, ?)',
+                    (image_hash, _to_signed(phash), json.dumps(verdict), listing_id, uploader_id, now)
+                )
+                overflow = self._conn.execute('SELECT COUNT(*) FROM image_phashes').fetchone()[0] - self.max_entries
+                if overflow > 0:
+                    self._conn.execute(
+                        'DELETE FROM image_phashes WHERE rowid IN '
+                        '(SELECT rowid FROM image_phashes ORDER BY created_at ASC LIMIT ?)', (overflow,)
+                    )
+                    self.evictions += overflow
+                self._conn.commit()
+                self._sync()
+        except Exception as e:
+            print(f"Perceptual hash index write failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self._conn is not None,
+                'size': len(self._table),
+                'maxEntries': self.max_entries,
+                'ttlSeconds': self.ttl,
+                'maxDistance': self.max_distance,
+                'lookups': self.lookups,
+                'nearDuplicateHits': self.near_hits,
+                'exactDuplicateHits': self.exact_hits,
+                'evictions': self.evictions,
+                'rebuilds': self.rebuilds
+            }
+
+    def _sync(self):
+        now = time.time()
+        # The table cannot drop single entries; start over once it is too big or too stale
+        if len(self._table) > self.max_entries or (self._oldest is not None and now - self._oldest > 1.5 * self.ttl):
+            self._table = MultiIndexHashTable()
+            self._oldest = None
+            self.rebuilds += 1
+            rows = self._conn.execute(
+                'SELECT rowid, phash, created_at FROM image_phashes WHERE created_at >= ? ORDER BY rowid DESC LIMIT ?',
+                (now - self.ttl, self.max_entries)
+            ).fetchall()
+            rows.reverse()
+            self._last_rowid = self._conn.execute('SELECT COALESCE(MAX(rowid), 0) FROM image_phashes').fetchone()[0]
+        else:
+            rows = self._conn.execute(
+                'SELECT rowid, phash, created_at FROM image_phashes WHERE rowid > ? AND created_at >= ? ORDER BY rowid',
+                (self._last_rowid, now - self.ttl)
+            ).fetchall()
+        for rowid, phash, created_at in rows:
+            self._table.add(phash & ((1 << HASH_BITS) - 1), rowid)
+            self._oldest = created_at if self._oldest is None else min(self._oldest, created_at)
+            self._last_rowid = max(self._last_rowid, rowid)
+        self._synced_at = now
+
+def _match(distance, image_hash, verdict_json, listing_id, uploader_id):
+    return {
+        'distance': distance,
+        'imageHash': image_hash,
+        'verdict': json.loads(verdict_json),
+        'listingId': listing_id,
+        'uploaderId': uploader_id
+    }
+
+def _to_signed(value):
+    """SQLite integers are signed 64-bit."""
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
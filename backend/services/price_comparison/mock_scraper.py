@@ -1,7 +1,21 @@
 import random
+import time
 
 class MockScraper:
+    """
+    Offline stand-in for the Daraz/OLX scrapers. `source` keeps only that
+    site's results (so one instance can replace each scraper) and
+    `latency_ms` (+ up to `jitter_ms`) simulates the page fetch.
+    """
+    def __init__(self, source=None, latency_ms=0, jitter_ms=0):
+        self.source = source
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+
     def search(self, query):
+        delay = self.latency_ms + random.uniform(0, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
         print(f" returning mock results for {query}")
         # Generate varied realistic results based on query
         base_price = 100000 if 'iphone' in query.lower() else 5000
@@ -29,4 +43,6 @@ class MockScraper:
                 'link': 'https://www.daraz.pk'
             }
         ]
+        if self.source:
+            results = [r for r in results if r['source'] == self.source]
         return results
@@ -0,0 +1,156 @@
+from flask import g, request
+import cProfile
+import collections
+import json
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+
+class RequestProfiler:
+    """
+    Opt-in cProfile of individual requests.
+
+    A request is profiled when it is picked by `sample_rate` (0-1) or when
+    it carries the `header` and `authorize()` accepts it (the app only lets
+    admins force a profile). Its handler runs under cProfile; the top
+    `top_frames` functions by cumulative time are stored with the request's
+    RTDB call breakdown, which RTDBMetrics appends to `g.rtdb_call_log`
+    while a profile is running (reads prefetched on other threads are
+    included there, though cProfile only sees the request thread).
+
+    Profiles are kept in memory (the last `history`), or in `directory` so
+    that every gunicorn worker's profiles are listed together.
+
+    Nothing is hooked into the app unless init_app() is called, so a
+    disabled profiler costs nothing.
+    """
+    def __init__(self, sample_rate=0.0, header='X-Profile-Request', authorize=None, history=50,
+                 top_frames=25, directory=None):
+        self.sample_rate = sample_rate
+        self.header = header
+        self.authorize = authorize
+        self.history = history
+        self.top_frames = top_frames
+        self.directory = directory
+        self._profiles = collections.deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def init_app(self, app):
+        app.before_request(self._before)
+        app.after_request(self._after)
+        app.teardown_request(self._teardown)
+
+    def recent(self, limit=None):
+        """Most recent profiles first."""
+        limit = limit or self.history
+        if not self.directory:
+            with self._lock:
+                return list(reversed(self._profiles))[:limit]
+        profiles = []
+        names = sorted((n for n in os.listdir(self.directory) if n.endswith('.json') and not n.startswith('.')), reverse=True)
+        for name in names[:limit]:
+            try:
+                with open(os.path.join(self.directory, name), encoding='utf-8') as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # pruned by another worker meanwhile
+        return profiles
+
+    def _before(self):
+        trigger = None
+        if self.header and request.headers.get(self.header):
+            if self.authorize is None or self.authorize():
+                trigger = 'header'
+        if trigger is None and self.sample_rate > 0 and random.random() < self.sample_rate:
+            trigger = 'sample'
+        if trigger is None:
+            return
+
+        g.rtdb_call_log = []
+        g.request_profile = (cProfile.Profile(), trigger, time.perf_counter())
+        g.request_profile[0].enable()
+
+    def _after(self, response):
+        if 'request_profile' in g:
+            g.request_profile_status = response.status_code
+        return response
+
+    def _teardown(self, error=None):
+        state = g.pop('request_profile', None)
+        if state is None:
+            return
+        profile, trigger, started = state
+        profile.disable()
+        duration_ms = (time.perf_counter() - started) * 1000
+        try:
+            status = g.pop('request_profile_status', 500)
+            self._store(self._build(profile, trigger, duration_ms, status, error, g.pop('rtdb_call_log', [])))
+        except Exception as e:
+            print(f"Failed to store request profile: {e}")
+
+    def _build(self, profile, trigger, duration_ms, status, error, rtdb_calls):
+        stats = pstats.Stats(profile)
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        frames = []
+        for (filename, line, name), (_, calls, tottime, cumtime, _) in rows[:self.top_frames]:
+            if filename.startswith(self._root):
+                filename = os.path.relpath(filename, self._root)
+            frames.append({
+                'function': f'{filename}:{line}({name})',
+                'calls': calls,
+                'ownMs': round(tottime * 1000, 3),
+                'cumulativeMs': round(cumtime * 1000, 3)
+            })
+
+        breakdown = {}
+        for operation, pattern, elapsed_ms, size in rtdb_calls:
+            entry = breakdown.setdefault((operation, pattern), {'operation': operation, 'path': pattern,
+                                                                'calls': 0, 'totalMs': 0.0, 'bytes': 0})
+            entry['calls'] += 1
+            entry['totalMs'] += elapsed_ms
+            entry['bytes'] += size
+        rtdb = sorted(breakdown.values(), key=lambda entry: entry['totalMs'], reverse=True)
+        for entry in rtdb:
+            entry['totalMs'] = round(entry['totalMs'], 2)
+
+        return {
+            'id': uuid.uuid4().hex[:12],
+            'at': int(time.time() * 1000),
+            'pid': os.getpid(),
+            'trigger': trigger,
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': status,
+            'error': str(error) if error else None,
+            'durationMs': round(duration_ms, 2),
+            'rtdb': {
+                'calls': len(rtdb_calls),
+                'totalMs': round(sum(call[2] for call in rtdb_calls), 2),
+                'breakdown': rtdb
+            },
+            'topFrames': frames
+        }
+
+    def _store(self, record):
+        if not self.directory:
+            with self._lock:
+                self._profiles.append(record)
+            return
+        name = f"{record['at']}-{record['pid']}-{record['id']}.json"
+        tmp = os.path.join(self.directory, f'.{name}.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(record, f)
+        os.replace(tmp, os.path.join(self.directory, name))
+        stored = sorted(n for n in os.listdir(self.directory) if n.endswith('.json') and not n.startswith('.'))
+        for stale in stored[:-self.history]:
+            try:
+                os.remove(os.path.join(self.directory, stale))
+            except OSError:
+                pass
@@ -0,0 +1,109 @@
+import bisect
+import json
+import os
+import re
+
+SEVERITY_BLOCK = 'block'
+SEVERITY_FLAG = 'flag'
+
+def load_taxonomy(path=None):
+    """Returns the taxonomy from a JSON file when `path` exists, else the built-in default."""
+    if path and os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Failed to load restricted taxonomy from {path}, using defaults: {e}")
+    from moderation_constants import RESTRICTED_TAXONOMY
+    return RESTRICTED_TAXONOMY
+
+class RestrictedContentMatcher:
+    """
+    Compiled restricted-term matcher.
+
+    The terms of each severity are folded into one alternation regex,
+    compiled once, so a batch of labels/objects or a listing's title and
+    description is scanned in one pass per severity instead of terms x texts
+    substring checks. Severities are scanned separately because regex
+    matches do not overlap: a longer "flag" term must not hide a shorter
+    "block" term inside it.
+
+    Each term is its own named group, so a match resolves to its taxonomy
+    term through `m.lastgroup` even when IGNORECASE matched a case variant
+    whose .lower() is not the term itself ("Exploſive" for "explosive").
+
+    `whole_words=False` keeps the Vision-label behaviour of matching a term
+    anywhere inside a label ("handgun" hits "gun"); `whole_words=True` only
+    matches terms at word starts, which suits free text ("begun" is fine).
+    """
+    def __init__(self, taxonomy, whole_words=False):
+        self.terms = {}  # lower-case term -> (category, severity)
+        for category, spec in taxonomy.items():
+            severity = spec.get('severity', SEVERITY_BLOCK)
+            for term in spec.get('terms', []):
+                term = term.strip().lower()
+                # A term listed under several categories keeps its blocking entry
+                if term and (term not in self.terms or self.terms[term][1] != SEVERITY_BLOCK):
+                    self.terms[term] = (category, severity)
+
+        tiers = {}
+        for term, (_, severity) in self.terms.items():
+            tiers.setdefault(severity, []).append(term)
+
+        # Blocking terms first; within a tier, longest terms first so the most specific wins at a position
+        self._patterns = []
+        self._group_terms = {}  # group name -> term
+        for severity in sorted(tiers, key=lambda sev: sev != SEVERITY_BLOCK):
+            groups = []
+            for term in sorted(tiers[severity], key=len, reverse=True):
+                name = f't{len(self._group_terms)}'
+                self._group_terms[name] = term
+                groups.append(f'(?P<{name}>{re.escape(term)})')
+            alternation = '|'.join(groups)
+            if whole_words:
+                self._patterns.append(re.compile(r'\b(?:' + alternation + r')', re.IGNORECASE))
+            else:
+                self._patterns.append(re.compile(alternation, re.IGNORECASE))
+
+    def scan(self, texts):
+        """
+        Scans a list of (source, text) pairs, one regex pass per severity.
+        Returns [{'term', 'category', 'severity', 'source', 'text'}], one entry
+        per (term, source, text) combination found.
+        """
+        if not self._patterns or not texts:
+            return []
+
+        # Join everything into one buffer; offsets map each match back to its text
+        starts = []
+        parts = []
+        offset = 0
+        for _, text in texts:
+            starts.append(offset)
+            parts.append(text)
+            offset += len(text) + 1
+        buffer = '\n'.join(parts)
+
+        matches = []
+        seen = set()
+        for m in (m for pattern in self._patterns for m in pattern.finditer(buffer)):
+            idx = bisect.bisect_right(starts, m.start()) - 1
+            source, text = texts[idx]
+            term = self._group_terms[m.lastgroup]
+            key = (term, source, idx)
+            if key in seen:
+                continue
+            seen.add(key)
+            category, severity = self.terms[term]
+            matches.append({
+                'term': term,
+                'category': category,
+                'severity': severity,
+                'source': source,
+                'text': text
+            })
+        return matches
+
+    def scan_text(self, **fields):
+        """Convenience wrapper for listing fields, e.g. scan_text(title=..., description=...)."""
+        return self.scan([(name, value) for name, value in fields.items() if value])
@@ -0,0 +1,31 @@
+from firebase_admin import db as firebase_db
+from services.rtdb.instrumentation import InstrumentedReference
+
+TransactionAbortedError = firebase_db.TransactionAbortedError
+
+_backend = None
+_metrics = None
+
+def use(backend):
+    """
+    Routes every reference() to `backend` (any object with a firebase-style
+    reference(path) method, such as emulator.InMemoryDatabase); None goes
+    back to firebase_admin.db.
+    """
+    global _backend
+    _backend = backend
+
+def instrument(metrics):
+    """Reports every call made through reference() to `metrics` (an RTDBMetrics); None turns it off."""
+    global _metrics
+    _metrics = metrics
+
+def current():
+    return _backend if _backend is not None else firebase_db
+
+def reference(path='/'):
+    """Drop-in for firebase_admin.db.reference on the configured backend."""
+    ref = current().reference(path)
+    if _metrics is not None:
+        return InstrumentedReference(ref, _metrics)
+    return ref
@@ -0,0 +1,404 @@
+from firebase_admin.db import TransactionAbortedError
+import collections
+import copy
+import json
+import queue
+import random
+import threading
+import time
+from services.rtdb.write_batch import generate_push_id
+
+MAX_TRANSACTION_TRIES = 25  # same limit as firebase_admin
+
+def _split(path):
+    return [part for part in (path or '').split('/') if part]
+
+def _join(parts):
+    return '/' + '/'.join(parts)
+
+def _prune(value):
+    """RTDB never stores nulls or empty objects; returns None for nothing."""
+    if isinstance(value, dict):
+        pruned = {}
+        for key, child in value.items():
+            child = _prune(child)
+            if child is not None:
+                pruned[str(key)] = child
+        return pruned or None
+    if isinstance(value, list):
+        # Kept as a list, which is how the SDK returns array-like nodes
+        items = [_prune(child) for child in value]
+        return items if any(item is not None for item in items) else None
+    return value
+
+def _sort_rank(value):
+    """Firebase query ordering: null, false, true, numbers, strings, objects."""
+    if value is None:
+        return (0, 0)
+    if value is False:
+        return (1, 0)
+    if value is True:
+        return (2, 0)
+    if isinstance(value, (int, float)):
+        return (3, value)
+    if isinstance(value, str):
+        return (4, value)
+    return (5, 0)
+
+class Event:
+    """Same shape as firebase_admin.db.Event: event_type, path (relative to the listener) and data."""
+    def __init__(self, event_type, path, data):
+        self.event_type = event_type
+        self.path = path
+        self.data = data
+
+class ListenerRegistration:
+    def __init__(self, database, listener):
+        self._database = database
+        self._listener = listener
+
+    def close(self):
+        self._database._remove_listener(self._listener)
+
+class InMemoryDatabase:
+    """
+    In-process stand-in for the Realtime Database, covering the
+    db.reference() surface this app uses: get (incl. shallow), set, update
+    (incl. multi-path at the root), push, delete, transaction, child,
+    order_by_child/key/value queries with equal_to/start_at/end_at/limits,
+    listen, and the {".sv": "timestamp"} / {".sv": {"increment": n}}
+    server values.
+
+    `latency_ms` (+ up to `jitter_ms`) is slept on every call to stand in
+    for the network round-trip. `conflict_rate` is the probability that a
+    transaction attempt finds the value changed underneath it and has to
+    rerun its function, as under real contention; after 25 attempts it
+    raises TransactionAbortedError like the SDK.
+    """
+    def __init__(self, data=None, latency_ms=0, jitter_ms=0, conflict_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.conflict_rate = conflict_rate
+        self._random = random.Random(seed)
+        self._root = _prune(copy.deepcopy(data)) or {}
+        self._lock = threading.RLock()
+        self._listeners = []
+        self._events = None
+        self.calls = collections.Counter()
+        self.transaction_retries = 0
+        self.transactions_aborted = 0
+
+    @classmethod
+    def from_file(cls, path, **options):
+        """Builds an emulator seeded with a JSON export of the database."""
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f), **options)
+
+    def reference(self, path='/'):
+        return Reference(self, _split(path))
+
+    def export(self):
+        """Deep copy of the whole tree (like a JSON export)."""
+        with self._lock:
+            return copy.deepcopy(self._root)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls': dict(self.calls),
+                'transactionRetries': self.transaction_retries,
+                'transactionsAborted': self.transactions_aborted,
+                'listeners': len(self._listeners)
+            }
+
+    # --- internals used by Reference / Query ---
+
+    def _round_trip(self, operation):
+        with self._lock:
+            self.calls[operation] += 1
+        delay = self.latency_ms
+        if self.jitter_ms:
+            delay += self._random.uniform(0, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def _read(self, parts):
+        node = self._root
+        for part in parts:
+            if isinstance(node, list) and part.isdigit() and int(part) < len(node):
+                node = node[int(part)]
+            elif isinstance(node, dict) and part in node:
+                node = node[part]
+            else:
+                return None
+        return node
+
+    def _write(self, parts, value):
+        """Replaces the value at `parts` (caller holds the lock); returns the stored value."""
+        value = _prune(self._resolve(copy.deepcopy(value), parts))
+        if not parts:
+            self._root = value or {}
+            return value
+
+        trail = [self._root]
+        node = self._root
+        for part in parts[:-1]:
+            child = node.get(part) if isinstance(node, dict) else None
+            if not isinstance(child, dict):
+                if value is None:
+                    return None
+                child = {}
+                node[part] = child
+            node = child
+            trail.append(node)
+
+        if value is None:
+            node.pop(parts[-1], None)
+            # Drop parents left empty, as RTDB does
+            for depth in range(len(parts) - 1, 0, -1):
+                if trail[depth]:
+                    break
+                trail[depth - 1].pop(parts[depth - 1], None)
+        else:
+            node[parts[-1]] = value
+        return value
+
+    def _resolve(self, value, parts):
+        """Replaces server values; increments apply to the value currently stored at that path."""
+        if isinstance(value, dict):
+            if '.sv' in value and len(value) == 1:
+                server_value = value['.sv']
+                if server_value == 'timestamp':
+                    return int(time.time() * 1000)
+                if isinstance(server_value, dict) and 'increment' in server_value:
+                    current = self._read(parts)
+                    base = current if isinstance(current, (int, float)) and not isinstance(current, bool) else 0
+                    return base + server_value['increment']
+                raise ValueError(f'Unsupported server value: {server_value}')
+            return {key: self._resolve(child, parts + [str(key)]) for key, child in value.items()}
+        return value
+
+    def _apply(self, changes):
+        """Applies [(parts, value)] atomically and notifies listeners."""
+        with self._lock:
+            for parts, value in changes:
+                self._write(parts, value)
+            if self._listeners:
+                for parts, _ in changes:
+                    self._notify(parts)
+
+    def _transaction(self, parts, transaction_update):
+        for _ in range(MAX_TRANSACTION_TRIES):
+            self._round_trip('transaction')
+            with self._lock:
+                snapshot = copy.deepcopy(self._read(parts))
+            new_value = transaction_update(copy.deepcopy(snapshot))
+            with self._lock:
+                conflicted = self._random.random() < self.conflict_rate
+                if not conflicted and self._read(parts) == snapshot:
+                    self._apply([(parts, new_value)])
+                    return copy.deepcopy(self._read(parts))
+                self.transaction_retries += 1
+        with self._lock:
+            self.transactions_aborted += 1
+        raise TransactionAbortedError('Transaction aborted after failed retries.')
+
+    # --- listeners ---
+
+    def _add_listener(self, parts, callback):
+        listener = (tuple(parts), callback)
+        with self._lock:
+            self._listeners.append(listener)
+            if self._events is None:
+                self._events = queue.Queue()
+                threading.Thread(target=self._deliver_events, name='rtdb-emulator-events', daemon=True).start()
+            self._events.put((callback, Event('put', '/', copy.deepcopy(self._read(parts)))))
+        return ListenerRegistration(self, listener)
+
+    def _remove_listener(self, listener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def _notify(self, parts):
+        parts = tuple(parts)
+        for listen_parts, callback in self._listeners:
+            if parts[:len(listen_parts)] == listen_parts:
+                relative = list(parts[len(listen_parts):])
+                event = Event('put', _join(relative), copy.deepcopy(self._read(parts)))
+            elif listen_parts[:len(parts)] == parts:
+                event = Event('put', '/', copy.deepcopy(self._read(listen_parts)))
+            else:
+                continue
+            self._events.put((callback, event))
+
+    def _deliver_events(self):
+        while True:
+            callback, event = self._events.get()
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"RTDB emulator listener failed: {e}")
+
+class Reference:
+    """Emulated firebase_admin.db.Reference."""
+    def __init__(self, database, parts):
+        self._db = database
+        self._parts = parts
+
+    @property
+    def key(self):
+        return self._parts[-1] if self._parts else None
+
+    @property
+    def path(self):
+        return _join(self._parts)
+
+    @property
+    def parent(self):
+        return Reference(self._db, self._parts[:-1]) if self._parts else None
+
+    def child(self, path):
+        if not path or not isinstance(path, str):
+            raise ValueError(f'Invalid path argument: "{path}". Path must be a non-empty string.')
+        return Reference(self._db, self._parts + _split(path))
+
+    def get(self, etag=False, shallow=False):
+        if etag:
+            raise ValueError('etag reads are not supported by the emulator')
+        self._db._round_trip('get')
+        with self._db._lock:
+            value = self._db._read(self._parts)
+            if shallow and isinstance(value, dict):
+                return {key: (True if isinstance(child, dict) else child) for key, child in value.items()}
+            return copy.deepcopy(value)
+
+    def set(self, value):
+        if value is None:
+            raise ValueError('Value must not be None.')
+        self._db._round_trip('set')
+        self._db._apply([(self._parts, value)])
+
+    def update(self, value):
+        if not value or not isinstance(value, dict):
+            raise ValueError('Value argument must be a non-empty dictionary.')
+        if None in value.keys():
+            raise ValueError('Dictionary must not contain None keys.')
+        changes = [(self._parts + _split(key), child) for key, child in value.items()]
+        paths = {tuple(parts) for parts, _ in changes}
+        for parts in paths:
+            for depth in range(1, len(parts)):
+                if parts[:depth] in paths:
+                    raise ValueError(f"Invalid multi-path update: '{_join(parts[:depth])}' overlaps '{_join(parts)}'")
+        self._db._round_trip('update')
+        self._db._apply(changes)
+
+    def push(self, value=''):
+        if value is None:
+            raise ValueError('Value must not be None.')
+        ref = self.child(generate_push_id())
+        self._db._round_trip('push')
+        self._db._apply([(ref._parts, value)])
+        return ref
+
+    def delete(self):
+        self._db._round_trip('delete')
+        self._db._apply([(self._parts, None)])
+
+    def transaction(self, transaction_update):
+        if not callable(transaction_update):
+            raise ValueError('transaction_update must be a function.')
+        return self._db._transaction(self._parts, transaction_update)
+
+    def listen(self, callback):
+        return self._db._add_listener(self._parts, callback)
+
+    def order_by_child(self, path):
+        if not path or not isinstance(path, str):
+            raise ValueError(f'Illegal child path: {path}')
+        return Query(self, 'child', _split(path))
+
+    def order_by_key(self):
+        return Query(self, 'key')
+
+    def order_by_value(self):
+        return Query(self, 'value')
+
+class Query:
+    """Emulated firebase_admin.db.Query."""
+    def __init__(self, reference, order_by, child_parts=None):
+        self._ref = reference
+        self._order_by = order_by
+        self._child_parts = child_parts or []
+        self._start = None
+        self._end = None
+        self._limit_first = None
+        self._limit_last = None
+
+    def start_at(self, start):
+        if start is None:
+            raise ValueError('Start value must not be None.')
+        self._start = start
+        return self
+
+    def end_at(self, end):
+        if end is None:
+            raise ValueError('End value must not be None.')
+        self._end = end
+        return self
+
+    def equal_to(self, value):
+        if value is None:
+            raise ValueError('Equal to value must not be None.')
+        self._start = self._end = value
+        return self
+
+    def limit_to_first(self, limit):
+        if self._limit_last is not None:
+            raise ValueError('Cannot set both first and last limits.')
+        self._limit_first = limit
+        return self
+
+    def limit_to_last(self, limit):
+        if self._limit_first is not None:
+            raise ValueError('Cannot set both first and last limits.')
+        self._limit_last = limit
+        return self
+
+    def get(self):
+        database = self._ref._db
+        database._round_trip('query')
+        with database._lock:
+            node = database._read(self._ref._parts)
+            children = copy.deepcopy(node) if isinstance(node, dict) else {}
+
+        ordered = sorted(children.items(), key=self._sort_key)
+        if self._start is not None:
+            start = self._rank(self._start)
+            ordered = [item for item in ordered if self._sort_key(item)[:2] >= start]
+        if self._end is not None:
+            end = self._rank(self._end)
+            ordered = [item for item in ordered if self._sort_key(item)[:2] <= end]
+        if self._limit_first is not None:
+            ordered = ordered[:self._limit_first]
+        elif self._limit_last is not None:
+            ordered = ordered[-self._limit_last:] if self._limit_last else []
+        return collections.OrderedDict(ordered)
+
+    def _ordered_value(self, key, value):
+        if self._order_by == 'key':
+            return key
+        if self._order_by == 'value':
+            return value
+        for part in self._child_parts:
+            value = value.get(part) if isinstance(value, dict) else None
+        return value
+
+    def _rank(self, value):
+        if self._order_by == 'key':
+            return (0, str(value))
+        return _sort_rank(value)
+
+    def _sort_key(self, item):
+        key, value = item
+        return self._rank(self._ordered_value(key, value)) + (key,)
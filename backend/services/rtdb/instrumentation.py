@@ -0,0 +1,278 @@
+from flask import g, has_request_context, request
+import json
+import re
+import threading
+import time
+
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Path segments treated as ids: push ids, anything containing a digit (uids,
+# order numbers, "<order>_<uid>" keys) and long opaque tokens
+_ID_SEGMENT = re.compile(r'^-|\d|^[A-Za-z0-9_-]{20,}$')
+
+def path_pattern(path):
+    """users/Xy7.../wallet -> users/{id}/wallet"""
+    parts = [part for part in (path or '').split('/') if part]
+    return '/' + '/'.join('{id}' if _ID_SEGMENT.search(part) else part for part in parts)
+
+def payload_size(value):
+    if value is None:
+        return 0
+    try:
+        return len(json.dumps(value, separators=(',', ':'), default=str))
+    except (TypeError, ValueError):
+        return 0
+
+def current_endpoint():
+    if has_request_context():
+        return request.endpoint or request.path
+    return 'background'
+
+class _Series:
+    __slots__ = ('count', 'errors', 'total_ms', 'max_ms', 'buckets', 'bytes', 'max_bytes', 'retries')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.bytes = 0
+        self.max_bytes = 0
+        self.retries = 0
+
+    def add(self, elapsed_ms, size, retries, failed):
+        self.count += 1
+        self.errors += 1 if failed else 0
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+        self.bytes += size
+        self.max_bytes = max(self.max_bytes, size)
+        self.retries += retries
+
+    def quantile(self, q):
+        """Upper bound of the histogram bucket holding the q-quantile."""
+        target = q * self.count
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= target:
+                return LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else round(self.max_ms, 2)
+        return 0
+
+    def to_dict(self):
+        labels = [f'<={bound}' for bound in LATENCY_BUCKETS_MS] + [f'>{LATENCY_BUCKETS_MS[-1]}']
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'latencyMs': {
+                'total': round(self.total_ms, 2),
+                'avg': round(self.total_ms / self.count, 2) if self.count else 0.0,
+                'p50': self.quantile(0.5),
+                'p95': self.quantile(0.95),
+                'max': round(self.max_ms, 2),
+                'histogram': {label: count for label, count in zip(labels, self.buckets) if count}
+            },
+            'bytes': {
+                'total': self.bytes,
+                'avg': round(self.bytes / self.count) if self.count else 0,
+                'max': self.max_bytes
+            },
+            'transactionRetries': self.retries
+        }
+
+class RTDBMetrics:
+    """
+    Aggregates every RTDB call made through services.rtdb.database, keyed by
+    (Flask endpoint, operation, path pattern): call count, latency histogram,
+    payload bytes and transaction retries. Calls outside a request are
+    tagged 'background'.
+
+    Distinct series are capped at `max_series`; further ones are folded into
+    a '<other>' pattern so id-heavy paths cannot grow memory without bound.
+
+    Payload bytes are only measured with `count_bytes`: sizing a value means
+    serializing it again on the calling thread, which costs about as much
+    as the call itself for large subtrees. Otherwise they are reported as 0.
+    """
+    def __init__(self, max_series=5000, count_bytes=False):
+        self.max_series = max_series
+        self.count_bytes = count_bytes
+        self._series = {}
+        self._requests = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def size(self, value):
+        return payload_size(value) if self.count_bytes else 0
+
+    def record(self, operation, path, elapsed_ms, size=0, retries=0, failed=False):
+        endpoint = current_endpoint()
+        pattern = path_pattern(path)
+        key = (endpoint, operation, pattern)
+        first_in_request = False
+        if has_request_context():
+            if not g.get('rtdb_metrics_counted'):
+                g.rtdb_metrics_counted = first_in_request = True
+            # Set by the request profiler while it profiles this request
+            call_log = g.get('rtdb_call_log')
+            if call_log is not None:
+                call_log.append((operation, pattern, elapsed_ms, size))
+        with self._lock:
+            if first_in_request:
+                self._requests[endpoint] = self._requests.get(endpoint, 0) + 1
+            series = self._series.get(key)
+            if series is None:
+                if len(self._series) >= self.max_series:
+                    key = (endpoint, operation, '<other>')
+                    series = self._series.get(key)
+                if series is None:
+                    series = self._series[key] = _Series()
+            series.add(elapsed_ms, size, retries, failed)
+
+    def reset(self):
+        with self._lock:
+            self._series = {}
+            self._requests = {}
+            self.started_at = time.time()
+
+    def snapshot(self):
+        """Per-endpoint totals (incl. round-trips per request) with their slowest series first."""
+        with self._lock:
+            series = {key: value.to_dict() for key, value in self._series.items()}
+            requests = dict(self._requests)
+
+        endpoints = {}
+        for (endpoint, operation, pattern), stats in series.items():
+            entry = endpoints.setdefault(endpoint, {'calls': 0, 'totalMs': 0.0, 'bytes': 0,
+                                                    'transactionRetries': 0, 'operations': []})
+            entry['calls'] += stats['count']
+            entry['totalMs'] += stats['latencyMs']['total']
+            entry['bytes'] += stats['bytes']['total']
+            entry['transactionRetries'] += stats['transactionRetries']
+            entry['operations'].append(dict(stats, operation=operation, path=pattern))
+
+        for endpoint, entry in endpoints.items():
+            count = requests.get(endpoint, 0)
+            entry['requests'] = count
+            entry['callsPerRequest'] = round(entry['calls'] / count, 2) if count else None
+            entry['totalMs'] = round(entry['totalMs'], 2)
+            entry['operations'].sort(key=lambda op: op['latencyMs']['total'], reverse=True)
+
+        ranked = sorted(endpoints.items(), key=lambda item: item[1]['totalMs'], reverse=True)
+        return {'since': int(self.started_at * 1000), 'bytesCounted': self.count_bytes,
+                'endpoints': dict(ranked)}
+
+class InstrumentedReference:
+    """Wraps a db.Reference (or emulator Reference) and reports each call to an RTDBMetrics."""
+    def __init__(self, reference, metrics):
+        self._ref = reference
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        return getattr(self._ref, name)
+
+    @property
+    def path(self):
+        return self._ref.path
+
+    def _timed(self, operation, call, size_of=None, sent=None):
+        started = time.perf_counter()
+        try:
+            result = call()
+        except Exception:
+            self._metrics.record(operation, self.path, (time.perf_counter() - started) * 1000,
+                                 self._metrics.size(sent), failed=True)
+            raise
+        if not self._metrics.count_bytes:
+            size = 0
+        elif sent is not None:
+            size = payload_size(sent)
+        else:
+            size = payload_size(size_of(result) if size_of else None)
+        self._metrics.record(operation, self.path, (time.perf_counter() - started) * 1000, size)
+        return result
+
+    def get(self, *args, **kwargs):
+        return self._timed('get', lambda: self._ref.get(*args, **kwargs),
+                           size_of=lambda result: result[0] if kwargs.get('etag') else result)
+
+    def set(self, value):
+        return self._timed('set', lambda: self._ref.set(value), sent=value)
+
+    def update(self, value):
+        return self._timed('update', lambda: self._ref.update(value), sent=value)
+
+    def push(self, value=''):
+        child = self._timed('push', lambda: self._ref.push(value), sent=value)
+        return InstrumentedReference(child, self._metrics)
+
+    def delete(self):
+        return self._timed('delete', self._ref.delete)
+
+    def transaction(self, transaction_update):
+        attempts = [0]
+
+        def counted(current):
+            attempts[0] += 1
+            return transaction_update(current)
+
+        started = time.perf_counter()
+        try:
+            result = self._ref.transaction(counted)
+        except Exception:
+            self._metrics.record('transaction', self.path, (time.perf_counter() - started) * 1000,
+                                 retries=max(attempts[0] - 1, 0), failed=True)
+            raise
+        self._metrics.record('transaction', self.path, (time.perf_counter() - started) * 1000,
+                             self._metrics.size(result), retries=max(attempts[0] - 1, 0))
+        return result
+
+    def child(self, path):
+        return InstrumentedReference(self._ref.child(path), self._metrics)
+
+    def order_by_child(self, path):
+        return InstrumentedQuery(self._ref.order_by_child(path), self.path, self._metrics)
+
+    def order_by_key(self):
+        return InstrumentedQuery(self._ref.order_by_key(), self.path, self._metrics)
+
+    def order_by_value(self):
+        return InstrumentedQuery(self._ref.order_by_value(), self.path, self._metrics)
+
+class InstrumentedQuery:
+    def __init__(self, query, path, metrics):
+        self._query = query
+        self._path = path
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        attr = getattr(self._query, name)
+        if not callable(attr):
+            return attr
+
+        def chained(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if result is self._query:
+                return self
+            # Builders that return a new query (rather than mutating this one) stay instrumented
+            if isinstance(result, type(self._query)):
+                return InstrumentedQuery(result, self._path, self._metrics)
+            return result
+        return chained
+
+    def get(self):
+        started = time.perf_counter()
+        try:
+            result = self._query.get()
+        except Exception:
+            self._metrics.record('query', self._path, (time.perf_counter() - started) * 1000, failed=True)
+            raise
+        self._metrics.record('query', self._path, (time.perf_counter() - started) * 1000, self._metrics.size(result))
+        return result
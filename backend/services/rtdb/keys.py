@@ -0,0 +1,11 @@
+import re
+
+MAX_KEY_BYTES = 768
+
+# Characters RTDB rejects in keys, '/' (which would address a deeper path) and control characters
+_INVALID_KEY = re.compile(r'[.#$\[\]/\x00-\x1f\x7f]')
+
+def is_valid_key(key):
+    """True for a non-empty string usable as exactly one RTDB path segment."""
+    return (isinstance(key, str) and bool(key) and len(key.encode('utf-8')) <= MAX_KEY_BYTES
+            and not _INVALID_KEY.search(key))
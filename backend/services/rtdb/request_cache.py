@@ -0,0 +1,129 @@
+from services.rtdb import database as db
+from concurrent.futures import Future, ThreadPoolExecutor
+from flask import g, has_request_context
+import contextvars
+import threading
+
+DEFAULT_PREFETCH_WORKERS = 8
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def configure(workers=DEFAULT_PREFETCH_WORKERS):
+    """Sizes the shared pool that runs prefetched reads (call once at startup)."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='rtdb-prefetch')
+
+def _get_executor():
+    if _executor is None:
+        configure()
+    return _executor
+
+def _read(path):
+    return db.reference(path).get()
+
+def _normalize(path):
+    return path.strip('/')
+
+class RequestReadCache:
+    """
+    Identity map of RTDB reads for the lifetime of one request.
+
+    Each path is fetched at most once; a read of a path whose ancestor was
+    already fetched (e.g. users/<uid>/email after users/<uid>) is answered
+    from the ancestor's value. prefetch() starts independent reads on a
+    shared thread pool and returns immediately, so they overlap with each
+    other and with whatever the handler does next; get() waits for them.
+
+    Values are the state at first read. Handlers that write a path and then
+    need to read it back must call invalidate() first.
+    """
+    def __init__(self):
+        self._futures = {}
+        self._lock = threading.Lock()
+        self.fetches = 0
+        self.hits = 0
+
+    def get(self, path):
+        path = _normalize(path)
+        with self._lock:
+            future, remainder = self._find(path)
+            if future is None:
+                # Plain misses are read on the calling thread; the Future lets
+                # a concurrent get() of the same path wait instead of refetching
+                future = self._futures[path] = Future()
+                self.fetches += 1
+                owner = True
+            else:
+                self.hits += 1
+                owner = False
+
+        if owner:
+            try:
+                future.set_result(_read(path))
+            except Exception as e:
+                future.set_exception(e)
+
+        value = future.result()
+        for key in remainder or []:
+            value = value.get(key) if isinstance(value, dict) else None
+        return value
+
+    def get_many(self, *paths):
+        """Fetches all missing paths concurrently and returns their values in order."""
+        self.prefetch(*paths)
+        return [self.get(path) for path in paths]
+
+    def prefetch(self, *paths):
+        """Starts background reads for paths not already fetched or covered by a fetched ancestor."""
+        with self._lock:
+            for path in paths:
+                if not path:
+                    continue
+                path = _normalize(path)
+                if self._find(path)[0] is None:
+                    self._submit(path)
+
+    def invalidate(self, path):
+        """Forgets `path`, its descendants and its ancestors (whose values contain it)."""
+        path = _normalize(path)
+        with self._lock:
+            for cached in list(self._futures):
+                if cached == path or cached.startswith(path + '/') or path.startswith(cached + '/'):
+                    del self._futures[cached]
+
+    def _find(self, path):
+        """Returns (future, remaining keys) for the path or its nearest fetched ancestor."""
+        if path in self._futures:
+            return self._futures[path], []
+        parts = path.split('/')
+        for depth in range(len(parts) - 1, 0, -1):
+            ancestor = '/'.join(parts[:depth])
+            if ancestor in self._futures:
+                return self._futures[ancestor], parts[depth:]
+        return None, None
+
+    def _submit(self, path):
+        self.fetches += 1
+        # Run in a copy of the caller's context so the read is still attributed to its request
+        try:
+            self._futures[path] = _get_executor().submit(contextvars.copy_context().run, _read, path)
+        except RuntimeError:
+            # The pool refuses new work once the interpreter is shutting down;
+            # reads made from atexit hooks then run inline instead
+            future = self._futures[path] = Future()
+            try:
+                future.set_result(_read(path))
+            except Exception as e:
+                future.set_exception(e)
+
+def request_reads():
+    """The read cache of the current request; a fresh, unshared one outside a request."""
+    if not has_request_context():
+        return RequestReadCache()
+    if 'rtdb_reads' not in g:
+        g.rtdb_reads = RequestReadCache()
+    return g.rtdb_reads
@@ -0,0 +1,47 @@
+from services.rtdb import database as db
+
+DEFAULT_PAGE_SIZE = 500
+
+def iter_node(path, page_size=DEFAULT_PAGE_SIZE, start_after=None):
+    """
+    Yields (key, value) for every child of `path` in key order, fetching
+    `page_size` children per round-trip with order_by_key().start_at().limit_to_first().
+    Only one page is held in memory at a time, however large the node grows.
+    """
+    cursor = start_after
+    while True:
+        query = db.reference(path).order_by_key()
+        if cursor is None:
+            page = query.limit_to_first(page_size).get() or {}
+        else:
+            # start_at is inclusive, so fetch one extra child and drop the cursor itself
+            page = query.start_at(cursor).limit_to_first(page_size + 1).get() or {}
+
+        items = [(key, value) for key, value in page.items() if key != cursor]
+        for key, value in items:
+            yield key, value
+
+        if len(items) < page_size:
+            return
+        cursor = items[-1][0]
+
+def iter_values(path, page_size=DEFAULT_PAGE_SIZE):
+    """Like iter_node but yields only the child values."""
+    for _, value in iter_node(path, page_size):
+        yield value
+
+def list_keys(path):
+    """Lists the direct child keys of `path` without downloading their contents."""
+    return list((db.reference(path).get(shallow=True) or {}).keys())
+
+def iter_chunked(path, keys, field=None):
+    """
+    Yields (key, value) for the given child keys, one child read at a time.
+    Pairs with list_keys(); pass `field` to read only `<path>/<key>/<field>`
+    instead of the whole child.
+    """
+    for key in keys:
+        child_path = f'{path}/{key}/{field}' if field else f'{path}/{key}'
+        value = db.reference(child_path).get()
+        if value is not None:
+            yield key, value
@@ -0,0 +1,114 @@
+from services.rtdb import database as db
+import random
+import threading
+import time
+
+PUSH_CHARS = '-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz'
+
+_push_lock = threading.Lock()
+_last_push_ms = 0
+_last_rand = [0] * 12
+
+def generate_push_id():
+    """
+    Client-side Firebase push id: 8 characters of millisecond timestamp then
+    12 random characters, incremented instead of re-rolled within the same
+    millisecond so ids generated here still sort in creation order.
+    """
+    global _last_push_ms
+    with _push_lock:
+        now = int(time.time() * 1000)
+        if now == _last_push_ms:
+            i = 11
+            while i >= 0 and _last_rand[i] == 63:
+                _last_rand[i] = 0
+                i -= 1
+            if i >= 0:
+                _last_rand[i] += 1
+        else:
+            _last_push_ms = now
+            for i in range(12):
+                _last_rand[i] = random.randrange(64)
+        rand = list(_last_rand)
+
+    stamp = []
+    for _ in range(8):
+        stamp.append(PUSH_CHARS[now % 64])
+        now //= 64
+    return ''.join(reversed(stamp)) + ''.join(PUSH_CHARS[r] for r in rand)
+
+class WriteBatch:
+    """
+    Collects RTDB writes and commits them as one multi-path
+    `db.reference().update()`: a single round-trip that is applied
+    atomically (all paths or none).
+
+    push() generates the child key locally and returns it, so records that
+    reference each other (a request and its audit entry) can be built in
+    the same batch. Callbacks registered with after_commit() run only once
+    the write has succeeded, for side effects such as e-mail dispatch.
+
+    Transactions cannot join a batch; run them first and batch the writes
+    that follow.
+    """
+    def __init__(self):
+        self._updates = {}
+        self._after_commit = []
+
+    def __len__(self):
+        return len(self._updates)
+
+    @property
+    def updates(self):
+        return dict(self._updates)
+
+    def set(self, path, value):
+        """Replaces the value at `path`."""
+        self._updates[_normalize(path)] = value
+        return self
+
+    def update(self, path, values):
+        """Sets each child of `path` in `values`, leaving other children alone (like Reference.update)."""
+        path = _normalize(path)
+        for key, value in values.items():
+            self._updates[f'{path}/{key}'] = value
+        return self
+
+    def push(self, path, value):
+        """Adds `value` under a new push id below `path` and returns the id."""
+        key = generate_push_id()
+        self._updates[f'{_normalize(path)}/{key}'] = value
+        return key
+
+    def delete(self, path):
+        self._updates[_normalize(path)] = None
+        return self
+
+    def after_commit(self, callback):
+        self._after_commit.append(callback)
+        return self
+
+    def commit(self):
+        """Writes everything in one update; raises ValueError if two paths overlap."""
+        if self._updates:
+            _check_overlaps(self._updates)
+            db.reference().update(self._updates)
+        self._updates = {}
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Post-commit callback failed: {e}")
+
+def _normalize(path):
+    return path.strip('/')
+
+def _check_overlaps(updates):
+    # RTDB rejects a multi-path update where one path is an ancestor of another
+    for path in updates:
+        parts = path.split('/')
+        for depth in range(1, len(parts)):
+            ancestor = '/'.join(parts[:depth])
+            if ancestor in updates:
+                raise ValueError(f"Overlapping paths in write batch: '{ancestor}' and '{path}'")
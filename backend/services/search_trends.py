@@ -0,0 +1,194 @@
+from services.rtdb import database as db
+import atexit
+import heapq
+import re
+import threading
+import time
+
+class SpaceSaving:
+    """
+    Space-Saving heavy-hitter summary (Metwally et al.).
+    Tracks at most `capacity` terms; each count over-estimates the true
+    frequency by at most its recorded error, and any term whose true count
+    exceeds total/capacity is guaranteed to be present.
+    """
+    def __init__(self, capacity=200):
+        self.capacity = capacity
+        self.counts = {}   # term -> count
+        self.errors = {}   # term -> max over-estimation
+        self.total = 0
+        self._heap = []    # lazy min-heap of (count, term); stale entries skipped on pop
+
+    def __len__(self):
+        return len(self.counts)
+
+    def add(self, term, weight=1):
+        self.total += weight
+        if term in self.counts:
+            self.counts[term] += weight
+        elif len(self.counts) < self.capacity:
+            self.counts[term] = weight
+            self.errors[term] = 0
+        else:
+            # Replace the current minimum; the newcomer inherits its count as error
+            min_count, min_term = self._pop_min()
+            del self.counts[min_term]
+            del self.errors[min_term]
+            self.counts[term] = min_count + weight
+            self.errors[term] = min_count
+        heapq.heappush(self._heap, (self.counts[term], term))
+        if len(self._heap) > 4 * self.capacity:
+            self._rebuild_heap()
+
+    def min_count(self):
+        """Smallest tracked count, or 0 while the summary still has free slots."""
+        if len(self.counts) < self.capacity:
+            return 0
+        count, term = self._pop_min()
+        heapq.heappush(self._heap, (count, term))
+        return count
+
+    def top(self, k):
+        """Returns [(term, count, error)] for the k most frequent terms."""
+        best = heapq.nlargest(k, self.counts.items(), key=lambda item: item[1])
+        return [(term, count, self.errors.get(term, 0)) for term, count in best]
+
+    def merge(self, other):
+        """
+        Merges another summary into this one (mergeable-summaries rule): a term
+        missing from a full summary is credited with that summary's minimum.
+        """
+        self_min = self.min_count()
+        other_min = other.min_count()
+        counts = {}
+        errors = {}
+        for term in set(self.counts) | set(other.counts):
+            c1 = self.counts.get(term, self_min)
+            e1 = self.errors.get(term, self_min)
+            c2 = other.counts.get(term, other_min)
+            e2 = other.errors.get(term, other_min)
+            counts[term] = c1 + c2
+            errors[term] = e1 + e2
+
+        kept = heapq.nlargest(self.capacity, counts.items(), key=lambda item: item[1])
+        self.counts = dict(kept)
+        self.errors = {term: errors[term] for term in self.counts}
+        self.total += other.total
+        self._rebuild_heap()
+
+    def to_dict(self):
+        return {
+            'total': self.total,
+            'terms': {term: {'c': count, 'e': self.errors.get(term, 0)} for term, count in self.counts.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data, capacity=200):
+        summary = cls(capacity)
+        data = data or {}
+        terms = data.get('terms') or {}
+        for term, entry in terms.items():
+            if not isinstance(entry, dict): continue
+            summary.counts[term] = int(entry.get('c', 0))
+            summary.errors[term] = int(entry.get('e', 0))
+        summary.total = int(data.get('total', 0))
+        if len(summary.counts) > capacity:
+            kept = heapq.nlargest(capacity, summary.counts.items(), key=lambda item: item[1])
+            summary.counts = dict(kept)
+            summary.errors = {term: summary.errors[term] for term in summary.counts}
+        summary._rebuild_heap()
+        return summary
+
+    def _pop_min(self):
+        while self._heap:
+            count, term = heapq.heappop(self._heap)
+            if self.counts.get(term) == count:
+                return count, term
+        raise LookupError("Space-Saving summary is empty")
+
+    def _rebuild_heap(self):
+        self._heap = [(count, term) for term, count in self.counts.items()]
+        heapq.heapify(self._heap)
+
+
+class SearchTrendTracker:
+    """
+    Aggregates global search-term counts in process and periodically merges
+    them into a compact, bounded summary at `global_trends/search_summary`.
+    Memory and read cost depend only on `capacity`, never on how many
+    distinct queries users type.
+    """
+    SUMMARY_PATH = 'global_trends/search_summary'
+
+    def __init__(self, capacity=200, local_capacity=1000, flush_interval=30):
+        self.capacity = capacity
+        self.local_capacity = local_capacity
+        self.flush_interval = flush_interval
+        self._pending = SpaceSaving(local_capacity)
+        self._lock = threading.Lock()
+        self._flusher = None
+        self._stop = threading.Event()
+
+    @staticmethod
+    def sanitize(term):
+        """Escapes characters Firebase does not allow in keys."""
+        return re.sub(r'[\.#\$\/\[\]]', '_', term)
+
+    def record(self, query):
+        if not query: return
+        with self._lock:
+            self._pending.add(self.sanitize(query))
+        self._ensure_flusher()
+
+    def flush(self):
+        """Merges the pending in-process counts into the persisted summary with one transaction."""
+        with self._lock:
+            if not self._pending.total:
+                return False
+            delta = self._pending
+            self._pending = SpaceSaving(self.local_capacity)
+
+        def merge_txn(current):
+            summary = SpaceSaving.from_dict(current, self.capacity)
+            summary.merge(delta)
+            data = summary.to_dict()
+            data['updatedAt'] = int(time.time() * 1000)
+            return data
+
+        try:
+            db.reference(self.SUMMARY_PATH).transaction(merge_txn)
+            return True
+        except Exception as e:
+            print(f"Failed to flush search trends: {e}")
+            # Put the counts back so they are retried on the next flush
+            with self._lock:
+                delta.merge(self._pending)
+                self._pending = delta
+            return False
+
+    def top_terms(self, k=15):
+        """Top-k terms from the persisted summary plus counts not yet flushed."""
+        summary = SpaceSaving.from_dict(db.reference(self.SUMMARY_PATH).get(), self.capacity)
+        with self._lock:
+            pending = SpaceSaving(self.local_capacity)
+            pending.merge(self._pending)
+        summary.merge(pending)
+        return [{"keyword": term.replace('_', ' '), "count": count} for term, count, _ in summary.top(k)]
+
+    def stop(self):
+        self._stop.set()
+        self.flush()
+
+    def _ensure_flusher(self):
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._run, name='search-trends-flush', daemon=True)
+            self._flusher.start()
+            atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
@@ -0,0 +1,86 @@
+from firebase_admin import auth
+import collections
+import hashlib
+import threading
+import time
+
+class VerifiedTokenCache:
+    """
+    Bounded cache of verified Firebase ID-token claims.
+
+    Clients resend the same ID token on every request for up to an hour, and
+    each auth.verify_id_token call repeats the RSA signature check (and may
+    refetch Google's certificates). Entries are keyed by the SHA-256 of the
+    token, so raw tokens are never held, and are served until the token's
+    `exp`. Tokens that fail verification are never cached.
+
+    Revocation: with check_revoked=False (the SDK default used so far) a
+    cached token stays valid until it expires, exactly as an uncached one
+    would. With check_revoked=True, misses verify with revocation checking
+    and hits are re-checked once `revocation_recheck` seconds have passed
+    since their last check (0 re-checks on every request). Tokens of users
+    deleted or revoked by this server can be dropped with revoke_uid().
+    """
+    def __init__(self, max_entries=10000, check_revoked=False, revocation_recheck=300, verifier=None):
+        self.max_entries = max_entries
+        self.check_revoked = check_revoked
+        self.revocation_recheck = revocation_recheck
+        self._verifier = verifier or auth.verify_id_token
+        self._entries = collections.OrderedDict()  # sha256(token) -> (claims, checked_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rechecks = 0
+
+    def verify(self, token):
+        """Returns the decoded claims, raising like auth.verify_id_token for invalid tokens."""
+        if not token:
+            raise ValueError('ID token must be a non-empty string.')
+        key = hashlib.sha256(token.encode('utf-8')).digest()
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                claims, checked_at = entry
+                if claims.get('exp', 0) <= now:
+                    del self._entries[key]
+                elif self.check_revoked and now - checked_at >= self.revocation_recheck:
+                    self.rechecks += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return claims
+            self.misses += 1
+
+        if self.check_revoked:
+            claims = self._verifier(token, check_revoked=True)
+        else:
+            claims = self._verifier(token)
+
+        with self._lock:
+            self._entries[key] = (claims, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return claims
+
+    def revoke_uid(self, uid):
+        """Forgets every cached token belonging to `uid`."""
+        with self._lock:
+            stale = [key for key, (claims, _) in self._entries.items() if claims.get('uid') == uid]
+            for key in stale:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxEntries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'revocationRechecks': self.rechecks,
+                'checkRevoked': self.check_revoked
+            }
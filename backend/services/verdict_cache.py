@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+class ImageVerdictCache:
+    """
+    Persistent cache of Vision verdicts keyed by the SHA-256 of the image bytes.
+
+    Backed by a local SQLite file (WAL mode, so every gunicorn worker can share
+    it) with a TTL and a size bound; the least recently used entries are
+    evicted first. Hit/miss counters are kept per process for the metrics API.
+    """
+    def __init__(self, path, ttl=7 * 24 * 3600, max_entries=50000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._init_db()
+
+    @staticmethod
+    def key_for(image_content):
+        return hashlib.sha256(image_content).hexdigest()
+
+    def _init_db(self):
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS verdicts ('
+                ' image_hash TEXT PRIMARY KEY,'
+                ' verdict TEXT NOT NULL,'
+                ' created_at REAL NOT NULL,'
+                ' last_used REAL NOT NULL)'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_verdicts_last_used ON verdicts(last_used)')
+            self._conn.commit()
+        except Exception as e:
+            print(f"Verdict cache disabled, could not open {self.path}: {e}")
+            self._conn = None
+
+    def get(self, image_hash):
+        """Returns the cached verdict dict, or None on a miss or expired entry."""
+        if not self._conn:
+            return None
+        now = time.time()
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    'SELECT verdict, created_at FROM verdicts WHERE image_hash = ?', (image_hash,)
+                ).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                if now - row[1] > self.ttl:
+                    self._conn.execute('DELETE FROM verdicts WHERE image_hash = ?', (image_hash,))
+                    self._conn.commit()
+                    self.expired += 1
+                    self.misses += 1
+                    return None
+                self._conn.execute('UPDATE verdicts SET last_used = ? WHERE image_hash = ?', (now, image_hash))
+                self._conn.commit()
+                self.hits += 1
+            return json.loads(row[0])
+        except Exception as e:
+            print(f"Verdict cache read failed: {e}")
+            return None
+
+    def put(self, image_hash, verdict):
+        if not self._conn:
+            return
+        now = time.time()
+        try:
+            with self._lock:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO verdicts (image_hash, verdict, created_at, last_used) VALUES (?, ?, ?, ?)',
+                    (image_hash, json.dumps(verdict), now, now)
+                )
+                overflow = self._conn.execute('SELECT COUNT(*) FROM verdicts').fetchone()[0] - self.max_entries
+                if overflow > 0:
+                    self._conn.execute(
+                        'DELETE FROM verdicts WHERE image_hash IN '
+                        '(SELECT image_hash FROM verdicts ORDER BY last_used ASC LIMIT ?)', (overflow,)
+                    )
+                    self.evictions += overflow
+                self._conn.commit()
+        except Exception as e:
+            print(f"Verdict cache write failed: {e}")
+
+    def stats(self):
+        size = 0
+        if self._conn:
+            try:
+                with self._lock:
+                    size = self._conn.execute('SELECT COUNT(*) FROM verdicts').fetchone()[0]
+            except Exception:
+                pass
+        lookups = self.hits + self.misses
+        return {
+            'enabled': self._conn is not None,
+            'size': size,
+            'maxEntries': self.max_entries,
+            'ttlSeconds': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'evictions': self.evictions,
+            'hitRate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
@@ -0,0 +1,219 @@
+from services.rtdb import database as db
+import collections
+import queue
+import threading
+import time
+import uuid
+from services.metrics import latency_summary
+
+class QueueFullError(Exception):
+    """Raised when the verification queue is at capacity (backpressure)."""
+    pass
+
+class QueueOverBudgetError(QueueFullError):
+    """Raised when queued image bytes would exceed the queue's memory budget."""
+    pass
+
+class VerificationJobQueue:
+    """
+    Runs AIService.verify_image off the request path.
+
+    Jobs go into a bounded queue served by a fixed pool of worker threads, so a
+    burst of listing uploads cannot tie up gunicorn workers needed by the
+    wallet and bidding endpoints. When the queue is full, submit() raises
+    QueueFullError and the caller should answer 429. Queued jobs hold the
+    uploaded bytes until they finish, so their total is also capped at
+    `max_queue_bytes`; past that, submit() raises QueueOverBudgetError
+    (answer 503).
+
+    Finished verdicts are kept in memory for `result_ttl` seconds and also
+    written to `verification_jobs/<jobId>` (and under the listing when one is
+    given), so a status poll that lands on another worker still finds them.
+    The workers delete `verification_jobs` records older than `result_ttl`,
+    whichever worker wrote them, at most once every `sweep_interval` seconds.
+    The copy under the listing is kept.
+    """
+    JOBS_PATH = 'verification_jobs'
+
+    def __init__(self, ai_service, workers=4, max_queue=100, max_queue_bytes=100 * 1024 * 1024,
+                 result_ttl=600, sweep_interval=60):
+        self.ai_service = ai_service
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_queue_bytes = max_queue_bytes
+        self._queued_bytes = 0
+        self.result_ttl = result_ttl
+        self.sweep_interval = sweep_interval
+        self._last_sweep = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.purged = 0
+        self._wait_ms = collections.deque(maxlen=1000)
+        self._run_ms = collections.deque(maxlen=1000)
+
+    def submit(self, image_content, listing_id=None, uploader_id=None):
+        """Enqueues a verification and returns its job id."""
+        self._ensure_workers()
+        job_id = uuid.uuid4().hex
+        job = {
+            'jobId': job_id,
+            'status': 'queued',
+            'listingId': listing_id,
+            'submittedAt': time.time()
+        }
+        size = len(image_content)
+        with self._lock:
+            self._prune()
+            if self._queued_bytes + size > self.max_queue_bytes:
+                self.rejected += 1
+                raise QueueOverBudgetError(
+                    f"Verification queue is over its memory budget ({self._queued_bytes} of {self.max_queue_bytes} bytes pending)")
+            self._queued_bytes += size
+            self._jobs[job_id] = job
+        try:
+            self._queue.put_nowait((job_id, image_content, uploader_id))
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job_id, None)
+                self._queued_bytes -= size
+                self.rejected += 1
+            raise QueueFullError(f"Verification queue is full ({self.max_queue} pending)")
+        with self._lock:
+            self.submitted += 1
+        return job_id
+
+    def get(self, job_id):
+        """Returns the job record, checking the shared RTDB copy if this worker does not have it."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                return self._public(job)
+        try:
+            stored = db.reference(f'{self.JOBS_PATH}/{job_id}').get()
+        except Exception as e:
+            print(f"Failed to read verification job {job_id}: {e}")
+            return None
+        return stored
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._wait_ms)
+            runs = sorted(self._run_ms)
+            return {
+                'queueDepth': self._queue.qsize(),
+                'maxQueue': self.max_queue,
+                'queuedBytes': self._queued_bytes,
+                'maxQueueBytes': self.max_queue_bytes,
+                'running': self._running,
+                'workers': self.workers,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'purged': self.purged,
+                'waitMs': latency_summary(waits),
+                'runMs': latency_summary(runs)
+            }
+
+    def _ensure_workers(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._work, name=f'verify-worker-{i}', daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def _work(self):
+        while True:
+            job_id, image_content, uploader_id = self._queue.get()
+            started = time.time()
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    self._queued_bytes -= len(image_content)
+                    self._queue.task_done()
+                    continue
+                job['status'] = 'running'
+                job['startedAt'] = started
+                self._running += 1
+                self._wait_ms.append((started - job['submittedAt']) * 1000)
+
+            try:
+                verdict = self.ai_service.verify_image(image_content, listing_id=job.get('listingId'), uploader_id=uploader_id)
+                status = 'done'
+            except Exception as e:
+                print(f"Verification job {job_id} failed: {e}")
+                verdict = {"isSafe": False, "reasons": [f"Verification failed: {str(e)}"]}
+                status = 'failed'
+
+            finished = time.time()
+            with self._lock:
+                job['status'] = status
+                job['result'] = verdict
+                job['finishedAt'] = finished
+                self._running -= 1
+                self._queued_bytes -= len(image_content)
+                self._run_ms.append((finished - started) * 1000)
+                if status == 'done':
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                record = self._public(job)
+
+            self._publish(record)
+            self._maybe_purge()
+            self._queue.task_done()
+
+    def purge_expired(self, limit=500):
+        """Deletes up to `limit` RTDB job records finished more than `result_ttl` ago. Returns the count."""
+        cutoff = int((time.time() - self.result_ttl) * 1000)
+        expired = db.reference(self.JOBS_PATH).order_by_child('finishedAt').end_at(cutoff).limit_to_first(limit).get() or {}
+        if expired:
+            db.reference(self.JOBS_PATH).update({job_id: None for job_id in expired})
+            with self._lock:
+                self.purged += len(expired)
+        return len(expired)
+
+    def _maybe_purge(self):
+        now = time.time()
+        with self._lock:
+            if now - self._last_sweep < self.sweep_interval:
+                return
+            self._last_sweep = now
+        try:
+            self.purge_expired()
+        except Exception as e:
+            print(f"Failed to purge expired verification jobs: {e}")
+
+    def _publish(self, record):
+        try:
+            updates = {f"{self.JOBS_PATH}/{record['jobId']}": record}
+            if record.get('listingId'):
+                updates[f"products/{record['listingId']}/imageVerification/{record['jobId']}"] = record['result']
+            db.reference().update(updates)
+        except Exception as e:
+            print(f"Failed to publish verification job {record['jobId']}: {e}")
+
+    def _prune(self):
+        cutoff = time.time() - self.result_ttl
+        expired = [jid for jid, job in self._jobs.items() if job.get('finishedAt', time.time()) < cutoff]
+        for jid in expired:
+            del self._jobs[jid]
+
+    @staticmethod
+    def _public(job):
+        record = {k: v for k, v in job.items() if v is not None}
+        for key in ('submittedAt', 'startedAt', 'finishedAt'):
+            if key in record:
+                record[key] = int(record[key] * 1000)
+        return record
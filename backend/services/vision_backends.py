@@ -0,0 +1,147 @@
+import abc
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from google.api_core import exceptions as google_exceptions
+from google.cloud import vision
+from services.perceptual_hash import dhash, hamming_distance
+
+class VisionBackend(abc.ABC):
+    """
+    What AIService needs from Vision: the annotate_image and
+    batch_annotate_images calls of vision.ImageAnnotatorClient, taking and
+    returning the google.cloud.vision request/response types. The real
+    client satisfies it as-is; stand-ins subclass this.
+    """
+    @abc.abstractmethod
+    def annotate_image(self, request):
+        """Returns a vision.AnnotateImageResponse for one vision.AnnotateImageRequest."""
+
+    @abc.abstractmethod
+    def batch_annotate_images(self, requests):
+        """Returns a vision.BatchAnnotateImagesResponse, one response per request in order."""
+
+class LocalVisionBackend(VisionBackend):
+    """
+    Offline Vision stand-in for load and regression testing.
+
+    Annotations come from fixture rules instead of Google. Each rule matches
+    an image by the SHA-256 of the bytes sent, or by perceptual hash (given as
+    `phash` or computed from a fixture `file`) so matches survive the
+    pre-processing step; unmatched images get the `default` annotations.
+    Calls sleep for `latency_ms` (+/- `jitter_ms`) and fail with
+    ServiceUnavailable at `error_rate`, like the real API under load.
+
+    Rules file:
+        {
+          "default": {"labels": ["Product"]},
+          "rules": [
+            {"name": "camera", "file": "../static/images/camera.jpg",
+             "labels": ["Camera"], "objects": ["Camera"],
+             "safeSearch": {"violence": "UNLIKELY"}, "maxDistance": 6},
+            {"name": "broken upload", "sha256": "...", "error": "Bad image data."}
+          ]
+        }
+    """
+    def __init__(self, rules=None, default=None, latency_ms=0, jitter_ms=0, error_rate=0.0, seed=None):
+        self.rules = rules or []
+        self.default = default or {'labels': ['Product']}
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.images = 0
+        self.injected_errors = 0
+
+    @classmethod
+    def from_file(cls, path, **options):
+        """Loads rules from a JSON file; `file` entries are resolved relative to it."""
+        if not path:
+            return cls(**options)
+        with open(path, 'r', encoding='utf-8') as f:
+            spec = json.load(f)
+
+        base_dir = os.path.dirname(os.path.abspath(path))
+        rules = []
+        for rule in spec.get('rules', []):
+            rule = dict(rule)
+            if 'file' in rule:
+                with open(os.path.join(base_dir, rule['file']), 'rb') as img:
+                    rule['phash'] = dhash(img.read())
+            elif isinstance(rule.get('phash'), str):
+                rule['phash'] = int(rule['phash'], 16)
+            rules.append(rule)
+        return cls(rules=rules, default=spec.get('default'), **options)
+
+    def annotate_image(self, request):
+        self._simulate_call(1)
+        return self._respond(request.image.content)
+
+    def batch_annotate_images(self, requests):
+        self._simulate_call(len(requests))
+        return vision.BatchAnnotateImagesResponse(
+            responses=[self._respond(r.image.content) for r in requests]
+        )
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'images': self.images,
+                'injectedErrors': self.injected_errors
+            }
+
+    def _simulate_call(self, image_count):
+        with self._lock:
+            self.calls += 1
+            self.images += image_count
+            delay = self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)
+            fail = self._random.random() < self.error_rate
+            if fail:
+                self.injected_errors += 1
+        if delay > 0:
+            time.sleep(delay / 1000)
+        if fail:
+            raise google_exceptions.ServiceUnavailable('Injected error from LocalVisionBackend')
+
+    def _match(self, content):
+        content_sha = None
+        content_phash = None
+        for rule in self.rules:
+            if 'sha256' in rule:
+                content_sha = content_sha or hashlib.sha256(content).hexdigest()
+                if rule['sha256'] == content_sha:
+                    return rule
+            elif 'phash' in rule:
+                if content_phash is None:
+                    try:
+                        content_phash = dhash(content)
+                    except Exception:
+                        content_phash = -1
+                if content_phash >= 0 and hamming_distance(rule['phash'], content_phash) <= rule.get('maxDistance', 6):
+                    return rule
+        return self.default
+
+    def _respond(self, content):
+        rule = self._match(content)
+        if rule.get('error'):
+            return vision.AnnotateImageResponse(error={'code': 3, 'message': rule['error']})
+
+        likelihoods = {k: vision.Likelihood[v] for k, v in rule.get('safeSearch', {}).items()}
+        safe_search = vision.SafeSearchAnnotation(
+            adult=likelihoods.get('adult', vision.Likelihood.VERY_UNLIKELY),
+            violence=likelihoods.get('violence', vision.Likelihood.VERY_UNLIKELY),
+            racy=likelihoods.get('racy', vision.Likelihood.VERY_UNLIKELY),
+            spoof=likelihoods.get('spoof', vision.Likelihood.VERY_UNLIKELY),
+            medical=likelihoods.get('medical', vision.Likelihood.VERY_UNLIKELY)
+        )
+        return vision.AnnotateImageResponse(
+            safe_search_annotation=safe_search,
+            label_annotations=[vision.EntityAnnotation(description=label, score=0.9) for label in rule.get('labels', [])],
+            localized_object_annotations=[vision.LocalizedObjectAnnotation(name=name, score=0.9) for name in rule.get('objects', [])]
+        )
@@ -0,0 +1,21 @@
+from services.restricted_matcher import RestrictedContentMatcher, load_taxonomy
+
+def test_non_ascii_case_variants_resolve_to_taxonomy_terms():
+    matcher = RestrictedContentMatcher(load_taxonomy(), whole_words=True)
+
+    # U+017F LONG S and U+212A KELVIN SIGN match 's' / 'k' under IGNORECASE but .lower() keeps them
+    matches = matcher.scan_text(title='Exploſive deal', description='Hunting Knife for sale')
+
+    assert {(m['term'], m['source']) for m in matches} == {('explosive', 'title'), ('knife', 'description')}
+    assert all(m['severity'] == 'block' for m in matches)
+
+def test_block_term_inside_longer_flag_term_is_reported():
+    taxonomy = {
+        'weapons': {'severity': 'block', 'terms': ['gun']},
+        'toys': {'severity': 'flag', 'terms': ['gun shaped toy']}
+    }
+    matcher = RestrictedContentMatcher(taxonomy)
+
+    terms = {m['term']: m['severity'] for m in matcher.scan_text(title='Gun shaped toy')}
+
+    assert terms == {'gun': 'block', 'gun shaped toy': 'flag'}
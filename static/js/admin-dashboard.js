@@ -4959,7 +4959,8 @@ async function executeModerateAction() {
                 });
             }
         }
-        await db.ref(`products/${targetId}`).remove();
+        // Listing and its category index entry in one atomic write
+        await db.ref().update({ [`products/${targetId}`]: null, [`product_categories/${targetId}`]: null });
         showSuccess('Listing forcefully removed.');
       }
       await db.ref(`reports/${reportId}`).update({ status: 'Resolved (Purged)' });
@@ -367,34 +367,34 @@ window.removeExistingImage = (idx) => {
     displayCurrentImages();
 };
 
-function handleFileSelection(e) {
+async function handleFileSelection(e) {
     const files = Array.from(e.target.files);
-    
-    files.forEach(file => {
+    if (files.length === 0) return;
+
+    const newImageObjs = await Promise.all(files.map(file => new Promise(resolve => {
         const reader = new FileReader();
-        reader.onload = async (event) => {
-            const newImageObj = {
-                file: file,
-                url: event.target.result,
-                verification: { status: 'verifying' } // Initial state
-            };
-            
-            newImagesToUpload.push(newImageObj);
-            renderNewImagesPreview();
-            
-            // Trigger AI Verification
-            try {
-                const result = await verifyImageWithAI(file);
-                newImageObj.verification = result || { isSafe: true }; // Fallback if AI fails but we want to allow it
-                renderNewImagesPreview();
-            } catch (err) {
-                console.error('Verification failed:', err);
-                newImageObj.verification = { isSafe: true }; // Non-blocking on network error for now
-                renderNewImagesPreview();
-            }
-        };
+        reader.onload = (event) => resolve({
+            file: file,
+            url: event.target.result,
+            verification: { status: 'verifying' } // Initial state
+        });
         reader.readAsDataURL(file);
-    });
+    })));
+
+    newImagesToUpload.push(...newImageObjs);
+    renderNewImagesPreview();
+
+    // Trigger AI Verification (all selected photos in one batched request)
+    try {
+        const results = await verifyImagesWithAI(files);
+        newImageObjs.forEach((imgObj, i) => {
+            imgObj.verification = (results && results[i]) || { isSafe: true }; // Fallback if AI fails but we want to allow it
+        });
+    } catch (err) {
+        console.error('Verification failed:', err);
+        newImageObjs.forEach(imgObj => { imgObj.verification = { isSafe: true }; }); // Non-blocking on network error for now
+    }
+    renderNewImagesPreview();
 }
 
 function renderNewImagesPreview() {
@@ -573,7 +573,12 @@ async function handleFormSubmit(e, targetStatus = 'pending_verification') {
             updatedAt: new Date().toISOString()
         };
 
-        await firebase.database().ref(`products/${currentProduct.id}`).update(updatePayload);
+        // Keep the compact productId -> category index in sync in the same atomic write
+        const multiPathUpdate = { [`product_categories/${currentProduct.id}`]: updatePayload.category };
+        Object.keys(updatePayload).forEach(key => {
+            multiPathUpdate[`products/${currentProduct.id}/${key}`] = updatePayload[key];
+        });
+        await firebase.database().ref().update(multiPathUpdate);
         
         // 5. Notify Seller if promoted from Draft to Pending
         if (targetStatus === 'pending_verification') {
@@ -735,19 +740,24 @@ function debounce(func, wait) {
 }
 
 /**
- * AI CORE: Verifies image content via backend API
+ * AI CORE: Verifies several images in one batched backend call
  */
-async function verifyImageWithAI(file) {
+async function verifyImagesWithAI(files) {
     const formData = new FormData();
-    formData.append('image', file);
+    files.forEach(file => formData.append('images', file));
+    // Photos already verified for this listing (or by this seller) are not flagged as reposts
+    formData.append('listingId', new URLSearchParams(window.location.search).get('id') || '');
 
-    const response = await fetch('/api/verify-image', {
+    const idToken = await firebase.auth().currentUser.getIdToken();
+    const response = await fetch('/api/verify-images', {
         method: 'POST',
+        headers: { 'Authorization': `Bearer ${idToken}` },
         body: formData
     });
 
     if (!response.ok) return null;
-    return await response.json();
+    const data = await response.json();
+    return data.results || null;
 }
 
 /**
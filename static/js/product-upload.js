@@ -258,38 +258,38 @@ function addSpecificationRow(key = '', val = '') {
 
 async function handleFileSelection(e, isMain) {
     const files = Array.from(e.target.files);
-    
-    for (const file of files) {
-        if (isMain) {
-            // Remove previous main image from the internal list
-            uploadedImages = uploadedImages.filter(img => !img.isMain);
-        }
+    if (files.length === 0) return;
 
+    if (isMain) {
+        // Remove previous main image from the internal list
+        uploadedImages = uploadedImages.filter(img => !img.isMain);
+    }
+
+    const newImageObjs = await Promise.all(files.map(file => new Promise(resolve => {
         const reader = new FileReader();
-        reader.onload = async (event) => {
-            const newImageObj = {
-                file: file,
-                url: event.target.result,
-                isMain: isMain,
-                verification: { status: 'verifying' }
-            };
-            
-            uploadedImages.push(newImageObj);
-            renderImagesPreview();
-            
-            // Trigger AI Verification
-            try {
-                const result = await verifyImageWithAI(file);
-                newImageObj.verification = result || { isSafe: true };
-                renderImagesPreview();
-            } catch (err) {
-                console.error('Verification failed:', err);
-                newImageObj.verification = { isSafe: true };
-                renderImagesPreview();
-            }
-        };
+        reader.onload = (event) => resolve({
+            file: file,
+            url: event.target.result,
+            isMain: isMain,
+            verification: { status: 'verifying' }
+        });
         reader.readAsDataURL(file);
+    })));
+
+    uploadedImages.push(...newImageObjs);
+    renderImagesPreview();
+
+    // Trigger AI Verification (all selected photos in one batched request)
+    try {
+        const results = await verifyImagesWithAI(files);
+        newImageObjs.forEach((imgObj, i) => {
+            imgObj.verification = (results && results[i]) || { isSafe: true };
+        });
+    } catch (err) {
+        console.error('Verification failed:', err);
+        newImageObjs.forEach(imgObj => { imgObj.verification = { isSafe: true }; });
     }
+    renderImagesPreview();
 }
 
 function renderImagesPreview() {
@@ -514,8 +514,11 @@ async function handleFormSubmit(e, targetStatus = 'pending_verification') {
             payload.listingType = 'fixed';
         }
 
-        // 5. Submit to DB
-        await productRef.set(payload);
+        // 5. Submit to DB (product + compact category index in one atomic multi-path write)
+        await firebase.database().ref().update({
+            [`products/${productId}`]: payload,
+            [`product_categories/${productId}`]: payload.category
+        });
 
         // 6. Notify Seller (Only for non-drafts or informative)
         if (!isDraft) {
@@ -553,15 +556,19 @@ function showLoading(show, text = 'Processing...') {
     if (textEl) textEl.textContent = text;
 }
 
-async function verifyImageWithAI(file) {
+async function verifyImagesWithAI(files) {
     const formData = new FormData();
-    formData.append('image', file);
-    const response = await fetch('/api/verify-image', {
+    files.forEach(file => formData.append('images', file));
+    // Signed in, so the seller's own earlier photos are not flagged as reposts
+    const idToken = await firebase.auth().currentUser.getIdToken();
+    const response = await fetch('/api/verify-images', {
         method: 'POST',
+        headers: { 'Authorization': `Bearer ${idToken}` },
         body: formData
     });
     if (!response.ok) return null;
-    return await response.json();
+    const data = await response.json();
+    return data.results || null;
 }
 
 async function fetchPriceComparison(query) {
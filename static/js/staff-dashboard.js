@@ -1671,7 +1671,8 @@ window.deleteProduct = async function (productId) {
 
   try {
     showLoading(true, 'Deleting product...');
-    await db.ref(`products/${productId}`).remove();
+    // Listing and its category index entry in one atomic write
+    await db.ref().update({ [`products/${productId}`]: null, [`product_categories/${productId}`]: null });
     showSuccess('Product deleted successfully');
   } catch (error) {
     showError('Error deleting product: ' + error.message);